@@ -1,35 +1,97 @@
 """API dependencies for authentication and database"""
+import hashlib
+import time
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import select, event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
 from app.database import get_db
+from app.utils.cache import TTLCache
+from app.utils.metrics import stats_collector
 from app.utils.security import decode_access_token
 from app.models.user import User
 
 # HTTPBearer helper: Extracts the 'Authorization: Bearer <token>' header from requests
 security = HTTPBearer()
 
+# Principal caches: authentication runs on every request, so the common case
+# should skip both the JWT signature check and the users table lookup.
+# - token_cache: sha256(token) -> decoded payload (never outlives the token's 'exp')
+# - user_cache: token subject (email) -> detached User row
+# Entries are process-local; the short user TTL bounds staleness across workers.
+token_cache = TTLCache(
+    "auth_token",
+    max_size=settings.AUTH_TOKEN_CACHE_MAX_SIZE,
+    ttl=settings.AUTH_TOKEN_CACHE_TTL_SECONDS
+)
+user_cache = TTLCache(
+    "auth_user",
+    max_size=settings.AUTH_USER_CACHE_MAX_SIZE,
+    ttl=settings.AUTH_USER_CACHE_TTL_SECONDS
+)
+stats_collector.register("cache", token_cache.stats, cache="auth_token")
+stats_collector.register("cache", user_cache.stats, cache="auth_user")
+
+
+def invalidate_user(email: str):
+    """Evicts a user from the principal cache (call after any change to the account)."""
+    if email:
+        user_cache.invalidate(email)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _evict_changed_user(mapper, connection, target):
+    """Keeps the principal cache coherent with writes made through the ORM."""
+    invalidate_user(target.email)
+    # An email change leaves the old subject cached too
+    for old_email in inspect(target).attrs.email.history.deleted or ():
+        invalidate_user(old_email)
+
+
+def _decode_token_cached(token: str):
+    """Decodes a JWT, reusing the payload of tokens we have already verified."""
+    token_key = hashlib.sha256(token.encode()).hexdigest()
+    payload = token_cache.get(token_key)
+    if payload is not None:
+        # Cached entries never outlive 'exp', but double-check at the boundary
+        if payload.get("exp", 0) > time.time():
+            return payload
+        token_cache.invalidate(token_key)
+
+    payload = decode_access_token(token)
+    if payload is not None:
+        remaining = payload.get("exp", 0) - time.time()
+        token_cache.set(token_key, payload, ttl=remaining)
+    return payload
+
+
+def _admin_emails() -> set[str]:
+    return {email.strip().lower() for email in settings.ADMIN_EMAILS.split(",") if email.strip()}
+
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> User:
     """
     FastAPI Dependency: Ensures a request is coming from a logged-in user.
     1. Extracts the raw JWT string.
-    2. Decodes and verifies it using the Secret Key.
-    3. Retrieves the User from the database.
+    2. Decodes and verifies it using the Secret Key (cached per token).
+    3. Retrieves the User (from the principal cache, else the database).
     """
     token = credentials.credentials
-    
+
     # Step 1: Decode and verify signature/expiration
-    payload = decode_access_token(token)
+    payload = _decode_token_cached(token)
     if payload is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
+
     # Step 2: Extract user identity ('sub' key in JWT payload)
     email: str = payload.get("sub")
     if email is None:
@@ -38,14 +100,32 @@ async def get_current_user(
             detail="Invalid authentication credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
-    # Step 3: Fetch the user object from the database
-    user = db.query(User).filter(User.email == email).first()
+
+    # Step 3: Fetch the user object (cache first, database on a miss)
+    user = user_cache.get(email)
+    if user is not None:
+        return user
+
+    result = await db.execute(select(User).where(User.email == email))
+    user = result.scalars().first()
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
+
+    # Detach so the cached row is not tied to this request's session
+    db.expunge(user)
+    user_cache.set(email, user)
     return user
+
+
+async def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
+    """FastAPI Dependency: a logged-in user listed in ADMIN_EMAILS, else 403."""
+    if current_user.email.lower() not in _admin_emails():
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return current_user
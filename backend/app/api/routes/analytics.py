@@ -0,0 +1,32 @@
+"""API Routes for Chat Analytics (admins only)"""
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal
+
+from app.database import get_db
+from app.api.deps import get_current_admin
+from app.models.user import User
+from app.schemas.analytics import ChatAnalytics, SlowChat
+from app.services.chat_metrics_service import ChatMetricsService
+
+router = APIRouter(prefix="/api/analytics", tags=["analytics"])
+
+@router.get("/chat", response_model=List[ChatAnalytics])
+async def get_chat_analytics(
+    group_by: Literal["source_type", "user", "day"] = "source_type",
+    days: int = Query(7, ge=1, le=90),
+    admin: User = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """Chat latency percentiles per stage, token totals and cache hit rate, grouped"""
+    return await ChatMetricsService.analytics(db, group_by, days)
+
+@router.get("/slow", response_model=List[SlowChat])
+async def get_slow_chats(
+    days: int = Query(7, ge=1, le=90),
+    limit: int = Query(50, ge=1, le=500),
+    admin: User = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """The slowest chats above CHAT_SLOW_REQUEST_MS, with their breakdown"""
+    return await ChatMetricsService.slow_requests(db, days, limit)
@@ -1,27 +1,50 @@
 """Authentication routes for registration and login"""
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
 from app.database import get_db
+from app.api.deps import get_current_user
 from app.models.user import User
+from app.services.prefetch_service import PrefetchService
 from app.schemas.user import UserRegister, UserLogin, Token, UserResponse
-from app.utils.security import get_password_hash, verify_password, create_access_token
+from app.utils.security import (
+    get_password_hash_async,
+    verify_and_update_password_async,
+    create_access_token,
+    affinity_key,
+    PasswordHashPoolFull,
+)
 
 router = APIRouter(prefix="/api/auth", tags=["authentication"])
 
 
+def _hashing_busy() -> HTTPException:
+    """503 returned when the password hashing queue is saturated."""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Authentication is busy, please retry shortly",
+        headers={"Retry-After": "1"}
+    )
+
+
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register(user_data: UserRegister, db: Session = Depends(get_db)):
+async def register(user_data: UserRegister, db: AsyncSession = Depends(get_db)):
     """Register a new user"""
     # Check if user already exists
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
+    result = await db.execute(select(User).where(User.email == user_data.email))
+    existing_user = result.scalars().first()
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
-    # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    # Create new user (hashing runs on the bounded password pool)
+    try:
+        hashed_password = await get_password_hash_async(user_data.password)
+    except PasswordHashPoolFull:
+        raise _hashing_busy()
     new_user = User(
         email=user_data.email,
         hashed_password=hashed_password,
@@ -29,37 +52,59 @@ async def register(user_data: UserRegister, db: Session = Depends(get_db)):
     )
     
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     
     return new_user
 
 
 @router.post("/login", response_model=Token)
-async def login(user_data: UserLogin, db: Session = Depends(get_db)):
+async def login(user_data: UserLogin, response: Response, db: AsyncSession = Depends(get_db)):
     """Login and get JWT token"""
     # Get user from database
-    user = db.query(User).filter(User.email == user_data.email).first()
+    result = await db.execute(select(User).where(User.email == user_data.email))
+    user = result.scalars().first()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
     
-    # Verify password
-    if not verify_password(user_data.password, user.hashed_password):
+    # Verify password (on the bounded password pool)
+    try:
+        verified, new_hash = await verify_and_update_password_async(
+            user_data.password, user.hashed_password
+        )
+    except PasswordHashPoolFull:
+        raise _hashing_busy()
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
     
+    # Transparent rehash: the stored hash used outdated parameters
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+    
     # Create access token
     access_token = create_access_token(data={"sub": user.email})
+
+    # Warm the user's recent indexes while the client loads the dashboard
+    PrefetchService.schedule(user.id)
+
+    # Multi-node: the client echoes this key in AFFINITY_HEADER, so a load balancer
+    # hashing on it keeps the user on a node whose index cache already has their sources
+    if settings.AFFINITY_HEADER:
+        key = affinity_key(user.id)
+        response.headers[settings.AFFINITY_HEADER] = key
+        return {"access_token": access_token, "token_type": "bearer", "affinity_key": key}
     
     return {"access_token": access_token, "token_type": "bearer"}
 
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user_info(current_user: User = Depends(get_db)):
+async def get_current_user_info(current_user: User = Depends(get_current_user)):
     """Get current user information"""
     return current_user
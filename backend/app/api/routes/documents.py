@@ -1,17 +1,23 @@
 """API Routes for Document Management and Chat"""
 from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status, BackgroundTasks
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
-from app.database import get_db, SessionLocal
+from app.database import get_db, AsyncSessionLocal
 from app.api.deps import get_current_user
 from app.models.user import User
 from app.models.document import Document
 from app.models.conversation import Conversation
 from app.schemas.document import DocumentResponse
-from app.schemas.chat import ChatRequest, ChatResponse, ConversationHistory
+from app.schemas.chat import ChatRequest, BatchChatRequest, ChatResponse, ConversationHistory
 from app.services.document_service import DocumentService
 from app.services.rag_service import RAGService
+from app.services.prefetch_service import PrefetchService
+from app.services.batch_chat_service import BatchChatService
+from app.services.chat_metrics_service import ChatMetricsService
+from app.utils.admission import chat_admission
+from app.utils.metrics import ChatTrace
 
 router = APIRouter(prefix="/api/documents", tags=["documents"])
 
@@ -20,7 +26,7 @@ async def upload_document(
     background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Upload and process a PDF document"""
     if not file.filename.lower().endswith('.pdf'):
@@ -32,60 +38,70 @@ async def upload_document(
     # 1. Initialize document (saves file and creates DB record)
     doc = await DocumentService.process_document(db, current_user, file)
     
-    # 2. Add processing to background tasks
-    background_tasks.add_task(
-        DocumentService.background_process_document,
-        doc.id,
-        SessionLocal
-    )
-    
+    # 2. Add processing to background tasks (duplicates arrive already 'completed')
+    if doc.status == "processing":
+        background_tasks.add_task(
+            DocumentService.background_process_document,
+            doc.id,
+            AsyncSessionLocal
+        )
+
+    # This session is only closed after the background task, so end its open
+    # transaction now instead of pinning a pooled connection for the whole build
+    await db.commit()
     return doc
 
 @router.get("/", response_model=List[DocumentResponse])
 async def list_documents(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """List all documents for current user"""
-    return DocumentService.get_user_documents(db, current_user.id)
+    PrefetchService.schedule(current_user.id)
+    return await DocumentService.get_user_documents(db, current_user.id)
 
 @router.delete("/{doc_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_document(
     doc_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete a document"""
-    DocumentService.delete_document(db, doc_id, current_user.id)
+    await DocumentService.delete_document(db, doc_id, current_user.id)
 
 @router.post("/{doc_id}/chat", response_model=ChatResponse)
 async def chat_with_document(
     doc_id: int,
     request: ChatRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Chat with a specific document with memory"""
+    trace = ChatTrace()
     # Verify document exists and belongs to user
-    doc = DocumentService.get_document(db, doc_id, current_user.id)
+    doc = await DocumentService.get_document(db, doc_id, current_user.id)
     
     # 1. Fetch History
-    history_records = db.query(Conversation).filter(
+    result = await db.execute(select(Conversation).where(
         Conversation.source_id == doc_id,
         Conversation.source_type == "document",
         Conversation.user_id == current_user.id
-    ).order_by(Conversation.timestamp).all()
+    ).order_by(Conversation.timestamp))
+    history_records = result.scalars().all()
     
     # 2. Format for LangChain
     from app.utils.history_utils import format_chat_history
     formatted_history = format_chat_history(history_records)
     
     # 3. Generate response with history
-    answer = await RAGService.generate_response(
-        doc.vector_store_path,
-        request.question,
-        chat_history=formatted_history
-    )
+    async with chat_admission.admit(current_user.id, trace):
+        answer = await RAGService.generate_response(
+            doc.vector_store_path,
+            request.question,
+            chat_history=formatted_history,
+            source_type="document",
+            trace=trace
+        )
     
     # Save conversation
     conversation = Conversation(
@@ -96,23 +112,38 @@ async def chat_with_document(
         answer=answer
     )
     db.add(conversation)
-    db.commit()
-    db.refresh(conversation)
+    await ChatMetricsService.record(db, conversation, trace, history_turns=len(formatted_history) // 2)
+    await db.commit()
+    await db.refresh(conversation)
     
     return conversation
 
+@router.post("/{doc_id}/chat/batch")
+async def batch_chat_with_document(
+    doc_id: int,
+    request: BatchChatRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Answer many questions about a document at once (streamed as NDJSON)"""
+    doc = await DocumentService.get_document(db, doc_id, current_user.id)
+    return await BatchChatService.stream_answers(
+        current_user.id, doc.id, "document", doc.vector_store_path, request.questions
+    )
+
 @router.get("/{doc_id}/history", response_model=List[ConversationHistory])
 async def get_document_history(
     doc_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get chat history for a document"""
     # Verify document ownership
-    DocumentService.get_document(db, doc_id, current_user.id)
+    await DocumentService.get_document(db, doc_id, current_user.id)
     
-    return db.query(Conversation).filter(
+    result = await db.execute(select(Conversation).where(
         Conversation.source_id == doc_id,
         Conversation.source_type == "document",
         Conversation.user_id == current_user.id
-    ).order_by(Conversation.timestamp).all()
+    ).order_by(Conversation.timestamp))
+    return result.scalars().all()
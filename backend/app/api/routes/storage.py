@@ -0,0 +1,21 @@
+"""API Routes for Storage Usage"""
+from fastapi import APIRouter, Depends
+from fastapi.concurrency import run_in_threadpool
+from typing import List
+
+from app.api.deps import get_current_user, get_current_admin
+from app.models.user import User
+from app.schemas.storage import StorageUsage
+from app.services.storage_service import StorageService
+
+router = APIRouter(prefix="/api/storage", tags=["storage"])
+
+@router.get("/usage", response_model=StorageUsage)
+async def get_storage_usage(current_user: User = Depends(get_current_user)):
+    """Disk used by the current user's uploads and indexes, and their quota"""
+    return await run_in_threadpool(StorageService.user_usage, current_user.id)
+
+@router.get("/usage/all", response_model=List[StorageUsage])
+async def get_all_storage_usage(admin: User = Depends(get_current_admin)):
+    """Disk usage of every user, largest first (admins only)"""
+    return await run_in_threadpool(StorageService.usage)
@@ -1,6 +1,7 @@
 """API Routes for Webpages"""
 from fastapi import APIRouter, Depends, status, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
 from app.database import get_db
@@ -9,9 +10,14 @@ from app.models.user import User
 from app.models.source import Source
 from app.models.conversation import Conversation
 from app.schemas.document import SourceCreate, SourceResponse
-from app.schemas.chat import ChatRequest, ChatResponse, ConversationHistory
+from app.schemas.chat import ChatRequest, BatchChatRequest, ChatResponse, ConversationHistory
 from app.services.webpage_service import WebpageService
 from app.services.rag_service import RAGService
+from app.services.prefetch_service import PrefetchService
+from app.services.batch_chat_service import BatchChatService
+from app.services.chat_metrics_service import ChatMetricsService
+from app.utils.admission import chat_admission
+from app.utils.metrics import ChatTrace
 
 router = APIRouter(prefix="/api/webpage", tags=["webpage"])
 
@@ -19,7 +25,7 @@ router = APIRouter(prefix="/api/webpage", tags=["webpage"])
 async def process_webpage(
     data: SourceCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Process a webpage URL"""
     return await WebpageService.process_webpage(db, current_user, data.url)
@@ -27,35 +33,42 @@ async def process_webpage(
 @router.get("/", response_model=List[SourceResponse])
 async def list_webpages(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """List all processed webpages"""
-    return db.query(Source).filter(
+    PrefetchService.schedule(current_user.id)
+    result = await db.execute(select(Source).where(
         Source.user_id == current_user.id,
         Source.source_type == "webpage"
-    ).all()
+    ))
+    return result.scalars().all()
 
 @router.post("/{source_id}/chat", response_model=ChatResponse)
 async def chat_with_webpage(
     source_id: int,
     request: ChatRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Chat with a specific webpage"""
-    source = db.query(Source).filter(
-        Source.id == source_id, 
+    trace = ChatTrace()
+    result = await db.execute(select(Source).where(
+        Source.id == source_id,
         Source.user_id == current_user.id,
         Source.source_type == "webpage"
-    ).first()
+    ))
+    source = result.scalars().first()
     
     if not source:
         raise HTTPException(status_code=404, detail="Webpage not found")
         
-    answer = await RAGService.generate_response(
-        source.vector_store_path,
-        request.question
-    )
+    async with chat_admission.admit(current_user.id, trace):
+        answer = await RAGService.generate_response(
+            source.vector_store_path,
+            request.question,
+            source_type="webpage",
+            trace=trace
+        )
     
     conversation = Conversation(
         user_id=current_user.id,
@@ -65,27 +78,52 @@ async def chat_with_webpage(
         answer=answer
     )
     db.add(conversation)
-    db.commit()
-    db.refresh(conversation)
+    await ChatMetricsService.record(db, conversation, trace)
+    await db.commit()
+    await db.refresh(conversation)
     
     return conversation
 
+@router.post("/{source_id}/chat/batch")
+async def batch_chat_with_webpage(
+    source_id: int,
+    request: BatchChatRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Answer many questions about a webpage at once (streamed as NDJSON)"""
+    result = await db.execute(select(Source).where(
+        Source.id == source_id,
+        Source.user_id == current_user.id,
+        Source.source_type == "webpage"
+    ))
+    source = result.scalars().first()
+    
+    if not source:
+        raise HTTPException(status_code=404, detail="Webpage not found")
+
+    return await BatchChatService.stream_answers(
+        current_user.id, source.id, "webpage", source.vector_store_path, request.questions
+    )
+
 @router.get("/{source_id}/history", response_model=List[ConversationHistory])
 async def get_webpage_history(
     source_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get chat history for a webpage"""
-    source = db.query(Source).filter(
-        Source.id == source_id, 
+    result = await db.execute(select(Source).where(
+        Source.id == source_id,
         Source.user_id == current_user.id
-    ).first()
+    ))
+    source = result.scalars().first()
     if not source:
         raise HTTPException(status_code=404, detail="Webpage not found")
     
-    return db.query(Conversation).filter(
+    result = await db.execute(select(Conversation).where(
         Conversation.source_id == source_id,
         Conversation.source_type == "webpage",
         Conversation.user_id == current_user.id
-    ).order_by(Conversation.timestamp).all()
+    ).order_by(Conversation.timestamp))
+    return result.scalars().all()
@@ -11,14 +11,62 @@ class Settings(BaseSettings):
     APP_NAME: str = "RAG Multi-Source Chat"
     APP_VERSION: str = "1.0.0"
     DEBUG: bool = True
+    METRICS_ENABLED: bool = True  # Exposes Prometheus metrics at /metrics
+
+    # Per-request profiling (pyinstrument); off unless enabled
+    PROFILING_ENABLED: bool = False
+    PROFILING_HEADER: str = "X-Profile"
+    PROFILING_TOKEN: Optional[str] = None  # Header value that triggers a profile
+    PROFILING_SAMPLE_RATE: float = 0.0  # Fraction of requests profiled without the header
+    PROFILING_INTERVAL: float = 0.001  # Sampling interval in seconds
+    PROFILING_FORMAT: str = "speedscope"  # 'speedscope' or 'html'
+    PROFILING_DIR: str = "./backend/profiles"
+    PROFILING_MAX_FILES: int = 50  # Oldest profiles are deleted beyond this
     
     # Database
     DATABASE_URL: str = "sqlite:///./backend/database.db"
-    
+    DATABASE_ASYNC_URL: Optional[str] = None  # Derived from DATABASE_URL when unset
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30  # seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800  # seconds before a connection is replaced
+    DB_POOL_PRE_PING: bool = True
+
+    # SQLite tuning (ignored for other databases)
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE_KB: int = 64 * 1024  # 64MB page cache per connection
+
     # JWT Authentication
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24  # 24 hours
+
+    # Principal caches used by get_current_user
+    AUTH_TOKEN_CACHE_TTL_SECONDS: int = 300
+    AUTH_TOKEN_CACHE_MAX_SIZE: int = 10000
+    AUTH_USER_CACHE_TTL_SECONDS: int = 30
+    AUTH_USER_CACHE_MAX_SIZE: int = 10000
+
+    # Password hashing pool (PBKDF2 runs here, never on the event loop)
+    PASSWORD_HASH_EXECUTOR: str = "thread"  # 'thread' or 'process'
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_QUEUE: int = 100
+    PASSWORD_HASH_ROUNDS: Optional[int] = None  # None keeps passlib's default
+    
+    # Chat admission control (per worker process)
+    CHAT_MAX_CONCURRENT: int = 16  # generate_response calls running at once
+    CHAT_MAX_QUEUE: int = 32  # requests waiting for a slot before 429s start
+    CHAT_QUEUE_TIMEOUT_SECONDS: float = 10.0  # longest wait for a slot
+    CHAT_USER_RATE_PER_MINUTE: float = 30.0  # sustained chats per user; 0 disables
+    CHAT_USER_BURST: int = 10  # chats a user may send back to back
+    BATCH_CHAT_MAX_QUESTIONS: int = 50  # questions per /chat/batch request
+    BATCH_CHAT_CONCURRENCY: int = 4  # LLM calls in flight per batch
+
+    # Per-chat latency and token accounting (ChatMetrics, /api/analytics)
+    CHAT_METRICS_ENABLED: bool = True
+    CHAT_SLOW_REQUEST_MS: float = 10000  # chats slower than this are logged with their breakdown; 0 disables
     
     # API Keys
     GEMINI_API_KEY: Optional[str] = None
@@ -30,17 +78,98 @@ class Settings(BaseSettings):
     # File upload
     UPLOAD_DIR: str = "./backend/uploads"
     MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # 1MB read/write/hash granularity
+    INGEST_CHECKPOINT_CHUNKS: int = 512  # embedded chunks saved per checkpoint on larger sources; 0 disables
+    INGEST_RESUME_ON_STARTUP: bool = True  # re-process documents a restart left 'processing'
+    INGEST_CLAIM_STALE_SECONDS: int = 120  # another node's processing claim without a heartbeat this long is taken over
+    NODE_ID: Optional[str] = None  # names this node in processing claims; the hostname when unset
+
+    # PDF text extraction
+    PDF_BACKEND: str = "auto"  # 'auto' (pdfium if pypdfium2 is installed, else pypdf), 'pdfium' or 'pypdf'
+    PDF_PAGE_TIMEOUT_SECONDS: float = 30.0  # per page, in a child process; 0 extracts in-process without a limit
     
     # Vector store
     VECTOR_STORE_DIR: str = "./backend/vector_stores"
+    VECTOR_BACKEND: str = "auto"  # 'auto', 'faiss' or 'numpy' for new indexes
+    NUMPY_STORE_MAX_CHUNKS: int = 2000  # 'auto' keeps sources up to this size in a plain NumPy matrix
+    INDEX_CACHE_MAX_MB: int = 512  # loaded indexes kept in memory per worker (LRU)
+    INDEX_CACHE_MAX_ENTRIES: int = 64
+
+    # Index prefetch when a user logs in or lists their sources
+    PREFETCH_ENABLED: bool = True
+    PREFETCH_PER_USER: int = 3  # most recently used sources warmed per user
+    PREFETCH_USER_MAX_MB: int = 256  # per-user prefetch budget (the cache's free space is the global one)
+    PREFETCH_MAX_CONCURRENT: int = 2  # prefetch loads running at once, all users
+    PREFETCH_COOLDOWN_SECONDS: int = 120  # per user, so list refreshes don't repeat it
+    PREFETCH_MIN_AVAILABLE_MB: int = 512  # below this much free system memory prefetching stops
+
+    # Storage lifecycle (StorageService): orphan sweep, retention, quotas, cold compression
+    STORAGE_SWEEP_ENABLED: bool = True  # run the sweep periodically inside the API
+    STORAGE_SWEEP_INTERVAL_MINUTES: int = 60
+    STORAGE_ORPHAN_GRACE_HOURS: float = 24.0  # unreferenced files younger than this are left alone
+    STORAGE_FAILED_RETENTION_DAYS: int = 7  # failed documents (and their uploads) are removed after this
+    STORAGE_COLD_INDEX_DAYS: int = 30  # indexes unused this long are compressed; 0 disables
+    STORAGE_USER_QUOTA_MB: int = 0  # uploads + indexes per user; 0 = unlimited
+    ADMIN_EMAILS: str = ""  # comma-separated accounts allowed to see all users' storage
+
+    # Multi-node: uploads and indexes shared through an artifact store, cached per node
+    ARTIFACT_BACKEND: str = "local"  # 'local' (single node), 'shared' (a common mount) or 's3'
+    ARTIFACT_SHARED_DIR: Optional[str] = None  # for 'shared'
+    ARTIFACT_S3_BUCKET: Optional[str] = None  # for 's3' (needs boto3)
+    ARTIFACT_S3_PREFIX: str = ""
+    ARTIFACT_S3_ENDPOINT_URL: Optional[str] = None  # S3-compatible service (MinIO...); AWS when unset
+    ARTIFACT_CACHE_MAX_MB: int = 4096  # local copies of shared indexes kept per node (LRU)
+    ARTIFACT_VERSION_CHECK_SECONDS: float = 30.0  # how stale a node's view of a rebuilt index may be
+    AFFINITY_HEADER: Optional[str] = "X-Affinity-Key"  # per-user routing key returned at login; None disables
     
     # Embeddings
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    PRELOAD_MODELS: bool = False  # Load the model when app.main is imported (see gunicorn.conf.py)
+
+    # Lane scheduler for the in-process model: chat queries run ahead of ingestion
+    EMBEDDING_SCHEDULER_ENABLED: bool = True
+    EMBEDDING_BULK_BATCH_SIZE: int = 32  # texts per ingestion slice (a query waits at most one)
+    EMBEDDING_BULK_THREADS: Optional[int] = None  # PyTorch threads for ingestion; None = all
+    EMBEDDING_BULK_CPU_SHARE: float = 1.0  # fraction of time ingestion may use the model
+
+    # Optional embedding sidecar (python -m app.embedding_server) shared by all workers
+    EMBEDDING_SERVER_SOCKET: Optional[str] = None  # Unix socket path; local model when unset
+    EMBEDDING_SERVER_TIMEOUT: float = 60.0  # seconds per request, including busy retries
+    EMBEDDING_SERVER_MAX_BATCH: int = 64  # texts per model call
+    EMBEDDING_SERVER_MAX_WAIT_MS: float = 5.0  # wait for other requests to fill a batch
+    EMBEDDING_SERVER_MAX_QUEUE: int = 20000  # pending texts before bulk requests are rejected
     
     # RAG settings
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 200
     TOP_K: int = 5
+    HYBRID_SEARCH_ENABLED: bool = True  # Fuse BM25 with FAISS results (reciprocal rank fusion)
+    HYBRID_CANDIDATES: int = 20  # candidates taken from each side before fusion
+    RRF_K: int = 60  # rank fusion damping constant
+    BM25_K1: float = 1.2
+    BM25_B: float = 0.75
+
+    # Near-duplicate chunk removal at ingestion (MinHash + LSH)
+    DEDUP_ENABLED: bool = True
+    DEDUP_THRESHOLD: float = 0.85  # word-shingle Jaccard similarity at which a chunk is dropped
+    DEDUP_SHINGLE_SIZE: int = 5  # words per shingle
+    DEDUP_NUM_PERM: int = 128  # MinHash signature length
+    DEDUP_BANDS: int = 32  # LSH bands (rows per band = NUM_PERM / BANDS)
+
+    # Two-stage (section -> chunk) retrieval for very large sources
+    HIERARCHY_ENABLED: bool = True
+    HIERARCHY_MIN_CHUNKS: int = 5000  # smaller indexes stay flat
+    HIERARCHY_PAGES_PER_SECTION: int = 10  # PDF page group per section
+    HIERARCHY_CHUNKS_PER_SECTION: int = 50  # section size for transcripts / webpages
+    HIERARCHY_TOP_SECTIONS: int = 8  # sections searched per query
+
+    # Vector compression for new indexes ('flat', 'float16', 'sq8', 'pq'); each index
+    # records its own format, so changing this never breaks existing indexes
+    VECTOR_FORMAT: str = "flat"
+    VECTOR_PQ_M: int = 48  # PQ sub-quantizers (one byte each); must divide the dimension
+    VECTOR_PQ_MIN_CHUNKS: int = 10000  # smaller indexes use sq8 instead of pq
+    VECTOR_REFINE: bool = False  # keep float32 vectors on disk (mmap) to re-score candidates exactly
+    VECTOR_REFINE_FACTOR: int = 4  # candidates fetched per result when re-scoring
     
     # LLM settings
     LLM_MODEL: str = "gemini-flash-latest"
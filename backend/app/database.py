@@ -1,31 +1,135 @@
-"""SQLite database configuration using SQLAlchemy"""
-from sqlalchemy import create_engine
+"""Database configuration using SQLAlchemy (async sessions for the API, sync for scripts)"""
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
 
-# Create SQLite engine
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False}  # Needed for SQLite
-)
+# Async drivers used for each sync URL scheme.
+# aiosqlite is the local default; asyncpg lets the same code run against PostgreSQL.
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+
+def get_async_database_url() -> str:
+    """
+    Returns the URL for the async engine.
+    DATABASE_ASYNC_URL wins if set, otherwise the driver is swapped on DATABASE_URL
+    (e.g. 'sqlite:///x.db' -> 'sqlite+aiosqlite:///x.db').
+    """
+    if settings.DATABASE_ASYNC_URL:
+        return settings.DATABASE_ASYNC_URL
+
+    url = make_url(settings.DATABASE_URL)
+    backend = url.get_backend_name()
+    if backend in ASYNC_DRIVERS and "+" not in url.drivername:
+        url = url.set(drivername=ASYNC_DRIVERS[backend])
+    return url.render_as_string(hide_password=False)
+
+
+def _is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def _engine_options(url: str) -> dict:
+    """
+    Pool and driver options shared by the sync and async engines.
+    In-memory SQLite keeps SQLAlchemy's default single-connection pool.
+    """
+    options = {"pool_pre_ping": settings.DB_POOL_PRE_PING}
+
+    if _is_sqlite(url):
+        # check_same_thread is needed because sessions hop between threads
+        options["connect_args"] = {"check_same_thread": False}
+        if ":memory:" in url or make_url(url).database in (None, ""):
+            return options
+
+    options.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+    )
+    return options
 
-# Create session factory
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Tunes every new SQLite connection:
+    - WAL lets readers keep going while a writer commits.
+    - synchronous=NORMAL is durable in WAL mode and avoids an fsync per commit.
+    - busy_timeout makes competing writers wait instead of failing with 'database is locked'.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    # Negative cache_size is in KiB rather than pages
+    cursor.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+# Sync engine: used by standalone scripts and maintenance tasks
+engine = create_engine(settings.DATABASE_URL, **_engine_options(settings.DATABASE_URL))
+
+# Async engine: used by every API route so DB waits never block the event loop
+async_database_url = get_async_database_url()
+async_engine = create_async_engine(async_database_url, **_engine_options(async_database_url))
+
+if _is_sqlite(settings.DATABASE_URL):
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
+if _is_sqlite(async_database_url):
+    event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+
+# Create session factories
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# expire_on_commit=False: objects stay readable after commit without an implicit
+# (and in async code, illegal) lazy refresh.
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
 # Base class for models
 Base = declarative_base()
 
 
-def get_db():
-    """Dependency to get database session"""
-    db = SessionLocal()
-    try:
+async def get_db():
+    """Dependency to get an async database session"""
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
-def init_db():
-    """Initialize database - create all tables"""
-    Base.metadata.create_all(bind=engine)
+def _add_missing_columns(sync_conn):
+    """
+    Lightweight additive migration: create_all() never alters existing tables,
+    so nullable columns added to a model later are appended here (with their indexes).
+    """
+    inspector = inspect(sync_conn)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        missing = [column for column in table.columns if column.name not in existing]
+        for column in missing:
+            column_type = column.type.compile(dialect=sync_conn.dialect)
+            sync_conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+        if missing:
+            for index in table.indexes:
+                index.create(sync_conn, checkfirst=True)
+
+
+async def init_db():
+    """Initialize database - create all tables and add any new columns"""
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
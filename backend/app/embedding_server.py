@@ -0,0 +1,223 @@
+"""
+Embedding sidecar: one process per node owns the embedding model and serves
+every web worker over a Unix socket, batching texts across requests and workers.
+
+Usage (from the backend/ directory):
+    python -m app.embedding_server --socket /tmp/tokentalk-embed.sock
+    python -m app.embedding_server --socket /tmp/tokentalk-embed.sock --check   # health check
+Then start the API with EMBEDDING_SERVER_SOCKET=/tmp/tokentalk-embed.sock.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from app.config import settings
+from app.services.remote_embeddings import (
+    PRIORITIES, RemoteEmbeddings, EmbeddingServerError, encode_frame, read_frame_async
+)
+
+
+class ServerBusy(Exception):
+    pass
+
+
+class _Request:
+    """One embed call, split into slices of at most max_batch texts."""
+
+    def __init__(self, parts: int):
+        self.parts = {}
+        self.remaining = parts
+        self.future = asyncio.get_running_loop().create_future()
+
+    def complete(self, offset: int, vectors: np.ndarray):
+        if self.future.done():
+            return
+        self.parts[offset] = vectors
+        self.remaining -= 1
+        if self.remaining == 0:
+            self.future.set_result(np.concatenate([self.parts[k] for k in sorted(self.parts)]))
+
+    def fail(self, error: Exception):
+        if not self.future.done():
+            self.future.set_exception(error)
+
+
+class EmbeddingServer:
+    """
+    Dynamic batcher in front of a single model.
+    Slices wait in one queue per priority; each model call takes interactive slices
+    first and fills the rest of the batch with bulk ones, so queries never wait
+    behind more than one batch of ingestion. Bulk requests are rejected once
+    max_queue texts are pending (interactive ones are always accepted).
+    """
+
+    def __init__(self, model, max_batch: int, max_wait_ms: float, max_queue: int):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue = max_queue
+        self.queues = {priority: deque() for priority in PRIORITIES}
+        self.pending_texts = 0
+        self.wakeup = asyncio.Event()
+        # The model parallelizes internally; one thread keeps batches in order
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+        self.started = time.time()
+        self.counters = {"requests": 0, "texts": 0, "batches": 0, "rejected": 0, "errors": 0}
+
+    async def embed(self, texts: list[str], priority: str) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype="float32")
+        if priority == "bulk" and self.pending_texts + len(texts) > self.max_queue:
+            self.counters["rejected"] += 1
+            raise ServerBusy()
+        starts = range(0, len(texts), self.max_batch)
+        request = _Request(len(starts))
+        for start in starts:
+            self.queues[priority].append((request, start, texts[start:start + self.max_batch]))
+        self.pending_texts += len(texts)
+        self.counters["requests"] += 1
+        self.wakeup.set()
+        return await request.future
+
+    def _next_batch(self) -> tuple[list, int]:
+        batch, size = [], 0
+        for priority in PRIORITIES:
+            queue = self.queues[priority]
+            while queue and size + len(queue[0][2]) <= self.max_batch:
+                item = queue.popleft()
+                batch.append(item)
+                size += len(item[2])
+        return batch, size
+
+    def _encode(self, texts: list[str]) -> np.ndarray:
+        return np.asarray(self.model.embed_documents(texts), dtype="float32")
+
+    async def run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.wakeup.wait()
+            # Give concurrent requests from other workers a moment to join a small batch
+            if self.pending_texts < self.max_batch and self.max_wait:
+                await asyncio.sleep(self.max_wait)
+            batch, size = self._next_batch()
+            if not batch:
+                self.wakeup.clear()
+                continue
+
+            texts = [text for _, _, chunk in batch for text in chunk]
+            try:
+                vectors = await loop.run_in_executor(self.executor, self._encode, texts)
+            except Exception as e:
+                self.counters["errors"] += 1
+                for request, _, _ in batch:
+                    request.fail(e)
+            else:
+                position = 0
+                for request, offset, chunk in batch:
+                    request.complete(offset, vectors[position:position + len(chunk)])
+                    position += len(chunk)
+            self.pending_texts -= size
+            self.counters["batches"] += 1
+            self.counters["texts"] += size
+
+    def health(self) -> dict:
+        return {
+            "status": "healthy",
+            "model": settings.EMBEDDING_MODEL,
+            "uptime_sec": round(time.time() - self.started, 1),
+            "pending_texts": self.pending_texts,
+            "queued_slices": {priority: len(queue) for priority, queue in self.queues.items()},
+            **self.counters,
+        }
+
+    async def handle(self, reader, writer):
+        """Serves one worker connection; requests on it are answered in order."""
+        try:
+            while True:
+                try:
+                    header, _ = await read_frame_async(reader)
+                except asyncio.IncompleteReadError:
+                    break
+
+                op = header.get("op")
+                if op == "health":
+                    writer.write(encode_frame({"ok": True, **self.health()}))
+                elif op == "embed":
+                    priority = header.get("priority")
+                    if priority not in PRIORITIES:
+                        priority = "bulk"
+                    try:
+                        vectors = await self.embed(header.get("texts") or [], priority)
+                    except ServerBusy:
+                        writer.write(encode_frame({"ok": False, "error": "busy"}))
+                    except Exception as e:
+                        writer.write(encode_frame({"ok": False, "error": str(e)}))
+                    else:
+                        count, dim = vectors.shape if vectors.ndim == 2 else (0, 0)
+                        writer.write(encode_frame({"ok": True, "count": count, "dim": dim}, vectors.tobytes()))
+                else:
+                    writer.write(encode_frame({"ok": False, "error": f"Unknown op: {op}"}))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(args):
+    from app.services.embedding_service import load_local_embeddings
+
+    print(f"⏳ Loading embedding model {settings.EMBEDDING_MODEL}...")
+    model = load_local_embeddings()
+    server = EmbeddingServer(model, args.max_batch, args.max_wait_ms, args.max_queue)
+
+    if os.path.exists(args.socket):
+        os.remove(args.socket)  # stale socket from a previous run
+    unix_server = await asyncio.start_unix_server(server.handle, path=args.socket)
+    batcher = asyncio.create_task(server.run_batches())
+    print(f"✅ Embedding server listening on {args.socket}")
+    try:
+        async with unix_server:
+            await unix_server.serve_forever()
+    finally:
+        batcher.cancel()
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Shared embedding server over a Unix socket")
+    parser.add_argument("--socket", default=settings.EMBEDDING_SERVER_SOCKET, help="Unix socket path")
+    parser.add_argument("--max-batch", type=int, default=settings.EMBEDDING_SERVER_MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=settings.EMBEDDING_SERVER_MAX_WAIT_MS)
+    parser.add_argument("--max-queue", type=int, default=settings.EMBEDDING_SERVER_MAX_QUEUE)
+    parser.add_argument("--check", action="store_true", help="Query a running server's health and exit")
+    args = parser.parse_args(argv)
+    if not args.socket:
+        parser.error("--socket (or EMBEDDING_SERVER_SOCKET) is required")
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.check:
+        try:
+            print(json.dumps(RemoteEmbeddings(args.socket, timeout=5).health(), indent=2))
+            return 0
+        except EmbeddingServerError as e:
+            print(f"❌ {e}")
+            return 1
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,25 @@
 """FastAPI main application"""
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST
 from app.config import settings
-from app.database import init_db
-from app.api.routes import auth, documents, youtube, webpage
+from app.database import init_db, async_engine, AsyncSessionLocal
+from app.utils.security import password_hash_pool
+from app.utils.admission import AdmissionRejected
+from app.utils.metrics import render_metrics
+from app.api.routes import auth, documents, youtube, webpage, storage, analytics
+from app.services.embedding_service import preload_models
+from app.services.document_service import DocumentService
+from app.services.storage_service import StorageService
+import asyncio
 import os
 
+# The embedding model is normally loaded on first use. With PRELOAD_MODELS it is
+# loaded here instead, so 'gunicorn --preload' loads it once in the master process.
+if settings.PRELOAD_MODELS:
+    preload_models()
+
 # Create FastAPI app instance
 # title/version are used for the auto-generated Swagger documentation at /docs
 app = FastAPI(
@@ -26,11 +40,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opt-in request profiling: the middleware is not even installed unless enabled,
+# so normal deployments pay nothing for it.
+if settings.PROFILING_ENABLED:
+    from app.utils.profiling import ProfilingMiddleware
+    app.add_middleware(ProfilingMiddleware)
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    """Load shedding: chats over the user's rate or past the wait queue get a fast 429."""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Too many chat requests, please retry later", "reason": exc.reason},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 # Router Registration: Breaking the app into modules (auth, docs, youtube, web)
 app.include_router(auth.router)
 app.include_router(documents.router)
 app.include_router(youtube.router)
 app.include_router(webpage.router)
+app.include_router(storage.router)
+app.include_router(analytics.router)
 
 # Ensure required local directories exist for file uploads and AI indices
 os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
@@ -42,11 +73,28 @@ async def startup_event():
     Runs once when the server starts.
     Initializes the SQLite database tables based on our Python models.
     """
-    init_db()
+    await init_db()
     print(f"✅ {settings.APP_NAME} started successfully!")
     print(f"📁 Upload directory: {settings.UPLOAD_DIR}")
     print(f"🗄️ Vector store directory: {settings.VECTOR_STORE_DIR}")
 
+    # Documents interrupted by the last shutdown continue from their checkpoints
+    if settings.INGEST_RESUME_ON_STARTUP:
+        app.state.resume_task = asyncio.create_task(DocumentService.resume_interrupted(AsyncSessionLocal))
+
+    # Orphan sweep, failed-upload retention and cold-index compression (one worker at a time)
+    if settings.STORAGE_SWEEP_ENABLED:
+        app.state.storage_task = asyncio.create_task(StorageService.run_periodically())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Closes pooled database connections and stops the password hashing workers."""
+    for task_name in ("resume_task", "storage_task"):
+        if getattr(app.state, task_name, None):
+            getattr(app.state, task_name).cancel()
+    await async_engine.dispose()
+    password_hash_pool.shutdown()
+
 @app.get("/")
 async def root():
     """Simple health check and welcome message"""
@@ -60,3 +108,9 @@ async def root():
 async def health_check():
     """Standard health check endpoint for monitoring tools"""
     return {"status": "healthy"}
+
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """Prometheus scrape endpoint (stage latencies, caches, failures, queues)"""
+        return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
@@ -3,5 +3,6 @@ from app.models.user import User
 from app.models.document import Document
 from app.models.source import Source
 from app.models.conversation import Conversation
+from app.models.chat_metrics import ChatMetrics
 
-__all__ = ["User", "Document", "Source", "Conversation"]
+__all__ = ["User", "Document", "Source", "Conversation", "ChatMetrics"]
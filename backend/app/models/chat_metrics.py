@@ -0,0 +1,43 @@
+"""Chat metrics model: latency and token accounting for each answered question"""
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class ChatMetrics(Base):
+    """
+    One row per Conversation, written in the same transaction.
+    - *_ms: time spent in each stage of the answer (None if the stage never ran).
+    - prompt/completion_tokens: as reported by the LLM, or estimated from the text
+      length when it reports nothing (tokens_estimated).
+    - batch: answered through /chat/batch, where the index load, embedding and
+      retrieval times are shared by every question of the batch.
+    """
+    __tablename__ = "chat_metrics"
+
+    id = Column(Integer, primary_key=True, index=True)
+    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False, unique=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    source_id = Column(Integer, nullable=False)
+    source_type = Column(String, nullable=False)
+    batch = Column(Boolean, default=False)
+    failed = Column(Boolean, default=False)  # the answer is an error message
+
+    total_ms = Column(Float, nullable=False)
+    admission_ms = Column(Float, nullable=True)  # waiting for a chat slot
+    index_load_ms = Column(Float, nullable=True)
+    embedding_ms = Column(Float, nullable=True)
+    retrieval_ms = Column(Float, nullable=True)  # vector + BM25 search
+    llm_first_token_ms = Column(Float, nullable=True)
+    llm_ms = Column(Float, nullable=True)
+
+    prompt_tokens = Column(Integer, nullable=True)
+    completion_tokens = Column(Integer, nullable=True)
+    tokens_estimated = Column(Boolean, default=False)
+    chunks_used = Column(Integer, nullable=True)
+    context_chars = Column(Integer, nullable=True)
+    question_chars = Column(Integer, nullable=True)
+    history_turns = Column(Integer, nullable=True)
+    index_cache_hit = Column(Boolean, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
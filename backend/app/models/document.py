@@ -10,6 +10,9 @@ class Document(Base):
     - user_id: Foreign key linking to the owner.
     - file_path: Path to the raw PDF in 'uploads'.
     - vector_store_path: Path to the FAISS index folder in 'vector_stores'.
+    - content_hash: SHA-256 of the uploaded bytes, used to reuse existing indexes.
+    - claimed_by / claimed_at: the node processing it and its last heartbeat, so
+      nodes resuming interrupted work don't take over a live build.
     """
     __tablename__ = "documents"
     
@@ -18,6 +21,9 @@ class Document(Base):
     filename = Column(String, nullable=False)
     file_path = Column(String, nullable=False)
     file_type = Column(String, default="pdf")
+    content_hash = Column(String(64), nullable=True, index=True)
     vector_store_path = Column(String, nullable=True)
     status = Column(String, default="processing")  # 'processing', 'completed', 'failed'
     upload_date = Column(DateTime(timezone=True), server_default=func.now())
+    claimed_by = Column(String, nullable=True)
+    claimed_at = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,169 @@
+"""
+Bulk re-index: rebuilds existing indexes after EMBEDDING_MODEL / CHUNK_SIZE /
+CHUNK_OVERLAP changes, from the text kept next to each index.
+
+Each source is rebuilt into a new directory by a pool of worker processes, then the
+database rows are switched to it in one transaction, so chat keeps answering from
+the old index until the new one is complete. Old directories are removed after a
+grace period. Progress is appended to a state file, so an interrupted run can be
+started again and continues where it stopped.
+
+Usage (from the backend/ directory):
+    python -m app.reindex --dry-run
+    python -m app.reindex --workers 2 --rate 30
+    python -m app.reindex --all --source-type webpage --user-id 7
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import multiprocessing
+
+from app.config import settings
+from app.database import SessionLocal
+from app.services import index_archive
+from app.services.artifact_sync import ArtifactSync
+from app.services.reindex_service import ReindexService
+
+
+def _init_worker(nice: int):
+    """Worker processes run below the API server's CPU priority."""
+    if nice:
+        os.nice(nice)
+
+
+def _rebuild(job: dict, refetch: bool) -> dict:
+    return ReindexService.rebuild(job, refetch)
+
+
+class ReindexState:
+    """Append-only JSON lines; a path rebuilt under the current settings is not redone."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.fingerprint = ReindexService.fingerprint()
+        self.done = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    entry = json.loads(line)
+                    if entry.get("status") == "done" and entry.get("fingerprint") == self.fingerprint:
+                        self.done.add(entry["new_path"])
+
+    def record(self, **entry):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"time": time.time(), "fingerprint": self.fingerprint, **entry}) + "\n")
+
+
+def run(args) -> int:
+    # 1. Select the work
+    with SessionLocal() as db:
+        jobs = ReindexService.find_jobs(db, args.source_type, args.user_id, stale_only=not args.all)
+    state = ReindexState(args.state)
+    jobs = [job for job in jobs if job["path"] not in state.done]
+    print(f"🔁 {len(jobs)} index(es) to rebuild with {json.dumps(state.fingerprint)}")
+    if args.dry_run:
+        for job in jobs:
+            print(f"   {job['source_type']:<8} {job['path']}")
+        return 0
+    if not jobs:
+        return 0
+
+    # 2. Rebuild in worker processes, at most 'rate' starts per minute
+    workers = max(1, args.workers)
+    # Spawned workers read these when they start: split the cores between them
+    threads = str(max(1, (os.cpu_count() or 1) // workers))
+    os.environ.setdefault("EMBEDDING_BULK_THREADS", threads)
+    os.environ.setdefault("OMP_NUM_THREADS", threads)
+    interval = 60.0 / args.rate if args.rate > 0 else 0.0
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(args.nice,),
+    )
+    pending, in_flight = list(jobs), {}
+    retired, done, failed = [], 0, 0
+    started = last_start = time.monotonic()
+    try:
+        while pending or in_flight:
+            while pending and len(in_flight) < workers and time.monotonic() - last_start >= interval:
+                job = pending.pop(0)
+                in_flight[pool.submit(_rebuild, job, args.refetch)] = job
+                last_start = time.monotonic()
+            timeout = max(0.0, interval - (time.monotonic() - last_start)) if pending else None
+            finished, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for future in finished:
+                job = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    failed += 1
+                    state.record(status="failed", path=job["path"], error=f"{type(e).__name__}: {e}")
+                    print(f"❌ {job['source_type']} {job['path']}: {e}")
+                    continue
+
+                # 3. Switch the rows to the new index (one transaction per source)
+                with SessionLocal() as db:
+                    rows = ReindexService.publish(db, result["path"], result["new_path"])
+                if rows == 0:
+                    # The source was deleted or re-processed meanwhile
+                    index_archive.remove(result["new_path"])
+                    ArtifactSync.delete_index(result["new_path"])
+                else:
+                    retired.append((time.monotonic(), result["path"]))
+                done += 1
+                state.record(status="done", **result)
+
+                elapsed = time.monotonic() - started
+                finished_count = done + failed
+                eta = elapsed / finished_count * (len(jobs) - finished_count)
+                print(
+                    f"✅ [{finished_count}/{len(jobs)}] {result['source_type']} {result['chunks']} chunks "
+                    f"in {result['seconds']:.1f}s -> {os.path.basename(result['new_path'])} (ETA {eta:.0f}s)"
+                )
+    except KeyboardInterrupt:
+        print("⏹️ Interrupted; finished sources are recorded, run again to continue")
+        pool.shutdown(wait=False, cancel_futures=True)
+        return 130
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+        # 4. Old directories go once in-flight chats had time to finish with them
+        for switched_at, old_path in retired:
+            time.sleep(max(0.0, switched_at + args.grace - time.monotonic()))
+            index_archive.remove(old_path)
+            ArtifactSync.delete_index(old_path)
+
+    print(f"🏁 Rebuilt {done}, failed {failed}, in {time.monotonic() - started:.0f}s")
+    return 1 if failed else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild indexes after model or chunking changes")
+    parser.add_argument("--all", action="store_true", help="Rebuild every index, not only stale ones")
+    parser.add_argument("--source-type", action="append", choices=["document", "youtube", "webpage"],
+                        help="Limit to a source type (repeatable)")
+    parser.add_argument("--user-id", type=int, help="Limit to one user's sources")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes (each loads the model)")
+    parser.add_argument("--rate", type=float, default=0, help="Max sources started per minute (0 = no limit)")
+    parser.add_argument("--nice", type=int, default=10, help="CPU niceness added to worker processes")
+    parser.add_argument("--grace", type=float, default=30, help="Seconds before an old index is deleted")
+    parser.add_argument("--refetch", action="store_true",
+                        help="Download transcripts / pages again for indexes without kept text")
+    parser.add_argument("--state", default=os.path.join(settings.VECTOR_STORE_DIR, ".reindex_state.jsonl"),
+                        help="Progress file used to resume an interrupted run")
+    parser.add_argument("--dry-run", action="store_true", help="List what would be rebuilt and exit")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    return run(parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""Pydantic schemas for chat analytics"""
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+
+
+class LatencyPercentiles(BaseModel):
+    """Milliseconds; None when the stage never ran in the group"""
+    p50: Optional[float]
+    p90: Optional[float]
+    p99: Optional[float]
+
+
+class ChatAnalytics(BaseModel):
+    """Schema for one group (source type, user email or day) of chat metrics"""
+    group: str
+    requests: int
+    failed: int
+    prompt_tokens: int
+    completion_tokens: int
+    index_cache_hit_rate: Optional[float]
+    total_ms: LatencyPercentiles
+    index_load_ms: LatencyPercentiles
+    embedding_ms: LatencyPercentiles
+    retrieval_ms: LatencyPercentiles
+    llm_first_token_ms: LatencyPercentiles
+    llm_ms: LatencyPercentiles
+
+
+class SlowChat(BaseModel):
+    """Schema for one chat from the slow-request log"""
+    conversation_id: int
+    user_id: int
+    source_id: int
+    source_type: str
+    question: str
+    batch: bool
+    failed: bool
+    total_ms: float
+    admission_ms: Optional[float]
+    index_load_ms: Optional[float]
+    embedding_ms: Optional[float]
+    retrieval_ms: Optional[float]
+    llm_first_token_ms: Optional[float]
+    llm_ms: Optional[float]
+    prompt_tokens: Optional[int]
+    completion_tokens: Optional[int]
+    tokens_estimated: bool
+    chunks_used: Optional[int]
+    index_cache_hit: Optional[bool]
+    created_at: datetime
@@ -1,7 +1,7 @@
 """Pydantic schemas for chat and conversations"""
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 
 class ChatRequest(BaseModel):
@@ -11,6 +11,11 @@ class ChatRequest(BaseModel):
     source_type: str  # 'document', 'youtube', 'webpage'
 
 
+class BatchChatRequest(BaseModel):
+    """Schema for answering several independent questions about one source"""
+    questions: List[str]
+
+
 class ChatResponse(BaseModel):
     """Schema for chat response"""
     question: str
@@ -0,0 +1,14 @@
+"""Pydantic schemas for storage usage"""
+from pydantic import BaseModel
+from typing import Optional
+
+
+class StorageUsage(BaseModel):
+    """Schema for a user's disk usage (bytes)"""
+    user_id: int
+    upload_bytes: int
+    index_bytes: int
+    total_bytes: int
+    quota_bytes: Optional[int]
+    indexes: int
+    compressed_indexes: int
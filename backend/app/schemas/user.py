@@ -32,6 +32,7 @@ class Token(BaseModel):
     """Schema for JWT token response"""
     access_token: str
     token_type: str = "bearer"
+    affinity_key: Optional[str] = None  # sent back as AFFINITY_HEADER for node affinity
 
 
 class TokenData(BaseModel):
@@ -0,0 +1,203 @@
+"""
+Shared artifact storage for multi-node deployments: uploads and index directories
+are pushed to a store every node can read (a directory on a shared mount, or an
+S3-compatible bucket), and each node keeps local copies (see ArtifactSync).
+
+Index layout in the store, under 'indexes/<key>/':
+    <version>/<file>      the files of one build
+    MANIFEST.json         {"version": ..., "files": {name: size}} - written last
+Readers go through the manifest, so a build is visible only once all of its files
+are; the previous version's files are deleted afterwards. Uploads never change, so
+they are single objects under 'uploads/<key>'.
+"""
+import json
+import os
+import shutil
+import socket
+import time
+from abc import ABC, abstractmethod
+from app.config import settings
+
+MANIFEST = "MANIFEST.json"
+
+
+class ArtifactStore(ABC):
+    """Shared backends implement the five primitives; versioning lives here."""
+    name = "base"
+
+    @abstractmethod
+    def put_file(self, remote: str, local_path: str):
+        ...
+
+    @abstractmethod
+    def get_file(self, remote: str, local_path: str):
+        """Raises FileNotFoundError if the object does not exist."""
+
+    @abstractmethod
+    def read(self, remote: str) -> bytes | None:
+        ...
+
+    @abstractmethod
+    def write(self, remote: str, data: bytes):
+        ...
+
+    @abstractmethod
+    def delete_prefix(self, prefix: str):
+        ...
+
+    # Index directories
+
+    def manifest(self, key: str) -> dict | None:
+        raw = self.read(f"indexes/{key}/{MANIFEST}")
+        return json.loads(raw) if raw else None
+
+    def put_dir(self, key: str, local_dir: str) -> str:
+        """Uploads a complete index directory as a new version; returns the version."""
+        version = f"{time.time_ns()}-{socket.gethostname()}"
+        previous = self.manifest(key)
+        files = {}
+        with os.scandir(local_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.startswith("."):
+                    self.put_file(f"indexes/{key}/{version}/{entry.name}", entry.path)
+                    files[entry.name] = entry.stat().st_size
+        self.write(f"indexes/{key}/{MANIFEST}", json.dumps({"version": version, "files": files}).encode("utf-8"))
+        if previous:
+            self.delete_prefix(f"indexes/{key}/{previous['version']}/")
+        return version
+
+    def get_dir(self, key: str, local_dir: str) -> str | None:
+        """
+        Downloads the current version into local_dir (which must exist). Returns the
+        version, or None if the store has no such index. A version replaced while it
+        is being copied is retried with the new manifest.
+        """
+        for _ in range(3):
+            manifest = self.manifest(key)
+            if manifest is None:
+                return None
+            try:
+                for name in manifest["files"]:
+                    self.get_file(f"indexes/{key}/{manifest['version']}/{name}", os.path.join(local_dir, name))
+                return manifest["version"]
+            except FileNotFoundError:
+                continue
+        raise FileNotFoundError(f"Index {key} kept changing while it was downloaded")
+
+    def delete_dir(self, key: str):
+        self.delete_prefix(f"indexes/{key}/")
+
+
+class SharedDirStore(ArtifactStore):
+    """A directory on a mount every node sees (NFS, EFS, SMB...)."""
+    name = "shared"
+
+    def __init__(self, root: str):
+        if not root:
+            raise ValueError("ARTIFACT_BACKEND=shared needs ARTIFACT_SHARED_DIR")
+        self.root = root
+
+    def _path(self, remote: str) -> str:
+        return os.path.join(self.root, *remote.split("/"))
+
+    def put_file(self, remote, local_path):
+        target = self._path(remote)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(local_path, target + ".partial")
+        os.replace(target + ".partial", target)
+
+    def get_file(self, remote, local_path):
+        shutil.copyfile(self._path(remote), local_path)
+
+    def read(self, remote):
+        try:
+            with open(self._path(remote), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, remote, data):
+        target = self._path(remote)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target + ".partial", "wb") as f:
+            f.write(data)
+        os.replace(target + ".partial", target)
+
+    def delete_prefix(self, prefix):
+        path = self._path(prefix.rstrip("/"))
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
+
+
+class S3Store(ArtifactStore):
+    """
+    An S3 bucket, or any S3-compatible service (MinIO, Ceph, a local stand-in) via
+    ARTIFACT_S3_ENDPOINT_URL. Needs boto3, which is only imported for this backend.
+    """
+    name = "s3"
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: str = None):
+        if not bucket:
+            raise ValueError("ARTIFACT_BACKEND=s3 needs ARTIFACT_S3_BUCKET")
+        try:
+            import boto3
+        except ImportError as e:
+            raise RuntimeError("ARTIFACT_BACKEND=s3 requires boto3 (pip install boto3)") from e
+        self.client = boto3.client("s3", endpoint_url=endpoint_url or None)
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+
+    def _key(self, remote: str) -> str:
+        return self.prefix + remote
+
+    def _is_missing(self, error) -> bool:
+        return error.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+    def put_file(self, remote, local_path):
+        self.client.upload_file(local_path, self.bucket, self._key(remote))
+
+    def get_file(self, remote, local_path):
+        from botocore.exceptions import ClientError
+        try:
+            self.client.download_file(self.bucket, self._key(remote), local_path)
+        except ClientError as e:
+            if self._is_missing(e):
+                raise FileNotFoundError(remote) from e
+            raise
+
+    def read(self, remote):
+        from botocore.exceptions import ClientError
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self._key(remote))["Body"].read()
+        except ClientError as e:
+            if self._is_missing(e):
+                return None
+            raise
+
+    def write(self, remote, data):
+        self.client.put_object(Bucket=self.bucket, Key=self._key(remote), Body=data)
+
+    def delete_prefix(self, prefix):
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix)):
+            keys = [{"Key": obj["Key"]} for obj in page.get("Contents", [])]
+            if keys:
+                self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": keys})
+
+
+_store = None
+
+
+def get_artifact_store() -> ArtifactStore | None:
+    """The configured shared store, or None for single-node ('local') deployments."""
+    global _store
+    if _store is None and settings.ARTIFACT_BACKEND != "local":
+        if settings.ARTIFACT_BACKEND == "shared":
+            _store = SharedDirStore(settings.ARTIFACT_SHARED_DIR)
+        elif settings.ARTIFACT_BACKEND == "s3":
+            _store = S3Store(settings.ARTIFACT_S3_BUCKET, settings.ARTIFACT_S3_PREFIX, settings.ARTIFACT_S3_ENDPOINT_URL)
+        else:
+            raise ValueError(f"Unknown ARTIFACT_BACKEND {settings.ARTIFACT_BACKEND!r} (use 'local', 'shared' or 's3')")
+    return _store
@@ -0,0 +1,225 @@
+"""
+Keeps this node's UPLOAD_DIR / VECTOR_STORE_DIR in step with the shared artifact
+store. Locally the directories act as a read-through cache: a missing or outdated
+index is downloaded on first use, and copies that are safely in the store are
+evicted (least recently used first) beyond ARTIFACT_CACHE_MAX_MB.
+
+Every function is a no-op with ARTIFACT_BACKEND=local, so single-node deployments
+behave exactly as before.
+
+What stays per node: the orphan sweep, storage quotas and cold-index compression
+only look at this node's local copies (never at the store). Resuming interrupted
+documents is coordinated through the database instead of local file locks: each
+build claims its Document row and keeps the claim alive with a heartbeat, and
+other nodes only take over claims gone stale (see DocumentService._claim).
+"""
+import os
+import tempfile
+import threading
+from app.config import settings
+from app.services import index_archive
+from app.services.artifact_store import get_artifact_store
+from app.utils.cache import TTLCache
+from app.utils.metrics import CACHE_EVENTS, stats_collector
+
+# Inside each synced local index: the store version it is a copy of
+VERSION_FILE = ".artifact_version"
+
+# path -> store version; bounds how often a node asks the store whether an index changed
+_remote_versions = TTLCache(
+    "artifact_version",
+    max_size=10000,
+    ttl=settings.ARTIFACT_VERSION_CHECK_SECONDS
+)
+stats_collector.register("cache", _remote_versions.stats, cache="artifact_version")
+_fetching: dict[str, threading.Lock] = {}
+_fetching_guard = threading.Lock()
+
+
+def _key(path: str, root: str) -> str | None:
+    """Store key of a local path (relative to its root, '/'-separated); None outside the root."""
+    relative = os.path.relpath(os.path.abspath(path), os.path.abspath(root))
+    if relative.startswith(".."):
+        return None
+    return relative.replace(os.sep, "/")
+
+
+def _local_version(path: str) -> str | None:
+    try:
+        with open(os.path.join(path, VERSION_FILE)) as f:
+            return f.read().strip()
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+def _write_local_version(path: str, version: str):
+    with open(os.path.join(path, VERSION_FILE), "w") as f:
+        f.write(version)
+
+
+class ArtifactSync:
+    @staticmethod
+    def enabled() -> bool:
+        return get_artifact_store() is not None
+
+    @staticmethod
+    def push_index(vector_store_path: str):
+        """Uploads a freshly published index, so other nodes can serve it."""
+        store = get_artifact_store()
+        key = _key(vector_store_path, settings.VECTOR_STORE_DIR)
+        if store is None or key is None:
+            return
+        version = store.put_dir(key, vector_store_path)
+        _write_local_version(vector_store_path, version)
+        _remote_versions.set(key, version)
+
+    @staticmethod
+    def ensure_index(vector_store_path: str) -> bool:
+        """
+        Makes sure this node has the current version of an index, downloading it on
+        a miss (or when another node rebuilt it). Returns True if it downloaded.
+        Local-only indexes (never pushed, e.g. built before the store was enabled)
+        are left as they are.
+        """
+        store = get_artifact_store()
+        key = _key(vector_store_path, settings.VECTOR_STORE_DIR)
+        if store is None or key is None:
+            return False
+
+        local = _local_version(vector_store_path)
+        remote = _remote_versions.get(key)
+        if remote is None:
+            manifest = store.manifest(key)
+            if manifest is None:
+                return False
+            remote = manifest["version"]
+            _remote_versions.set(key, remote)
+        if local == remote:
+            CACHE_EVENTS.labels("node_index", "hit", "all").inc()
+            return False
+
+        with _fetching_guard:
+            lock = _fetching.setdefault(vector_store_path, threading.Lock())
+        try:
+            with lock:
+                if _local_version(vector_store_path) == remote:
+                    return False
+                CACHE_EVENTS.labels("node_index", "miss", "all").inc()
+                from app.services.index_service import IndexService
+
+                parent, name = os.path.split(os.path.normpath(vector_store_path))
+                os.makedirs(parent, exist_ok=True)
+                staging = tempfile.mkdtemp(prefix=f"{name}.partial-", dir=parent)
+                os.chmod(staging, 0o755)
+                try:
+                    version = store.get_dir(key, staging)
+                    if version is None:
+                        index_archive.remove_tree(staging)
+                        return False
+                    _write_local_version(staging, version)
+                    IndexService.publish(staging, vector_store_path)
+                except BaseException:
+                    index_archive.remove_tree(staging)
+                    raise
+                _remote_versions.set(key, version)
+        finally:
+            with _fetching_guard:
+                _fetching.pop(vector_store_path, None)
+
+        ArtifactSync.evict_indexes(keep=vector_store_path)
+        return True
+
+    @staticmethod
+    def index_exists(vector_store_path: str) -> bool:
+        """On this node (in any form) or in the store."""
+        if index_archive.exists(vector_store_path):
+            return True
+        store = get_artifact_store()
+        key = _key(vector_store_path, settings.VECTOR_STORE_DIR)
+        return store is not None and key is not None and store.manifest(key) is not None
+
+    @staticmethod
+    def read_index_file(vector_store_path: str, name: str) -> bytes | None:
+        """One file of the current stored version, without downloading the index."""
+        store = get_artifact_store()
+        key = _key(vector_store_path, settings.VECTOR_STORE_DIR)
+        manifest = store.manifest(key) if store is not None and key is not None else None
+        if manifest is None or name not in manifest["files"]:
+            return None
+        return store.read(f"indexes/{key}/{manifest['version']}/{name}")
+
+    @staticmethod
+    def delete_index(vector_store_path: str):
+        store = get_artifact_store()
+        key = _key(vector_store_path, settings.VECTOR_STORE_DIR)
+        if store is not None and key is not None:
+            store.delete_dir(key)
+            _remote_versions.invalidate(key)
+
+    @staticmethod
+    def evict_indexes(keep: str = None) -> int:
+        """
+        Deletes local index copies that are also in the store, least recently used
+        first, until the synced copies fit ARTIFACT_CACHE_MAX_MB. Returns how many.
+        """
+        budget = settings.ARTIFACT_CACHE_MAX_MB * 1024 * 1024
+        if not ArtifactSync.enabled() or budget <= 0 or not os.path.isdir(settings.VECTOR_STORE_DIR):
+            return 0
+        keep = os.path.abspath(keep) if keep else None
+        copies = []
+        with os.scandir(settings.VECTOR_STORE_DIR) as user_dirs:
+            for user_dir in user_dirs:
+                if not (user_dir.is_dir() and user_dir.name.isdigit()):
+                    continue
+                with os.scandir(user_dir.path) as entries:
+                    for entry in entries:
+                        if entry.is_dir() and _local_version(entry.path) is not None:
+                            copies.append((
+                                index_archive.last_used(entry.path),
+                                entry.path,
+                                index_archive.directory_bytes(entry.path)
+                            ))
+
+        total = sum(size for _, _, size in copies)
+        evicted = 0
+        for _, path, size in sorted(copies):
+            if total <= budget:
+                break
+            if os.path.abspath(path) == keep:
+                continue
+            if index_archive.remove_tree(path):
+                total -= size
+                evicted += 1
+        if evicted:
+            print(f"🧹 Evicted {evicted} local index copies (ARTIFACT_CACHE_MAX_MB)")
+        return evicted
+
+    @staticmethod
+    def push_upload(file_path: str):
+        store = get_artifact_store()
+        key = _key(file_path, settings.UPLOAD_DIR)
+        if store is not None and key is not None:
+            store.put_file(f"uploads/{key}", file_path)
+
+    @staticmethod
+    def ensure_upload(file_path: str):
+        """Downloads an upload this node has not seen (e.g. when resuming another node's job)."""
+        store = get_artifact_store()
+        key = _key(file_path, settings.UPLOAD_DIR)
+        if store is None or key is None or os.path.exists(file_path):
+            return
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        partial = f"{file_path}.part-{os.getpid()}"
+        try:
+            store.get_file(f"uploads/{key}", partial)
+            os.replace(partial, file_path)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+
+    @staticmethod
+    def delete_upload(file_path: str):
+        store = get_artifact_store()
+        key = _key(file_path, settings.UPLOAD_DIR)
+        if store is not None and key is not None:
+            store.delete_prefix(f"uploads/{key}")
@@ -0,0 +1,72 @@
+"""Batch question answering over a single source, streamed back as NDJSON"""
+import json
+from contextlib import aclosing
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.conversation import Conversation
+from app.services.chat_metrics_service import ChatMetricsService
+from app.services.rag_service import RAGService
+from app.utils.admission import AdmissionRejected, chat_admission
+
+
+class BatchChatService:
+    @staticmethod
+    async def stream_answers(
+        user_id: int,
+        source_id: int,
+        source_type: str,
+        vector_store_path: str,
+        questions: list[str]
+    ) -> StreamingResponse:
+        """
+        Answers a list of independent questions (no chat history) about one source.
+        Each line of the response is {"index", "question", "answer"}, sent as soon as
+        that answer is ready; each Q/A pair (with its ChatMetrics) is saved before it
+        is sent, so a client that disconnects keeps the answers it already got.
+        """
+        # 1. Validate the batch
+        questions = [q.strip() for q in questions if q and q.strip()]
+        if not questions:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No questions provided")
+        if len(questions) > settings.BATCH_CHAT_MAX_QUESTIONS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"At most {settings.BATCH_CHAT_MAX_QUESTIONS} questions per batch"
+            )
+
+        # 2. Rate limit (one token per question) and queue check before the response
+        # starts, so those rejections are still a plain 429
+        chat_admission.check(user_id, cost=len(questions))
+
+        async def body():
+            # 3. The chat slot is taken here, where the generator's own cleanup releases
+            # it: a response that is never iterated holds nothing. A queue that filled
+            # up (or timed out) meanwhile ends the stream with an error line.
+            traces = [None] * len(questions)
+            try:
+                async with (
+                    chat_admission.admit(user_id, cost=0),
+                    AsyncSessionLocal() as db,
+                    aclosing(RAGService.generate_batch(
+                        vector_store_path, questions, source_type=source_type, traces=traces
+                    )) as answers
+                ):
+                    async for index, answer in answers:
+                        # 4. Persist, then send (the request's own session is closed by now)
+                        conversation = Conversation(
+                            user_id=user_id,
+                            source_id=source_id,
+                            source_type=source_type,
+                            question=questions[index],
+                            answer=answer
+                        )
+                        db.add(conversation)
+                        await ChatMetricsService.record(db, conversation, traces[index], batch=True)
+                        await db.commit()
+                        yield json.dumps({"index": index, "question": questions[index], "answer": answer}) + "\n"
+            except AdmissionRejected as e:
+                yield json.dumps({"error": e.reason, "retry_after": e.retry_after}) + "\n"
+
+        return StreamingResponse(body(), media_type="application/x-ndjson")
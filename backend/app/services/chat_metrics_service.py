@@ -0,0 +1,149 @@
+"""Per-chat latency and token accounting: ChatMetrics rows, the slow-request log and admin analytics"""
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.models.chat_metrics import ChatMetrics
+from app.models.conversation import Conversation
+from app.models.user import User
+from app.utils.metrics import ChatTrace
+
+# Stage columns reported as percentiles by analytics()
+LATENCY_COLUMNS = ("total_ms", "index_load_ms", "embedding_ms", "retrieval_ms", "llm_first_token_ms", "llm_ms")
+PERCENTILES = (50, 90, 99)
+
+
+def _round(value: float | None) -> float | None:
+    return round(value, 1) if value is not None else None
+
+
+class ChatMetricsService:
+    @staticmethod
+    async def record(
+        db: AsyncSession,
+        conversation: Conversation,
+        trace: ChatTrace,
+        history_turns: int = 0,
+        batch: bool = False
+    ):
+        """
+        Adds the ChatMetrics row of a Conversation that was just added to the session,
+        so both are committed together by the caller. Chats slower than
+        CHAT_SLOW_REQUEST_MS are also logged with their breakdown.
+        """
+        if not settings.CHAT_METRICS_ENABLED:
+            return
+        if conversation.id is None:
+            # Assigns the id inside the caller's transaction (one flush covers a whole batch)
+            await db.flush()
+
+        metrics = ChatMetrics(
+            conversation_id=conversation.id,
+            user_id=conversation.user_id,
+            source_id=conversation.source_id,
+            source_type=conversation.source_type,
+            batch=batch,
+            failed=trace.failed,
+            total_ms=_round(trace.elapsed_ms()),
+            admission_ms=_round(trace.ms("admission")),
+            index_load_ms=_round(trace.ms("index_load")),
+            embedding_ms=_round(trace.ms("query_embedding")),
+            retrieval_ms=_round(trace.ms("vector_search", "lexical_search")),
+            llm_first_token_ms=_round(trace.ms("llm_first_token")),
+            llm_ms=_round(trace.ms("llm_total")),
+            prompt_tokens=trace.prompt_tokens,
+            completion_tokens=trace.completion_tokens,
+            tokens_estimated=trace.tokens_estimated,
+            chunks_used=trace.chunks_used,
+            context_chars=trace.context_chars,
+            question_chars=len(conversation.question),
+            history_turns=history_turns,
+            index_cache_hit=trace.index_cache_hit,
+        )
+        db.add(metrics)
+
+        if settings.CHAT_SLOW_REQUEST_MS and metrics.total_ms >= settings.CHAT_SLOW_REQUEST_MS:
+            breakdown = ", ".join(
+                f"{column[:-3]}={getattr(metrics, column):.0f}ms"
+                for column in ("admission_ms",) + LATENCY_COLUMNS[1:]
+                if getattr(metrics, column) is not None
+            )
+            print(
+                f"🐢 Slow chat: {metrics.total_ms:.0f}ms for user {metrics.user_id} on "
+                f"{metrics.source_type} {metrics.source_id} ({breakdown}; "
+                f"tokens {metrics.prompt_tokens}+{metrics.completion_tokens}, "
+                f"index cache {'hit' if metrics.index_cache_hit else 'miss'})"
+            )
+
+    @staticmethod
+    async def analytics(db: AsyncSession, group_by: str, days: int) -> list[dict]:
+        """
+        Latency percentiles, token totals and index cache hit rate over the last 'days',
+        per 'source_type', 'user' or 'day' (UTC). Busiest groups first, days in order.
+        """
+        since = datetime.now(timezone.utc) - timedelta(days=days)
+        columns = [getattr(ChatMetrics, column) for column in LATENCY_COLUMNS]
+        query = select(
+            ChatMetrics.source_type,
+            User.email,
+            ChatMetrics.created_at,
+            ChatMetrics.failed,
+            ChatMetrics.prompt_tokens,
+            ChatMetrics.completion_tokens,
+            ChatMetrics.index_cache_hit,
+            *columns
+        ).join(User, User.id == ChatMetrics.user_id).where(ChatMetrics.created_at >= since.replace(tzinfo=None))
+        rows = (await db.execute(query)).all()
+
+        groups: dict[str, list] = {}
+        for row in rows:
+            if group_by == "user":
+                key = row.email
+            elif group_by == "day":
+                key = row.created_at.date().isoformat()
+            else:
+                key = row.source_type
+            groups.setdefault(key, []).append(row)
+
+        report = []
+        for key, group in groups.items():
+            entry = {
+                "group": key,
+                "requests": len(group),
+                "failed": sum(1 for row in group if row.failed),
+                "prompt_tokens": sum(row.prompt_tokens or 0 for row in group),
+                "completion_tokens": sum(row.completion_tokens or 0 for row in group),
+            }
+            outcomes = [row.index_cache_hit for row in group if row.index_cache_hit is not None]
+            entry["index_cache_hit_rate"] = round(sum(outcomes) / len(outcomes), 3) if outcomes else None
+            for column in LATENCY_COLUMNS:
+                values = np.array([getattr(row, column) for row in group if getattr(row, column) is not None])
+                entry[column] = {
+                    f"p{p}": _round(float(np.percentile(values, p))) if len(values) else None
+                    for p in PERCENTILES
+                }
+            report.append(entry)
+
+        if group_by == "day":
+            return sorted(report, key=lambda entry: entry["group"])
+        return sorted(report, key=lambda entry: entry["requests"], reverse=True)
+
+    @staticmethod
+    async def slow_requests(db: AsyncSession, days: int, limit: int) -> list[dict]:
+        """The slowest chats (at or above CHAT_SLOW_REQUEST_MS) of the last 'days', slowest first."""
+        since = datetime.now(timezone.utc) - timedelta(days=days)
+        result = await db.execute(
+            select(ChatMetrics, Conversation.question)
+            .join(Conversation, Conversation.id == ChatMetrics.conversation_id)
+            .where(
+                ChatMetrics.created_at >= since.replace(tzinfo=None),
+                ChatMetrics.total_ms >= settings.CHAT_SLOW_REQUEST_MS
+            )
+            .order_by(ChatMetrics.total_ms.desc())
+            .limit(limit)
+        )
+        return [
+            {**{column.name: getattr(metrics, column.name) for column in ChatMetrics.__table__.columns}, "question": question}
+            for metrics, question in result.all()
+        ]
@@ -0,0 +1,124 @@
+"""Near-duplicate chunk removal (MinHash + LSH) between chunking and embedding"""
+import re
+import zlib
+from typing import TYPE_CHECKING
+import numpy as np
+from app.config import settings
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document as LCDocument
+
+_WORD = re.compile(r"\w+")
+
+# Universal hashing (a * x + b) mod p over 32-bit shingle hashes; a, b < 2**31 keeps
+# a * x + b inside uint64
+_PRIME = np.uint64(4294967311)
+_SHINGLE_BASE = np.uint64(1000003)
+
+
+def _hash_permutations(count: int) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(1)
+    return (
+        rng.integers(1, 2 ** 31, size=count, dtype=np.uint64),
+        rng.integers(0, 2 ** 31, size=count, dtype=np.uint64),
+    )
+
+
+class ChunkDeduplicator:
+    """
+    Drops chunks whose word-shingle Jaccard similarity with an earlier chunk is at
+    least DEDUP_THRESHOLD (repeated headers/footers, boilerplate pages, template text,
+    looping auto-captions).
+
+    Each chunk gets a MinHash signature of DEDUP_NUM_PERM values, split into
+    DEDUP_BANDS bands. Chunks sharing any band bucket are candidates, and candidates
+    are confirmed with the exact Jaccard of their shingle sets, so the threshold is
+    never applied to an estimate. The first occurrence survives.
+    """
+
+    def __init__(self):
+        self.shingle_size = settings.DEDUP_SHINGLE_SIZE
+        self.threshold = settings.DEDUP_THRESHOLD
+        self.bands = settings.DEDUP_BANDS
+        self.rows = settings.DEDUP_NUM_PERM // self.bands
+        self.a, self.b = _hash_permutations(self.bands * self.rows)
+        self._token_hashes: dict[str, int] = {}
+
+    def shingles(self, text: str) -> np.ndarray:
+        """Sorted unique 32-bit hashes of the text's overlapping word n-grams."""
+        hashes = self._token_hashes
+        words = _WORD.findall(text.lower())
+        for word in set(words).difference(hashes):
+            hashes[word] = zlib.crc32(word.encode())
+        tokens = np.array([hashes[word] for word in words], dtype=np.uint64)
+        if len(tokens) == 0:
+            return tokens
+        size = min(self.shingle_size, len(tokens))
+        # Polynomial rolling combination of 'size' consecutive token hashes
+        combined = np.zeros(len(tokens) - size + 1, dtype=np.uint64)
+        for offset in range(size):
+            combined = combined * _SHINGLE_BASE + tokens[offset:offset + len(combined)]
+        return np.unique(combined & np.uint64(0xFFFFFFFF))
+
+    def signature(self, shingles: np.ndarray) -> np.ndarray:
+        return ((np.outer(self.a, shingles) + self.b[:, None]) % _PRIME).min(axis=1)
+
+    @staticmethod
+    def jaccard(left: np.ndarray, right: np.ndarray) -> float:
+        shared = len(np.intersect1d(left, right, assume_unique=True))
+        return shared / (len(left) + len(right) - shared)
+
+    def find_duplicates(self, texts: list[str]) -> list[int | None]:
+        """For each text, the position of the earlier text it duplicates (None if it survives)."""
+        buckets: dict[tuple[int, bytes], list[int]] = {}
+        kept_shingles: dict[int, np.ndarray] = {}
+        exact: dict[str, int] = {}
+        duplicate_of: list[int | None] = []
+
+        for i, text in enumerate(texts):
+            # Identical text (after whitespace/case normalisation) needs no hashing
+            normalized = " ".join(text.lower().split())
+            if normalized in exact:
+                duplicate_of.append(exact[normalized])
+                continue
+
+            shingles = self.shingles(text)
+            if len(shingles) == 0:
+                exact[normalized] = i
+                duplicate_of.append(None)
+                continue
+
+            signature = self.signature(shingles)
+            keys = [
+                (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+                for band in range(self.bands)
+            ]
+            candidates = {j for key in keys for j in buckets.get(key, ())}
+            match = next(
+                (j for j in sorted(candidates) if self.jaccard(shingles, kept_shingles[j]) >= self.threshold),
+                None
+            )
+            duplicate_of.append(match)
+            if match is None:
+                exact[normalized] = i
+                kept_shingles[i] = shingles
+                for key in keys:
+                    buckets.setdefault(key, []).append(i)
+        return duplicate_of
+
+    def deduplicate(self, chunks: list["LCDocument"]) -> list["LCDocument"]:
+        """
+        Surviving chunks, in order. A survivor's metadata lists the chunks merged into
+        it under 'merged_from' (original chunk position, plus the page for PDFs).
+        """
+        duplicate_of = self.find_duplicates([chunk.page_content for chunk in chunks])
+        survivors = []
+        for i, (chunk, target) in enumerate(zip(chunks, duplicate_of)):
+            if target is None:
+                survivors.append(chunk)
+                continue
+            reference = {"chunk": i}
+            if "page" in chunk.metadata:
+                reference["page"] = chunk.metadata["page"]
+            chunks[target].metadata.setdefault("merged_from", []).append(reference)
+        return survivors
@@ -1,29 +1,57 @@
 """Service for processing documents and managing vector stores"""
+import asyncio
 import os
-import shutil
-from datetime import datetime
+import hashlib
+import socket
+from datetime import datetime, timedelta, timezone
 from fastapi import UploadFile, HTTPException, status
-from sqlalchemy.orm import Session
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, func, update, or_
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.config import settings
 from app.models.document import Document
 from app.models.user import User
+from app.services import index_archive
+from app.services.artifact_sync import ArtifactSync
+from app.services.index_service import IndexService
+from app.services.pdf_extraction import extract_pdf
+from app.services.storage_service import StorageService
+from app.utils.locks import try_lock
+from app.utils.metrics import track_stage, track_queue, CACHE_EVENTS
+from app.utils.profiling import profile_thread
+
+def _upload_too_large() -> HTTPException:
+    limit_mb = settings.MAX_UPLOAD_SIZE / (1024 * 1024)
+    return HTTPException(
+        status_code=413,
+        detail=f"File exceeds the {limit_mb:g}MB upload limit"
+    )
+
+
+def _node_id() -> str:
+    return settings.NODE_ID or socket.gethostname()
+
+
+def _write_and_hash(buffer, hasher, chunk: bytes):
+    """Runs in a worker thread: one hop per chunk for both disk write and SHA-256."""
+    hasher.update(chunk)
+    buffer.write(chunk)
 
-# Initialize the embedding model globally for the service
-# HuggingFaceEmbeddings converts text chunks into mathematical vectors (384 dimensions)
-embeddings = HuggingFaceEmbeddings(model_name=settings.EMBEDDING_MODEL)
 
 class DocumentService:
     @staticmethod
-    async def save_upload_file(file: UploadFile, user_id: int) -> str:
+    async def save_upload_file(file: UploadFile, user_id: int) -> tuple[str, str, int]:
         """
-        Saves an uploaded file to the local disk.
+        Streams an uploaded file to the local disk.
         Files are stored in a user-specific directory within the 'uploads' folder.
         A timestamp is prefixed to prevent filename collisions.
+        Returns (file_path, sha256 hex digest, size in bytes).
+        Raises 413 as soon as the stream grows past MAX_UPLOAD_SIZE.
         """
+        # Fail before touching the disk when the size is already known
+        if file.size is not None and file.size > settings.MAX_UPLOAD_SIZE:
+            raise _upload_too_large()
+
         user_upload_dir = os.path.join(settings.UPLOAD_DIR, str(user_id))
         os.makedirs(user_upload_dir, exist_ok=True)
         
@@ -31,38 +59,100 @@ class DocumentService:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"{timestamp}_{file.filename}"
         file_path = os.path.join(user_upload_dir, filename)
+        partial_path = file_path + ".part"
         
-        # Copy the file stream from FastAPI's UploadFile object to a physical file on disk
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Copy the stream chunk by chunk, hashing as we go, so large files never
+        # sit in memory and the event loop only awaits each chunk.
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            with open(partial_path, "wb") as buffer:
+                while True:
+                    chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > settings.MAX_UPLOAD_SIZE:
+                        raise _upload_too_large()
+                    await run_in_threadpool(_write_and_hash, buffer, hasher, chunk)
+            # Only complete files ever appear under the final name
+            os.replace(partial_path, file_path)
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
             
-        return file_path
+        return file_path, hasher.hexdigest(), size
+
+    @staticmethod
+    async def find_indexed_duplicate(db: AsyncSession, user_id: int, content_hash: str):
+        """
+        Returns the user's most recent completed Document with identical content,
+        provided its index is still on disk, else None.
+        """
+        result = await db.execute(select(Document).where(
+            Document.user_id == user_id,
+            Document.content_hash == content_hash,
+            Document.status == "completed",
+            Document.vector_store_path.isnot(None)
+        ).order_by(Document.id.desc()))
+        for candidate in result.scalars().all():
+            if await run_in_threadpool(ArtifactSync.index_exists, candidate.vector_store_path):
+                return candidate
+        return None
 
     @staticmethod
     async def process_document(
-        db: Session,
+        db: AsyncSession,
         user: User,
         file: UploadFile
     ) -> Document:
         """
         Initializes the document entry in the database.
-        The actual AI processing is handled in the background.
+        The actual AI processing is handled in the background, unless the user
+        already has an indexed copy of the same file: then the new entry links to
+        the existing upload and index and is created as 'completed'.
         """
-        # Step 1: Physical File Storage
-        file_path = await DocumentService.save_upload_file(file, user.id)
+        # Step 0: Per-user storage quota (the upload size is known up front for most clients)
+        await run_in_threadpool(StorageService.check_quota, user.id, file.size or 0)
+
+        # Step 1: Physical File Storage (streamed + hashed)
+        file_path, content_hash, _ = await DocumentService.save_upload_file(file, user.id)
         
-        # Step 2: Database Persistence (Initial state)
-        new_doc = Document(
-            user_id=user.id,
-            filename=file.filename,
-            file_path=file_path,
-            file_type="pdf",
-            status="processing"
-        )
+        # Step 2: Duplicate short-circuit (same bytes -> same index)
+        duplicate = await DocumentService.find_indexed_duplicate(db, user.id, content_hash)
+        CACHE_EVENTS.labels("upload_dedup", "hit" if duplicate else "miss", "document").inc()
+        if duplicate:
+            os.remove(file_path)
+            new_doc = Document(
+                user_id=user.id,
+                filename=file.filename,
+                file_path=duplicate.file_path,
+                file_type="pdf",
+                content_hash=content_hash,
+                vector_store_path=duplicate.vector_store_path,
+                status="completed"
+            )
+        else:
+            # Shared with the other nodes only once we know it is kept
+            await run_in_threadpool(ArtifactSync.push_upload, file_path)
+
+            # Step 3: Database Persistence (Initial state)
+            new_doc = Document(
+                user_id=user.id,
+                filename=file.filename,
+                file_path=file_path,
+                file_type="pdf",
+                content_hash=content_hash,
+                status="processing",
+                # Claimed from the start, so other nodes' resume loops leave it to us
+                claimed_by=_node_id(),
+                claimed_at=datetime.now(timezone.utc).replace(tzinfo=None)
+            )
         
         db.add(new_doc)
-        db.commit()
-        db.refresh(new_doc)
+        await db.commit()
+        await db.refresh(new_doc)
         
         return new_doc
 
@@ -73,89 +163,202 @@ class DocumentService:
     ):
         """
         Background task to perform text extraction and embedding generation.
+        db_factory must return an AsyncSession (e.g. AsyncSessionLocal).
+        Two guards keep the same document from being processed twice at once:
+        a file lock between workers of this node, and a claim on the row (kept
+        alive by a heartbeat) between nodes sharing the database.
+        The (empty) lock file is left in place: unlinking it while a worker may
+        have it open would let two workers lock different inodes of the same path.
         """
-        db = db_factory()
-        doc = db.query(Document).filter(Document.id == doc_id).first()
-        if not doc:
-            return
+        lock_path = os.path.join(settings.VECTOR_STORE_DIR, ".locks", f"document-{doc_id}.lock")
+        with try_lock(lock_path) as acquired:
+            if not acquired:
+                return
+            if not await DocumentService._claim(doc_id, db_factory):
+                return
+            heartbeat = asyncio.create_task(DocumentService._heartbeat(doc_id, db_factory))
+            try:
+                await DocumentService._process_locked(doc_id, db_factory)
+            finally:
+                heartbeat.cancel()
 
-        try:
-            # Step 2: Content Extraction
-            loader = PyPDFLoader(doc.file_path)
-            pages = loader.load()
-            
-            # Step 3: Text Chunking
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=settings.CHUNK_SIZE,
-                chunk_overlap=settings.CHUNK_OVERLAP
-            )
-            chunks = text_splitter.split_documents(pages)
-            
-            if not chunks:
-                raise ValueError("No text extracted from document")
-                
-            # Step 4: Vector Store Creation (FAISS)
-            vectorstore = FAISS.from_documents(chunks, embeddings)
-            
-            # Step 5: Save Vector Index to Disk
-            vector_store_name = os.path.basename(doc.file_path) + "_faiss"
-            vector_store_path = os.path.join(settings.VECTOR_STORE_DIR, str(doc.user_id), vector_store_name)
-            os.makedirs(os.path.dirname(vector_store_path), exist_ok=True)
-            
-            vectorstore.save_local(vector_store_path)
-            
-            # Update Document status
-            doc.vector_store_path = vector_store_path
-            doc.status = "completed"
-            db.commit()
+    @staticmethod
+    async def _claim(doc_id: int, db_factory: callable) -> bool:
+        """
+        Atomically marks a 'processing' document as ours, unless another node holds a
+        claim with a recent heartbeat. Claims of this node (e.g. before a restart)
+        are taken back at once; the file lock already rules out a live local build.
+        """
+        stale = datetime.now(timezone.utc) - timedelta(seconds=settings.INGEST_CLAIM_STALE_SECONDS)
+        async with db_factory() as db:
+            result = await db.execute(update(Document).where(
+                Document.id == doc_id,
+                Document.status == "processing",
+                or_(
+                    Document.claimed_by.is_(None),
+                    Document.claimed_by == _node_id(),
+                    Document.claimed_at < stale.replace(tzinfo=None)
+                )
+            ).values(claimed_by=_node_id(), claimed_at=datetime.now(timezone.utc).replace(tzinfo=None)))
+            await db.commit()
+            return result.rowcount == 1
+
+    @staticmethod
+    async def _heartbeat(doc_id: int, db_factory: callable):
+        """Refreshes our claim while the build runs (cancelled when it ends)."""
+        while True:
+            await asyncio.sleep(settings.INGEST_CLAIM_STALE_SECONDS / 4)
+            try:
+                async with db_factory() as db:
+                    await db.execute(update(Document).where(
+                        Document.id == doc_id, Document.claimed_by == _node_id()
+                    ).values(claimed_at=datetime.now(timezone.utc).replace(tzinfo=None)))
+                    await db.commit()
+            except Exception as e:
+                print(f"⚠️ Heartbeat for document {doc_id} failed: {e}")
+
+    @staticmethod
+    async def _process_locked(doc_id: int, db_factory: callable):
+        with track_queue("ingestion", "document"):
+            async with db_factory() as db:
+                result = await db.execute(select(Document).where(Document.id == doc_id))
+                doc = result.scalars().first()
+                # Someone else may have finished it between the listing and the lock
+                if not doc or doc.status != "processing":
+                    return
+                # End the read transaction so the build below doesn't keep a pooled
+                # connection checked out (doc stays readable: expire_on_commit=False)
+                await db.commit()
+
+                try:
+                    # Steps 2-5 are CPU-bound, so they run in a worker thread
+                    # to keep the event loop free for other requests.
+                    vector_store_path = await run_in_threadpool(
+                        DocumentService.build_vector_store,
+                        doc.file_path,
+                        doc.user_id
+                    )
+                    
+                    # Update Document status
+                    doc.vector_store_path = vector_store_path
+                    doc.status = "completed"
+                    await db.commit()
+                    
+                except Exception as e:
+                    print(f"Error processing document {doc_id}: {str(e)}")
+                    doc.status = "failed"
+                    await db.commit()
+
+    @staticmethod
+    async def resume_interrupted(db_factory: callable):
+        """
+        Runs at startup: documents left 'processing' by a crash or restart are processed
+        again, one at a time. Their embedding checkpoints (see IndexService.build_index)
+        make this continue roughly where the previous attempt stopped.
+        Documents claimed by a live node are skipped. With a shared artifact store
+        (several nodes) this keeps checking, so the work of a node that went away
+        is adopted once its claim goes stale.
+        """
+        while True:
+            stale = datetime.now(timezone.utc) - timedelta(seconds=settings.INGEST_CLAIM_STALE_SECONDS)
+            async with db_factory() as db:
+                result = await db.execute(
+                    select(Document.id).where(
+                        Document.status == "processing",
+                        or_(
+                            Document.claimed_by.is_(None),
+                            Document.claimed_by == _node_id(),
+                            Document.claimed_at < stale.replace(tzinfo=None)
+                        )
+                    ).order_by(Document.id)
+                )
+                doc_ids = result.scalars().all()
+            if doc_ids:
+                print(f"🔁 Resuming {len(doc_ids)} interrupted document(s)")
+            for doc_id in doc_ids:
+                await DocumentService.background_process_document(doc_id, db_factory)
+            if not ArtifactSync.enabled():
+                return
+            await asyncio.sleep(settings.INGEST_CLAIM_STALE_SECONDS)
+
+    @staticmethod
+    @profile_thread("document")
+    def build_vector_store(file_path: str, user_id: int) -> str:
+        """
+        Extracts, chunks and embeds a PDF, then saves the index.
+        Returns the path of the saved index.
+        """
+        # Step 2: Content Extraction (one Document per page; see pdf_extraction)
+        ArtifactSync.ensure_upload(file_path)
+        with track_stage("pdf_parse", "document"):
+            pages = extract_pdf(file_path)
+        
+        # Step 3: Text Chunking
+        chunks = IndexService.split_documents(pages, "document")
+        
+        if not chunks:
+            raise ValueError("No text extracted from document")
             
-        except Exception as e:
-            print(f"Error processing document {doc_id}: {str(e)}")
-            doc.status = "failed"
-            db.commit()
-        finally:
-            db.close()
+        # Steps 4-5: Vector Store Creation (FAISS or NumPy) and Save to Disk
+        vector_store_name = os.path.basename(file_path) + "_faiss"
+        vector_store_path = os.path.join(settings.VECTOR_STORE_DIR, str(user_id), vector_store_name)
+        IndexService.build_index(chunks, vector_store_path, "document", documents=pages)
+        return vector_store_path
 
     @staticmethod
-    def get_user_documents(db: Session, user_id: int):
+    async def get_user_documents(db: AsyncSession, user_id: int):
         """Retrieves all document metadata for a specific user from the DB."""
-        return db.query(Document).filter(Document.user_id == user_id).all()
+        result = await db.execute(select(Document).where(Document.user_id == user_id))
+        return result.scalars().all()
 
     @staticmethod
-    def get_document(db: Session, doc_id: int, user_id: int) -> Document:
+    async def get_document(db: AsyncSession, doc_id: int, user_id: int) -> Document:
         """Fetches a single document, ensuring it belongs to the requesting user."""
-        doc = db.query(Document).filter(
+        result = await db.execute(select(Document).where(
             Document.id == doc_id,
             Document.user_id == user_id
-        ).first()
+        ))
+        doc = result.scalars().first()
         if not doc:
             raise HTTPException(status_code=404, detail="Document not found")
         return doc
 
     @staticmethod
-    def delete_document(db: Session, doc_id: int, user_id: int):
+    async def delete_document(db: AsyncSession, doc_id: int, user_id: int):
         """
         Hard-deletes a document:
         1. Deletes the raw PDF file
         2. Deletes the FAISS index folder
         3. Removes the database record
+        Files shared with a duplicate upload are kept until the last reference goes.
         """
-        doc = DocumentService.get_document(db, doc_id, user_id)
+        doc = await DocumentService.get_document(db, doc_id, user_id)
+        
+        async def is_shared(column, value) -> bool:
+            result = await db.execute(
+                select(func.count()).select_from(Document).where(
+                    Document.id != doc.id,
+                    column == value
+                )
+            )
+            return result.scalar() > 0
         
-        # 1. Delete physical source file
-        if os.path.exists(doc.file_path):
+        # 1. Delete physical source file (and its shared-store copy)
+        if not await is_shared(Document.file_path, doc.file_path):
             try:
                 os.remove(doc.file_path)
-            except OSError:
-                pass # Already gone or locked
-                
-        # 2. Delete the AI index (folder of .faiss and .pkl files)
-        if os.path.exists(doc.vector_store_path):
-            try:
-                shutil.rmtree(doc.vector_store_path)
-            except OSError:
+            except FileNotFoundError:
                 pass
+            except OSError as e:
+                # Left for the storage sweep (see StorageService.sweep_orphans)
+                print(f"⚠️ Could not delete {doc.file_path}: {e}")
+            await run_in_threadpool(ArtifactSync.delete_upload, doc.file_path)
+                
+        # 2. Delete the AI index (directory, or its archive if it was compressed)
+        if doc.vector_store_path and not await is_shared(Document.vector_store_path, doc.vector_store_path):
+            await run_in_threadpool(index_archive.remove, doc.vector_store_path)
+            await run_in_threadpool(ArtifactSync.delete_index, doc.vector_store_path)
                 
         # 3. Finalize DB removal
-        db.delete(doc)
-        db.commit()
+        await db.delete(doc)
+        await db.commit()
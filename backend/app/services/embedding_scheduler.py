@@ -0,0 +1,169 @@
+"""Two-lane scheduler in front of the in-process embedding model"""
+import os
+import sys
+import threading
+import time
+from collections import deque
+from langchain_core.embeddings import Embeddings
+from app.utils.metrics import EMBEDDING_LANE_DEPTH, EMBEDDING_LANE_WAIT, EMBEDDING_LANE_TEXTS
+
+LANES = ("interactive", "bulk")
+
+
+class _Job:
+    """One embed call waiting for (or being processed by) the scheduler thread."""
+
+    def __init__(self, texts: list[str], lane: str):
+        self.texts = texts
+        self.lane = lane
+        self.offset = 0  # next text to embed (bulk jobs run in slices)
+        self.vectors = []
+        self.error = None
+        self.submitted = time.perf_counter()
+        self.done = threading.Event()
+
+    def finish(self, error: Exception = None):
+        self.error = error
+        self.done.set()
+
+
+class EmbeddingScheduler:
+    """
+    Owns all calls into the model from one thread.
+
+    - interactive: every queued query is embedded together in one model call,
+      always before the next bulk slice.
+    - bulk: ingestion jobs run first-come first-served in slices of bulk_batch_size
+      texts, so a waiting query is delayed by at most one slice (preemption at
+      batch boundaries).
+
+    Bulk work can additionally be limited to bulk_threads PyTorch threads and/or a
+    bulk_cpu_share of wall time (the scheduler rests between slices, waking up
+    immediately when a query arrives).
+
+    The thread starts on the first submit, in the process that submits: a scheduler
+    created in the gunicorn master (PRELOAD_MODELS) is inherited by forked workers
+    without its thread, so each child resets it and starts its own.
+    """
+
+    def __init__(self, model, bulk_batch_size: int = 32, bulk_threads: int = None, bulk_cpu_share: float = 1.0):
+        self.model = model
+        self.bulk_batch_size = max(1, bulk_batch_size)
+        self.bulk_threads = bulk_threads
+        self.bulk_cpu_share = min(1.0, max(0.05, bulk_cpu_share))
+        self._default_threads = None
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        """Fresh queues and locks, no thread yet (also runs in a forked child)."""
+        self.lanes = {lane: deque() for lane in LANES}
+        self.condition = threading.Condition()
+        self.rest_until = 0.0
+        self._thread = None
+
+    def _ensure_thread(self):
+        with self.condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="embedding-scheduler", daemon=True)
+                self._thread.start()
+
+    def submit(self, texts: list[str], lane: str) -> list[list[float]]:
+        """Blocks the calling (worker) thread until all texts are embedded."""
+        if not texts:
+            return []
+        self._ensure_thread()
+        job = _Job(texts, lane)
+        with self.condition:
+            self.lanes[lane].append(job)
+            EMBEDDING_LANE_DEPTH.labels(lane).inc(len(texts))
+            self.condition.notify()
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.vectors
+
+    def _next_work(self) -> tuple[str, list[_Job], list[str]]:
+        """Waits for work; returns (lane, jobs, texts) for the next model call."""
+        with self.condition:
+            while True:
+                interactive, bulk = self.lanes["interactive"], self.lanes["bulk"]
+                if interactive:
+                    jobs = list(interactive)
+                    interactive.clear()
+                    return "interactive", jobs, [text for job in jobs for text in job.texts]
+
+                now = time.monotonic()
+                if bulk and now >= self.rest_until:
+                    job = bulk[0]
+                    texts = job.texts[job.offset:job.offset + self.bulk_batch_size]
+                    return "bulk", [job], texts
+
+                # Idle, or resting to honour the bulk CPU share; a query wakes us up
+                self.condition.wait(timeout=self.rest_until - now if bulk else None)
+
+    def _set_threads(self, lane: str):
+        # Only touch PyTorch if the model already imported it
+        torch = sys.modules.get("torch")
+        if torch is None or not self.bulk_threads:
+            return
+        if self._default_threads is None:
+            self._default_threads = torch.get_num_threads()
+        torch.set_num_threads(self.bulk_threads if lane == "bulk" else self._default_threads)
+
+    def _run(self):
+        while True:
+            lane, jobs, texts = self._next_work()
+            started = time.perf_counter()
+            for job in jobs:
+                if job.offset == 0:
+                    EMBEDDING_LANE_WAIT.labels(lane).observe(started - job.submitted)
+
+            try:
+                self._set_threads(lane)
+                vectors = self.model.embed_documents(texts)
+                error = None
+            except Exception as e:
+                vectors, error = [], e
+            elapsed = time.perf_counter() - started
+            EMBEDDING_LANE_DEPTH.labels(lane).dec(len(texts))
+            EMBEDDING_LANE_TEXTS.labels(lane).inc(len(texts))
+
+            with self.condition:
+                if lane == "interactive":
+                    position = 0
+                    for job in jobs:
+                        job.vectors = vectors[position:position + len(job.texts)]
+                        position += len(job.texts)
+                        job.finish(error)
+                    continue
+
+                job = jobs[0]
+                job.vectors.extend(vectors)
+                job.offset += len(texts)
+                if error is not None or job.offset >= len(job.texts):
+                    self.lanes["bulk"].popleft()
+                    if error is not None:
+                        # The failed job's remaining slices are dropped from the lane
+                        EMBEDDING_LANE_DEPTH.labels(lane).dec(max(0, len(job.texts) - job.offset))
+                    job.finish(error)
+                if self.bulk_cpu_share < 1.0:
+                    rest = elapsed * (1 - self.bulk_cpu_share) / self.bulk_cpu_share
+                    self.rest_until = time.monotonic() + rest
+
+
+class ScheduledEmbeddings(Embeddings):
+    """LangChain Embeddings that route queries and documents through the scheduler lanes."""
+
+    def __init__(self, scheduler: EmbeddingScheduler):
+        self.scheduler = scheduler
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.scheduler.submit(list(texts), "bulk")
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.scheduler.submit([text], "interactive")[0]
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        """Several queries in one interactive job (a batch chat's questions)."""
+        return self.scheduler.submit(list(texts), "interactive")
@@ -0,0 +1,74 @@
+"""Process-wide embedding model, created on first use"""
+import threading
+from app.config import settings
+
+# The model (sentence-transformers + PyTorch) is only loaded when something needs
+# a vector, so importing the app - and serving /health or auth - stays fast.
+_embeddings = None
+_lock = threading.Lock()
+
+
+def load_local_embeddings():
+    """Loads the HuggingFace model in this process (what the embedding sidecar runs)."""
+    from langchain_huggingface import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name=settings.EMBEDDING_MODEL)
+
+
+def get_embeddings():
+    """
+    Returns the shared embeddings instance, creating it on the first call.
+    It converts text into mathematical vectors (384 dimensions for MiniLM).
+    With EMBEDDING_SERVER_SOCKET set this is a client for the node's embedding
+    sidecar (app/embedding_server.py) and no model is loaded in this process.
+    """
+    global _embeddings
+    if _embeddings is None:
+        with _lock:
+            if _embeddings is None:
+                if settings.EMBEDDING_SERVER_SOCKET:
+                    from app.services.remote_embeddings import RemoteEmbeddings
+                    _embeddings = RemoteEmbeddings(
+                        settings.EMBEDDING_SERVER_SOCKET,
+                        timeout=settings.EMBEDDING_SERVER_TIMEOUT
+                    )
+                else:
+                    _embeddings = _schedule(load_local_embeddings())
+    return _embeddings
+
+
+def _schedule(model):
+    """Puts the interactive/bulk lane scheduler in front of an in-process model."""
+    if not settings.EMBEDDING_SCHEDULER_ENABLED:
+        return model
+    from app.services.embedding_scheduler import EmbeddingScheduler, ScheduledEmbeddings
+    return ScheduledEmbeddings(EmbeddingScheduler(
+        model,
+        bulk_batch_size=settings.EMBEDDING_BULK_BATCH_SIZE,
+        bulk_threads=settings.EMBEDDING_BULK_THREADS,
+        bulk_cpu_share=settings.EMBEDDING_BULK_CPU_SHARE
+    ))
+
+
+def set_embeddings(model):
+    """
+    Replaces the shared model (any LangChain Embeddings), e.g. for benchmarks.
+    Like the real model it goes behind the lane scheduler when that is enabled.
+    """
+    global _embeddings
+    with _lock:
+        _embeddings = _schedule(model)
+
+
+def preload_models():
+    """
+    Loads the embedding model and imports the heavy RAG dependencies up front.
+    Called from app.main when PRELOAD_MODELS is set: under 'gunicorn --preload'
+    this runs once in the master, and forked workers share the weights copy-on-write.
+    No inference happens here and the lane scheduler's thread only starts on the
+    first embed call (in the worker), so no threads exist yet when the master forks.
+    """
+    import langchain_community.vectorstores  # noqa: F401  (FAISS)
+    import pypdf  # noqa: F401  (in-process PDF extraction)
+    import langchain_text_splitters  # noqa: F401
+    import langchain_google_genai  # noqa: F401
+    get_embeddings()
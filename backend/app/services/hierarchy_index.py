@@ -0,0 +1,68 @@
+"""Coarse section level over a FAISS index for two-stage search on very large sources"""
+import os
+import numpy as np
+
+HIERARCHY_INDEX_FILE = "hierarchy.npz"
+
+
+class SectionHierarchy:
+    """
+    Sections are groups of consecutive chunks (page groups for PDFs). Each one is
+    represented by the centroid of its chunk vectors, so no LLM is involved.
+    A query first ranks the centroids, then searches only the chunks of the
+    best sections. members[offsets[s]:offsets[s + 1]] are the chunk positions of section s.
+    """
+
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, members: np.ndarray):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.members = members
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, section_ids: list[int]) -> "SectionHierarchy":
+        section_ids = np.asarray(section_ids)
+        members = np.argsort(section_ids, kind="stable").astype(np.int32)
+        sections, counts = np.unique(section_ids[members], return_counts=True)
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        centroids = np.stack([
+            vectors[members[offsets[s]:offsets[s + 1]]].mean(axis=0)
+            for s in range(len(sections))
+        ]).astype(np.float32)
+        return cls(centroids, offsets, members)
+
+    def save(self, directory: str):
+        np.savez(
+            os.path.join(directory, HIERARCHY_INDEX_FILE),
+            centroids=self.centroids,
+            offsets=self.offsets,
+            members=self.members
+        )
+
+    @classmethod
+    def load(cls, directory: str) -> "SectionHierarchy | None":
+        """Returns None when the index was built flat (small source or disabled)."""
+        path = os.path.join(directory, HIERARCHY_INDEX_FILE)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return cls(data["centroids"], data["offsets"], data["members"])
+
+    def candidates(self, query: np.ndarray, top_sections: int) -> np.ndarray:
+        """Stage 1: positions of the chunks in the sections closest to the query."""
+        distances = ((self.centroids - query) ** 2).sum(axis=1)
+        top = min(top_sections, len(distances))
+        best = np.argpartition(distances, top - 1)[:top]
+        return np.concatenate([self.members[self.offsets[s]:self.offsets[s + 1]] for s in best])
+
+    def search(self, fetch_vectors, query_vectors: np.ndarray, k: int, top_sections: int) -> list[list[int]]:
+        """
+        Stage 2: exact L2 ranking of the candidate chunks only. fetch_vectors(positions)
+        returns their vectors (from the vector store).
+        """
+        from app.services.vector_format import rank_exact
+
+        results = []
+        for query in np.asarray(query_vectors, dtype=np.float32):
+            positions = self.candidates(query, top_sections)
+            results.append(rank_exact(query, positions, fetch_vectors(positions), k))
+        return results
@@ -0,0 +1,152 @@
+"""
+Cold index compression: an index directory that has not been used for a while is
+packed into '<directory>.tar.gz' and unpacked again on its next load.
+
+The directory's own mtime is its last-use time: loads touch it (at most once an
+hour), and nothing else changes it once the index is written.
+"""
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+
+ARCHIVE_SUFFIX = ".tar.gz"
+_TOUCH_INTERVAL_SECONDS = 3600
+
+
+def archive_path(vector_store_path: str) -> str:
+    return vector_store_path + ARCHIVE_SUFFIX
+
+
+def is_archived(vector_store_path: str) -> bool:
+    return not os.path.isdir(vector_store_path) and os.path.isfile(archive_path(vector_store_path))
+
+
+def exists(vector_store_path: str) -> bool:
+    """True if the index is on disk, unpacked or not."""
+    return os.path.isdir(vector_store_path) or os.path.isfile(archive_path(vector_store_path))
+
+
+def last_used(vector_store_path: str) -> float:
+    return os.stat(vector_store_path).st_mtime
+
+
+def mark_used(vector_store_path: str):
+    try:
+        if time.time() - last_used(vector_store_path) > _TOUCH_INTERVAL_SECONDS:
+            os.utime(vector_store_path)
+    except OSError:
+        pass
+
+
+def compress(vector_store_path: str) -> tuple[int, int]:
+    """
+    Packs an index directory and removes it. The archive gets its final name before
+    the directory goes, so a concurrent load always finds one or the other.
+    Returns (bytes before, bytes after).
+    """
+    before = directory_bytes(vector_store_path)
+    target = archive_path(vector_store_path)
+    partial = target + ".partial"
+    try:
+        with tarfile.open(partial, "w:gz", compresslevel=6) as tar:
+            for name in sorted(os.listdir(vector_store_path)):
+                tar.add(os.path.join(vector_store_path, name), arcname=name)
+        os.replace(partial, target)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+    retired = f"{vector_store_path}.packed-{os.getpid()}"
+    os.rename(vector_store_path, retired)
+    remove_tree(retired)
+    return before, os.path.getsize(target)
+
+
+def ensure_unpacked(vector_store_path: str) -> bool:
+    """
+    Restores a compressed index in place; returns True if it had to. Safe to call
+    from several processes at once: each unpacks into its own temporary directory
+    and only the first rename wins.
+    """
+    if os.path.isdir(vector_store_path) or not os.path.isfile(archive_path(vector_store_path)):
+        return False
+
+    parent, name = os.path.split(vector_store_path)
+    staging = tempfile.mkdtemp(prefix=f"{name}.unpack-", dir=parent)
+    try:
+        with tarfile.open(archive_path(vector_store_path), "r:gz") as tar:
+            tar.extractall(staging, filter="data")
+        os.utime(staging)
+        os.rename(staging, vector_store_path)
+    except FileNotFoundError:
+        # Another process finished first and removed the archive
+        remove_tree(staging)
+        return False
+    except OSError:
+        remove_tree(staging)
+        if not os.path.isdir(vector_store_path):
+            raise
+        return False
+
+    try:
+        os.remove(archive_path(vector_store_path))
+    except FileNotFoundError:
+        pass
+    print(f"📦 Unpacked cold index {vector_store_path}")
+    return True
+
+
+def read_file(vector_store_path: str, name: str) -> bytes | None:
+    """One file of an index without unpacking it; None if the index has no such file."""
+    if os.path.isdir(vector_store_path):
+        try:
+            with open(os.path.join(vector_store_path, name), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+    with tarfile.open(archive_path(vector_store_path), "r:gz") as tar:
+        try:
+            return tar.extractfile(name).read()
+        except KeyError:
+            return None
+
+
+def remove(vector_store_path: str) -> bool:
+    """Deletes an index in either form; returns False (and logs) if something was left behind."""
+    removed = remove_tree(vector_store_path)
+    try:
+        os.remove(archive_path(vector_store_path))
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"⚠️ Could not delete {archive_path(vector_store_path)}: {e}")
+        removed = False
+    return removed
+
+
+def remove_tree(path: str) -> bool:
+    """rmtree that reports what it could not delete instead of hiding it."""
+    failures = []
+
+    def on_error(function, failed_path, exc_info):
+        failures.append(f"{failed_path}: {exc_info[1]}")
+
+    if os.path.isdir(path):
+        shutil.rmtree(path, onerror=on_error)
+    for failure in failures:
+        print(f"⚠️ Could not delete {failure}")
+    return not failures
+
+
+def directory_bytes(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
@@ -0,0 +1,329 @@
+"""Shared ingestion pipeline: chunking, embedding and index storage"""
+import os
+import tempfile
+import time
+from typing import TYPE_CHECKING
+from app.config import settings
+from app.services import index_archive
+from app.services.embedding_service import get_embeddings
+from app.utils.metrics import track_stage, DEDUP_CHUNKS, EMBEDDING_THROUGHPUT
+from app.utils.swap import exchange
+
+# LangChain, FAISS and NumPy are imported inside the methods that use them,
+# so importing the API routers does not pull them in.
+if TYPE_CHECKING:
+    from langchain_core.documents import Document as LCDocument
+    from app.services.ingest_checkpoint import EmbeddingCheckpoint
+    from app.services.vector_store import VectorStore
+
+
+class IndexService:
+    @staticmethod
+    def split_documents(documents: list["LCDocument"], source_type: str) -> list["LCDocument"]:
+        """
+        Splits extracted text (PDF pages, a transcript, a webpage) into chunks.
+        Recursive splitting keeps paragraphs and sentences together where possible.
+        Near-duplicate chunks are then dropped before anything is embedded.
+        """
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+        with track_stage("chunking", source_type):
+            text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=settings.CHUNK_SIZE,
+                chunk_overlap=settings.CHUNK_OVERLAP
+            )
+            chunks = text_splitter.split_documents(documents)
+
+        if not settings.DEDUP_ENABLED or len(chunks) < 2:
+            return chunks
+        with track_stage("dedup", source_type):
+            from app.services.chunk_dedup import ChunkDeduplicator
+            survivors = ChunkDeduplicator().deduplicate(chunks)
+
+        dropped = len(chunks) - len(survivors)
+        DEDUP_CHUNKS.labels("kept", source_type).inc(len(survivors))
+        DEDUP_CHUNKS.labels("dropped", source_type).inc(dropped)
+        if dropped:
+            print(f"🧹 Dedup ({source_type}): dropped {dropped} of {len(chunks)} chunks ({dropped / len(chunks):.0%})")
+        return survivors
+
+    @staticmethod
+    def build_index(
+        chunks: list["LCDocument"],
+        vector_store_path: str,
+        source_type: str,
+        documents: list["LCDocument"] = None
+    ) -> "VectorStore":
+        """
+        Embeds the chunks and writes the index to vector_store_path: a NumPy store for
+        small sources, FAISS otherwise (see vector_store.choose_backend).
+        'documents' (the text before chunking) is kept with the index for re-indexing.
+        Embedding and index writing are timed separately so each shows up in /metrics.
+
+        Crash safety: everything is written to a staging directory that only gets the
+        final name once complete (see publish), so a reader never sees a half-written
+        index. Large sources checkpoint their embedded batches, so a build interrupted
+        by a restart resumes embedding where it stopped.
+        """
+        import numpy as np
+        from app.services.ingest_checkpoint import EmbeddingCheckpoint
+        from app.services.vector_store import choose_backend
+
+        texts = [chunk.page_content for chunk in chunks]
+        metadatas = [chunk.metadata for chunk in chunks]
+
+        # 1. Vectorization (text -> math)
+        checkpoint = None
+        if 0 < settings.INGEST_CHECKPOINT_CHUNKS < len(texts):
+            checkpoint = EmbeddingCheckpoint(vector_store_path, texts)
+        with track_stage("embedding", source_type):
+            started = time.perf_counter()
+            vectors, embedded = IndexService.embed_texts(texts, checkpoint)
+            elapsed = time.perf_counter() - started
+        if elapsed > 0 and embedded:
+            EMBEDDING_THROUGHPUT.labels(source_type).observe(embedded / elapsed)
+
+        parent, name = os.path.split(os.path.normpath(vector_store_path))
+        os.makedirs(parent, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=f"{name}.partial-", dir=parent)
+        os.chmod(staging, 0o755)
+        try:
+            # 2. Write the vector store
+            with track_stage("index_write", source_type):
+                matrix = np.asarray(vectors, dtype="float32")
+                store = choose_backend(len(texts)).build(staging, texts, metadatas, matrix)
+
+            IndexService.write_side_indexes(staging, chunks, matrix, store, source_type, documents)
+
+            # 7. Publish: flush, then swap the complete directory in under its final name
+            IndexService.publish(staging, vector_store_path)
+        except BaseException:
+            index_archive.remove_tree(staging)
+            raise
+
+        # 8. Share it with the other nodes (no-op on a single node)
+        from app.services.artifact_sync import ArtifactSync
+        ArtifactSync.push_index(vector_store_path)
+
+        if checkpoint is not None:
+            checkpoint.clear()
+        if hasattr(store, "path"):
+            store.path = vector_store_path
+        return store
+
+    @staticmethod
+    def embed_texts(texts: list[str], checkpoint: "EmbeddingCheckpoint" = None) -> tuple[list, int]:
+        """
+        Returns (vectors, number embedded now). With a checkpoint, batches of
+        INGEST_CHECKPOINT_CHUNKS are saved as they finish and saved ones are reused.
+        """
+        embeddings = get_embeddings()
+        if checkpoint is None:
+            return embeddings.embed_documents(texts), len(texts)
+
+        vectors = checkpoint.load()
+        if vectors:
+            print(f"⏩ Resuming embedding at chunk {len(vectors)} of {len(texts)}")
+        resumed = len(vectors)
+        step = settings.INGEST_CHECKPOINT_CHUNKS
+        for start in range(resumed, len(texts), step):
+            batch = embeddings.embed_documents(texts[start:start + step])
+            checkpoint.save(start, batch)
+            vectors.extend(batch)
+        return vectors, len(texts) - resumed
+
+    @staticmethod
+    def write_side_indexes(
+        vector_store_path: str,
+        chunks: list["LCDocument"],
+        matrix,
+        store: "VectorStore",
+        source_type: str,
+        documents: list["LCDocument"] = None
+    ):
+        """Steps 3-6 of build_index: everything next to the vector store, format record last."""
+        from app.services.vector_format import write_meta
+
+        texts = [chunk.page_content for chunk in chunks]
+
+        # 3. BM25 inverted index over the same chunks (same positions as the vector store)
+        with track_stage("lexical_index", source_type):
+            from app.services.lexical_index import LexicalIndex
+            LexicalIndex.build(texts).save(vector_store_path)
+
+        # 4. Section centroids for two-stage search, only for very large sources
+        hierarchy = settings.HIERARCHY_ENABLED and len(chunks) >= settings.HIERARCHY_MIN_CHUNKS
+        if hierarchy:
+            with track_stage("hierarchy_index", source_type):
+                from app.services.hierarchy_index import SectionHierarchy
+                SectionHierarchy.build(matrix, IndexService.section_ids(chunks)).save(vector_store_path)
+
+        # 5. Canonical text, so model or chunking changes can rebuild without re-extracting
+        if documents is not None:
+            from app.services.source_text import save_source_text
+            save_source_text(vector_store_path, documents)
+
+        # 6. Format record, so indexes built with different settings can coexist
+        # (and the re-indexer can tell which ones are stale)
+        write_meta(
+            vector_store_path,
+            backend=store.backend,
+            vector_format=store.vector_format,
+            refine=store.refine,
+            dims=int(matrix.shape[1]) if len(matrix) else 0,
+            count=len(texts),
+            lexical=True,
+            hierarchy=hierarchy,
+            merged_chunks=sum(len(chunk.metadata.get("merged_from", ())) for chunk in chunks),
+            embedding_model=settings.EMBEDDING_MODEL,
+            chunk_size=settings.CHUNK_SIZE,
+            chunk_overlap=settings.CHUNK_OVERLAP
+        )
+
+    @staticmethod
+    def publish(staging: str, vector_store_path: str):
+        """
+        Makes a fully written staging directory the index at vector_store_path.
+        Files are fsynced first, so the rename can't expose data still in flight.
+        A previous build at the same path (a re-processed URL, a refreshed artifact
+        copy) is exchanged with the new one in a single step, so readers always find
+        an index there; it is then removed, along with any compressed copy of it.
+        Where the filesystem can't exchange, it is two renames and readers wait out
+        the gap (see RAGService.get_index).
+        """
+        for entry in os.scandir(staging):
+            if entry.is_file():
+                with open(entry.path, "rb") as f:
+                    os.fsync(f.fileno())
+
+        if os.path.isdir(vector_store_path):
+            if exchange(staging, vector_store_path):
+                # 'staging' now holds the previous build
+                index_archive.remove_tree(staging)
+            else:
+                retired = f"{vector_store_path}.old-{os.getpid()}-{time.time_ns()}"
+                os.rename(vector_store_path, retired)
+                os.rename(staging, vector_store_path)
+                index_archive.remove_tree(retired)
+        else:
+            os.rename(staging, vector_store_path)
+        os.utime(vector_store_path)
+        try:
+            os.remove(index_archive.archive_path(vector_store_path))
+        except FileNotFoundError:
+            pass
+
+        if hasattr(os, "O_DIRECTORY"):
+            fd = os.open(os.path.dirname(vector_store_path) or ".", os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    @staticmethod
+    def section_ids(chunks: list["LCDocument"]) -> list[int]:
+        """
+        Groups chunks into sections: HIERARCHY_PAGES_PER_SECTION pages for PDFs,
+        otherwise runs of HIERARCHY_CHUNKS_PER_SECTION consecutive chunks.
+        """
+        pages = [chunk.metadata.get("page") for chunk in chunks]
+        if all(isinstance(page, int) for page in pages):
+            return [page // settings.HIERARCHY_PAGES_PER_SECTION for page in pages]
+        return [i // settings.HIERARCHY_CHUNKS_PER_SECTION for i in range(len(chunks))]
+
+
+class LoadedIndex:
+    """
+    A vector store plus its lexical (BM25) and section sides, loaded from one index
+    directory. The side indexes are read lazily on first use; indexes written before
+    they existed simply go without them.
+    """
+
+    def __init__(self, store: "VectorStore", path: str):
+        self.store = store
+        self.path = path
+        self._lexical = None
+        self._lexical_loaded = False
+        self._hierarchy = None
+        self._hierarchy_loaded = False
+
+    @property
+    def lexical(self):
+        if not self._lexical_loaded:
+            from app.services.lexical_index import LexicalIndex
+            self._lexical = LexicalIndex.load(self.path)
+            self._lexical_loaded = True
+        return self._lexical
+
+    @property
+    def hierarchy(self):
+        if not self._hierarchy_loaded:
+            from app.services.hierarchy_index import SectionHierarchy
+            self._hierarchy = SectionHierarchy.load(self.path)
+            self._hierarchy_loaded = True
+        return self._hierarchy
+
+    @staticmethod
+    def stamp(path: str):
+        """Changes whenever the directory is rebuilt in place (the format record is written last)."""
+        from app.services.vector_format import INDEX_META_FILE
+        for name in (INDEX_META_FILE, "index.faiss"):
+            try:
+                return os.stat(os.path.join(path, name)).st_mtime_ns
+            except FileNotFoundError:
+                continue
+        return None
+
+    @staticmethod
+    def disk_bytes(path: str) -> int:
+        """Size of the files a loaded index keeps in memory or maps (approximately its footprint)."""
+        from app.services.source_text import SOURCE_TEXT_FILE
+        with os.scandir(path) as entries:
+            return sum(e.stat().st_size for e in entries if e.is_file() and e.name != SOURCE_TEXT_FILE)
+
+    def warm(self):
+        """Loads the lazy sides now and asks the OS to read the rest of the files into the page cache."""
+        _ = self.lexical
+        _ = self.hierarchy
+        if not hasattr(os, "posix_fadvise"):
+            return
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                fd = os.open(entry.path, os.O_RDONLY)
+                try:
+                    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+                finally:
+                    os.close(fd)
+
+    def dense_search(self, query_vectors: list, k: int) -> list[list[int]]:
+        """
+        Chunk positions per query. Large sources with a section hierarchy search
+        the chunks of their best sections only; others search the whole store.
+        """
+        import numpy as np
+
+        queries = np.asarray(query_vectors, dtype="float32")
+        hierarchy = self.hierarchy
+        if hierarchy is not None:
+            return hierarchy.search(self.store.vectors, queries, k, settings.HIERARCHY_TOP_SECTIONS)
+        return self.store.search(queries, k)
+
+    def lexical_search(self, queries: list[str], k: int) -> list[list[int]]:
+        lexical = self.lexical
+        if lexical is None:
+            return [[] for _ in queries]
+        return [lexical.search(query, k) for query in queries]
+
+    @staticmethod
+    def fuse(rankings: list[list[int]], k: int, rrf_k: int) -> list[int]:
+        """Reciprocal rank fusion: score = sum of 1 / (rrf_k + rank) over the rankings."""
+        scores = {}
+        for ranking in rankings:
+            for rank, position in enumerate(ranking, start=1):
+                scores[position] = scores.get(position, 0.0) + 1.0 / (rrf_k + rank)
+        return sorted(scores, key=lambda position: -scores[position])[:k]
+
+    def documents(self, positions: list[int]) -> list["LCDocument"]:
+        return self.store.documents(positions)
@@ -0,0 +1,71 @@
+"""Embedded batches of an ingestion in progress, so a restarted build resumes instead of starting over"""
+import hashlib
+import json
+import os
+import numpy as np
+from app.config import settings
+from app.services import index_archive
+
+CHECKPOINT_SUFFIX = ".checkpoint"
+STATE_FILE = "state.json"
+
+
+def _write_atomic(path: str, write):
+    partial = path + ".partial"
+    with open(partial, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(partial, path)
+
+
+class EmbeddingCheckpoint:
+    """
+    '<vector_store_path>.checkpoint/': one .npy file per embedded batch plus a
+    state record keyed by the embedding model and the exact chunk texts. A restart
+    that re-extracts and re-chunks the same source gets the same key and reuses
+    every complete batch; anything else (new model, new chunking) starts fresh.
+    """
+
+    def __init__(self, vector_store_path: str, texts: list[str]):
+        self.directory = vector_store_path + CHECKPOINT_SUFFIX
+        digest = hashlib.sha256(settings.EMBEDDING_MODEL.encode("utf-8"))
+        for text in texts:
+            digest.update(b"\0" + text.encode("utf-8"))
+        self.key = digest.hexdigest()
+
+    def _batch_path(self, start: int) -> str:
+        return os.path.join(self.directory, f"batch-{start:08d}.npy")
+
+    def load(self) -> list:
+        """Vectors of the leading complete batches (an empty list if there is no usable checkpoint)."""
+        try:
+            with open(os.path.join(self.directory, STATE_FILE)) as f:
+                state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            state = {}
+        if state.get("key") != self.key:
+            self.clear()
+            os.makedirs(self.directory, exist_ok=True)
+            _write_atomic(
+                os.path.join(self.directory, STATE_FILE),
+                lambda f: f.write(json.dumps({"key": self.key}).encode("utf-8"))
+            )
+            return []
+
+        vectors = []
+        while os.path.exists(self._batch_path(len(vectors))):
+            try:
+                batch = np.load(self._batch_path(len(vectors)))
+            except (OSError, ValueError):
+                break
+            if not len(batch):
+                break
+            vectors.extend(batch)
+        return vectors
+
+    def save(self, start: int, vectors: list):
+        _write_atomic(self._batch_path(start), lambda f: np.save(f, np.asarray(vectors, dtype=np.float32)))
+
+    def clear(self):
+        index_archive.remove_tree(self.directory)
@@ -0,0 +1,111 @@
+"""Compact on-disk BM25 inverted index stored next to each vector index"""
+import os
+import re
+import numpy as np
+from app.config import settings
+
+LEXICAL_INDEX_FILE = "bm25.npz"
+
+# Words plus identifier-like tokens: error codes (ERR-1234), versions (v2.1.3),
+# part numbers (AB-12/7) and snake_case / dotted names stay in one piece.
+_TOKEN = re.compile(r"[a-z0-9_]+(?:[-./:][a-z0-9_]+)*")
+_SPLIT = re.compile(r"[-./:]")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased tokens; compound tokens also contribute their parts."""
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        tokens.append(token)
+        if _SPLIT.search(token):
+            tokens.extend(part for part in _SPLIT.split(token) if part)
+    return tokens
+
+
+class LexicalIndex:
+    """
+    BM25 over the chunks of one index, in CSR form:
+    postings for term t are doc_ids/freqs[offsets[t]:offsets[t + 1]].
+    Document ids are vector-store positions, so both rankings refer to the same chunks.
+    """
+
+    def __init__(self, terms: list[str], offsets: np.ndarray, doc_ids: np.ndarray,
+                 freqs: np.ndarray, doc_lengths: np.ndarray):
+        self.terms = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.freqs = freqs
+        self.doc_lengths = doc_lengths
+        self.avg_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+
+    @classmethod
+    def build(cls, texts: list[str]) -> "LexicalIndex":
+        postings: dict[str, dict[int, int]] = {}
+        doc_lengths = np.zeros(len(texts), dtype=np.int32)
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths[doc_id] = len(tokens)
+            for token in tokens:
+                counts = postings.setdefault(token, {})
+                counts[doc_id] = counts.get(doc_id, 0) + 1
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        doc_ids, freqs = [], []
+        for i, term in enumerate(terms):
+            counts = postings[term]
+            doc_ids.extend(counts.keys())
+            freqs.extend(counts.values())
+            offsets[i + 1] = len(doc_ids)
+        return cls(
+            terms, offsets,
+            np.asarray(doc_ids, dtype=np.int32),
+            np.minimum(np.asarray(freqs, dtype=np.int64), np.iinfo(np.uint16).max).astype(np.uint16),
+            doc_lengths
+        )
+
+    def save(self, directory: str):
+        terms = sorted(self.terms, key=self.terms.get)
+        # The vocabulary is one newline-joined UTF-8 blob (tokens never contain '\n')
+        np.savez(
+            os.path.join(directory, LEXICAL_INDEX_FILE),
+            vocabulary=np.frombuffer("\n".join(terms).encode(), dtype=np.uint8),
+            offsets=self.offsets,
+            doc_ids=self.doc_ids,
+            freqs=self.freqs,
+            doc_lengths=self.doc_lengths
+        )
+
+    @classmethod
+    def load(cls, directory: str) -> "LexicalIndex | None":
+        """Returns None for indexes built before lexical search existed."""
+        path = os.path.join(directory, LEXICAL_INDEX_FILE)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            blob = data["vocabulary"].tobytes().decode()
+            return cls(
+                blob.split("\n") if blob else [],
+                data["offsets"], data["doc_ids"], data["freqs"], data["doc_lengths"]
+            )
+
+    def search(self, query: str, k: int) -> list[int]:
+        """Top-k document ids by BM25 score (only documents sharing a term with the query)."""
+        k1, b = settings.BM25_K1, settings.BM25_B
+        total_docs = len(self.doc_lengths)
+        scores = np.zeros(total_docs, dtype=np.float32)
+        for token in set(tokenize(query)):
+            term = self.terms.get(token)
+            if term is None:
+                continue
+            start, end = self.offsets[term], self.offsets[term + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.freqs[start:end].astype(np.float32)
+            idf = np.log(1 + (total_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = k1 * (1 - b + b * self.doc_lengths[docs] / (self.avg_length or 1.0))
+            scores[docs] += idf * tf * (k1 + 1) / (tf + norm)
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        return matched[np.argsort(-scores[matched], kind="stable")].tolist()
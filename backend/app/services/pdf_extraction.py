@@ -0,0 +1,181 @@
+"""PDF text extraction backends with per-page timeouts and page-level error isolation"""
+import multiprocessing
+from typing import TYPE_CHECKING, Iterator
+from app.config import settings
+from app.utils.metrics import FAILURES
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document as LCDocument
+
+# Allowance for spawning the child process and opening the file, on top of the page timeout
+_STARTUP_SECONDS = 30
+
+
+class PypdfBackend:
+    """Pure-Python pypdf, with the same text as LangChain's PyPDFLoader."""
+    name = "pypdf"
+
+    def __init__(self, path: str):
+        from pypdf import PdfReader
+        self.reader = PdfReader(path)
+
+    def __len__(self) -> int:
+        return len(self.reader.pages)
+
+    def page_text(self, number: int) -> str:
+        return self.reader.pages[number].extract_text(extraction_mode="plain")
+
+    def close(self):
+        self.reader.close()
+
+
+class PdfiumBackend:
+    """PDFium (C, via pypdfium2): several times faster, mostly on large and image-heavy files."""
+    name = "pdfium"
+
+    def __init__(self, path: str):
+        import pypdfium2
+        self.pdf = pypdfium2.PdfDocument(path)
+
+    def __len__(self) -> int:
+        return len(self.pdf)
+
+    def page_text(self, number: int) -> str:
+        page = self.pdf[number]
+        textpage = page.get_textpage()
+        try:
+            return textpage.get_text_range().replace("\r\n", "\n")
+        finally:
+            textpage.close()
+            page.close()
+
+    def close(self):
+        self.pdf.close()
+
+
+PDF_BACKENDS = {backend.name: backend for backend in (PypdfBackend, PdfiumBackend)}
+
+
+def resolve_backend(name: str = None) -> str:
+    """PDF_BACKEND, with 'auto' meaning pdfium when pypdfium2 is installed, else pypdf."""
+    name = name or settings.PDF_BACKEND
+    if name != "auto":
+        return name
+    try:
+        import pypdfium2  # noqa: F401
+        return "pdfium"
+    except ImportError:
+        return "pypdf"
+
+
+def _iter_pages(backend: str, path: str, start: int) -> Iterator[tuple]:
+    """
+    Yields ("pages", count) once, then ("ok", page, text) or ("error", page, error type,
+    message) per page from 'start' on. A page that raises doesn't stop the others.
+    """
+    document = PDF_BACKENDS[backend](path)
+    try:
+        yield ("pages", len(document))
+        for number in range(start, len(document)):
+            try:
+                yield ("ok", number, document.page_text(number))
+            except Exception as e:
+                yield ("error", number, type(e).__name__, str(e))
+    finally:
+        document.close()
+
+
+def _extraction_worker(conn, backend: str, path: str, start: int):
+    """Child process entry point: streams _iter_pages over the pipe."""
+    try:
+        for message in _iter_pages(backend, path, start):
+            conn.send(message)
+    except Exception as e:
+        conn.send(("fatal", start, type(e).__name__, str(e)))
+    finally:
+        conn.close()
+
+
+def _iter_pages_with_timeout(backend: str, path: str, timeout: float) -> Iterator[tuple]:
+    """
+    Same messages as _iter_pages, but extraction runs in a child process and any
+    page that takes longer than 'timeout' (or crashes the process) is reported as
+    an error; a new child then resumes at the next page.
+    The child is spawned, not forked: the server process has threads and a model loaded.
+    """
+    context = multiprocessing.get_context("spawn")
+    page_count = None
+    start = 0
+    while page_count is None or start < page_count:
+        receiver, sender = context.Pipe(duplex=False)
+        worker = context.Process(
+            target=_extraction_worker, args=(sender, backend, path, start), daemon=True
+        )
+        worker.start()
+        sender.close()
+        try:
+            while True:
+                wait = timeout if page_count is not None else timeout + _STARTUP_SECONDS
+                if not receiver.poll(wait):
+                    error = ("TimeoutError", f"no result after {timeout:g}s")
+                    break
+                try:
+                    message = receiver.recv()
+                except EOFError:
+                    worker.join()
+                    error = ("ChildProcessError", f"extraction process exited with code {worker.exitcode}")
+                    break
+                if message[0] == "fatal":
+                    raise ValueError(f"Could not open PDF: {message[2]}: {message[3]}")
+                if message[0] == "pages":
+                    page_count = message[1]
+                    continue
+                yield message
+                start = message[1] + 1
+        finally:
+            receiver.close()
+            if worker.is_alive():
+                worker.kill()
+            worker.join()
+
+        if page_count is None:
+            raise ValueError(f"Could not open PDF: {error[0]}: {error[1]}")
+        if start < page_count:
+            # The page the child was working on when it hung or died
+            yield ("error", start, *error)
+            start += 1
+
+
+def extract_pdf(path: str, backend: str = None) -> list["LCDocument"]:
+    """
+    One LangChain Document per non-empty page, with slim metadata ({"source", "page"}).
+    With PDF_PAGE_TIMEOUT_SECONDS > 0 pages are extracted in a child process so a
+    pathological page can't hang the worker thread. Failed pages are skipped,
+    logged and counted in tokentalk_failures_total (stage "pdf_page").
+    """
+    from langchain_core.documents import Document as LCDocument
+
+    backend = resolve_backend(backend)
+    timeout = settings.PDF_PAGE_TIMEOUT_SECONDS
+    if timeout > 0:
+        messages = _iter_pages_with_timeout(backend, path, timeout)
+    else:
+        messages = _iter_pages(backend, path, 0)
+
+    pages, failed = [], []
+    for kind, number, *payload in messages:
+        if kind == "pages":
+            continue
+        if kind == "error":
+            error_type, message = payload
+            failed.append(number)
+            FAILURES.labels("pdf_page", error_type, "document").inc()
+            print(f"⚠️ PDF page {number + 1} skipped ({backend}): {error_type}: {message}")
+            continue
+        text = payload[0]
+        if text and text.strip():
+            pages.append(LCDocument(page_content=text, metadata={"source": path, "page": number}))
+
+    if failed:
+        print(f"⚠️ {len(failed)} page(s) of {path} could not be extracted")
+    return pages
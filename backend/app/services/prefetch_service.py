@@ -0,0 +1,157 @@
+"""Warms a user's most recently used indexes before their first question"""
+import asyncio
+import os
+import time
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, func
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.conversation import Conversation
+from app.models.document import Document
+from app.models.source import Source
+from app.services.index_service import LoadedIndex
+from app.services.rag_service import RAGService, index_cache
+from app.utils.metrics import stats_collector
+
+MB = 1024 * 1024
+
+
+def available_memory_mb() -> float | None:
+    """MemAvailable from /proc/meminfo (Linux); None where it can't be read."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class PrefetchService:
+    """
+    Login and the source list endpoints call schedule(); a background task then
+    loads the user's most recently used indexes into the index cache (and their
+    files into the page cache), so the first question doesn't pay for the load.
+
+    Budgets: PREFETCH_PER_USER indexes and PREFETCH_USER_MAX_MB per user; globally,
+    PREFETCH_MAX_CONCURRENT loads at a time and only free index cache space (a
+    prefetch never evicts). When free system memory drops below
+    PREFETCH_MIN_AVAILABLE_MB, running prefetches are cancelled and prefetched
+    indexes nobody has used yet are dropped.
+    """
+    _tasks: set[asyncio.Task] = set()
+    _last_scheduled: dict[int, float] = {}
+    _semaphore: asyncio.Semaphore | None = None
+    _stats = {"scheduled": 0, "loaded": 0, "skipped": 0, "cancelled": 0, "loaded_bytes": 0}
+
+    @staticmethod
+    def schedule(user_id: int):
+        """Starts a prefetch for the user unless one ran within PREFETCH_COOLDOWN_SECONDS. Never blocks."""
+        if not settings.PREFETCH_ENABLED or settings.PREFETCH_PER_USER <= 0:
+            return
+        now = time.monotonic()
+        if now - PrefetchService._last_scheduled.get(user_id, float("-inf")) < settings.PREFETCH_COOLDOWN_SECONDS:
+            return
+        PrefetchService._last_scheduled[user_id] = now
+        PrefetchService._stats["scheduled"] += 1
+
+        task = asyncio.get_running_loop().create_task(PrefetchService.prefetch_user(user_id))
+        PrefetchService._tasks.add(task)
+        task.add_done_callback(PrefetchService._tasks.discard)
+
+    @staticmethod
+    async def recent_index_paths(user_id: int, limit: int) -> list[str]:
+        """
+        Index paths of the user's sources, most recently chatted-with first, then
+        the newest sources for users with little or no history.
+        """
+        async with AsyncSessionLocal() as db:
+            last_used = func.max(Conversation.timestamp)
+            recent = (await db.execute(
+                select(Conversation.source_type, Conversation.source_id)
+                .where(Conversation.user_id == user_id)
+                .group_by(Conversation.source_type, Conversation.source_id)
+                .order_by(last_used.desc())
+                .limit(limit)
+            )).all()
+
+            documents = dict((await db.execute(
+                select(Document.id, Document.vector_store_path).where(
+                    Document.user_id == user_id,
+                    Document.status == "completed",
+                    Document.vector_store_path.isnot(None)
+                ).order_by(Document.upload_date.desc()).limit(limit * 4)
+            )).all())
+            sources = dict((await db.execute(
+                select(Source.id, Source.vector_store_path).where(
+                    Source.user_id == user_id,
+                    Source.vector_store_path.isnot(None)
+                ).order_by(Source.processed_date.desc()).limit(limit * 4)
+            )).all())
+
+        paths = [
+            (documents if source_type == "document" else sources).get(source_id)
+            for source_type, source_id in recent
+        ]
+        paths += list(documents.values()) + list(sources.values())
+        return list(dict.fromkeys(path for path in paths if path))[:limit]
+
+    @staticmethod
+    def memory_pressure() -> bool:
+        available = available_memory_mb()
+        return available is not None and available < settings.PREFETCH_MIN_AVAILABLE_MB
+
+    @staticmethod
+    def relieve_memory_pressure():
+        """Cancels every running prefetch and drops prefetched indexes that were never used."""
+        current = asyncio.current_task()
+        for task in list(PrefetchService._tasks):
+            if task is not current:
+                task.cancel()
+        dropped = index_cache.drop_unused_prefetches()
+        print(f"⚠️ Memory pressure: prefetching cancelled, {dropped} unused prefetched index(es) dropped")
+
+    @staticmethod
+    async def prefetch_user(user_id: int):
+        stats = PrefetchService._stats
+        if PrefetchService._semaphore is None:
+            PrefetchService._semaphore = asyncio.Semaphore(settings.PREFETCH_MAX_CONCURRENT)
+        budget = settings.PREFETCH_USER_MAX_MB * MB
+        try:
+            paths = await PrefetchService.recent_index_paths(user_id, settings.PREFETCH_PER_USER)
+            for path in paths:
+                if path in index_cache:
+                    continue
+                if not os.path.isdir(path):
+                    # Compressed (cold) or gone: not worth unpacking speculatively
+                    stats["skipped"] += 1
+                    continue
+                async with PrefetchService._semaphore:
+                    if PrefetchService.memory_pressure():
+                        PrefetchService.relieve_memory_pressure()
+                        stats["cancelled"] += 1
+                        return
+                    size = await run_in_threadpool(LoadedIndex.disk_bytes, path)
+                    if size > budget:
+                        stats["skipped"] += 1
+                        continue
+                    index = await run_in_threadpool(RAGService.get_index, path, True)
+                if index is None:
+                    stats["skipped"] += 1
+                    continue
+                budget -= size
+                stats["loaded"] += 1
+                stats["loaded_bytes"] += size
+        except asyncio.CancelledError:
+            stats["cancelled"] += 1
+        except Exception as e:
+            # A prefetch is only an optimisation; the chat request will load (and report) it
+            print(f"⚠️ Prefetch for user {user_id} failed: {e}")
+
+    @staticmethod
+    def stats() -> dict:
+        return {**PrefetchService._stats, "running": len(PrefetchService._tasks)}
+
+
+stats_collector.register("prefetch", PrefetchService.stats)
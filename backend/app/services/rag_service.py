@@ -1,112 +1,336 @@
 """Service for RAG (Retrieval Augmented Generation) operations"""
+import asyncio
 import os
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import PromptTemplate
+import threading
+import time
+from typing import TYPE_CHECKING, AsyncIterator
+from fastapi.concurrency import run_in_threadpool
 from app.config import settings
+from app.services import index_archive
+from app.services.artifact_sync import ArtifactSync
+from app.services.embedding_service import get_embeddings
+from app.services.index_service import LoadedIndex
+from app.utils.cache import SizedLRUCache
+from app.utils.metrics import ChatTrace, track_stage, track_queue, observe_stage, record_failure, stats_collector
+from app.utils.profiling import profile_thread
+
+# FAISS and the Gemini SDK are heavy; they are imported on first use
+if TYPE_CHECKING:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+# Loaded indexes, per worker process (see RAGService.get_index)
+index_cache = SizedLRUCache(
+    "index",
+    max_bytes=settings.INDEX_CACHE_MAX_MB * 1024 * 1024,
+    max_size=settings.INDEX_CACHE_MAX_ENTRIES
+)
+stats_collector.register("cache", index_cache.stats, cache="index")
+# One lock per index path, so concurrent misses share a single load. Locks are
+# never removed: dropping one while callers still wait on it would let the next
+# caller load the same index alongside them (a Lock per path is tiny).
+_loading: dict[str, threading.Lock] = {}
+_loading_guard = threading.Lock()
+
+# Advanced Prompt Template
+# This prompt instructs the AI to be professional and use the history.
+PROMPT_TEMPLATE = """You are DocuMind Pro, a premium AI research assistant. 
+Your goal is to provide accurate, concise, and helpful answers based ONLY on the provided context.
+
+GUIDELINES:
+- If the answer is not in the context, politely state that you don't have enough information.
+- Use a professional and encouraging tone.
+- Maintain consistency with the conversation history.
+- Use bullet points for complex explanations.
+
+CONVERSATION HISTORY:
+{chat_history}
+
+CONTEXT FROM SOURCES:
+{context}
+
+USER QUESTION: {question}
+
+OFFICIAL RESPONSE:"""
+
+
+def _chunk_text(chunk) -> str:
+    """Extracts the text of a streamed LLM message chunk."""
+    content = getattr(chunk, "content", chunk)
+    if isinstance(content, str):
+        return content
+    # Some Gemini responses arrive as a list of content parts
+    return "".join(
+        part.get("text", "") if isinstance(part, dict) else str(part)
+        for part in content
+    )
+
+
+def _wait_for_publish(vector_store_path: str, timeout: float = 1.0):
+    """
+    Where IndexService.publish can't exchange directories atomically, a rebuilt
+    index is briefly absent between two renames; wait that out instead of failing.
+    """
+    deadline = time.monotonic() + timeout
+    while not os.path.isdir(vector_store_path) and time.monotonic() < deadline:
+        try:
+            siblings = os.listdir(os.path.dirname(vector_store_path) or ".")
+        except FileNotFoundError:
+            return
+        if not any(name.startswith(os.path.basename(vector_store_path) + ".old-") for name in siblings):
+            return
+        time.sleep(0.01)
+
+
+def _embed_query(question: str) -> list[float]:
+    # get_embeddings() may load the model on first use, so it runs in the worker thread too
+    return get_embeddings().embed_query(question)
+
+
+def _embed_questions(questions: list[str]) -> list[list[float]]:
+    # Batch questions are queries: the interactive lane, not behind ingestion in the bulk one.
+    # A bare model (scheduler disabled) has no lanes and embeds them like documents.
+    embeddings = get_embeddings()
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(questions)
+    return embeddings.embed_documents(questions)
 
-# Global AI Models initialization
-# Converts text to searchable math (vectors)
-embeddings = HuggingFaceEmbeddings(model_name=settings.EMBEDDING_MODEL)
 
 class RAGService:
     @staticmethod
-    def get_vectorstore(vector_store_path: str) -> FAISS:
+    @profile_thread("index_load")
+    def load_index(vector_store_path: str) -> LoadedIndex:
         """
-        Loads a FAISS index from the disk.
-        
-        NOTE: allow_dangerous_deserialization is required because FAISS uses the 'pickle' 
-        format to store index metadata. It's safe here because we only load files 
-        that our server itself created.
+        Opens an index directory with the backend it was built with (FAISS or NumPy);
+        the BM25 and section sides load lazily.
         """
         if not os.path.exists(vector_store_path):
             raise ValueError(f"Vector store not found at {vector_store_path}")
-            
-        return FAISS.load_local(
-            vector_store_path, 
-            embeddings,
-            allow_dangerous_deserialization=True
+
+        from app.services.vector_store import load_store
+        return LoadedIndex(load_store(vector_store_path), vector_store_path)
+
+    @staticmethod
+    def get_index(vector_store_path: str, prefetch: bool = False, trace: ChatTrace = None) -> LoadedIndex | None:
+        """
+        Returns the index from the in-process LRU cache, loading it on a miss.
+        Concurrent callers for the same path share one load. A prefetch only uses free
+        cache space (returns None if the index doesn't fit) and also warms the lazy parts.
+        A compressed cold index is unpacked first; in a multi-node deployment a missing
+        or outdated local copy is downloaded from the artifact store.
+        The cache outcome is recorded on 'trace', if given.
+        """
+        index_archive.ensure_unpacked(vector_store_path)
+        ArtifactSync.ensure_index(vector_store_path)
+        _wait_for_publish(vector_store_path)
+        index_archive.mark_used(vector_store_path)
+        stamp = LoadedIndex.stamp(vector_store_path)
+        with _loading_guard:
+            lock = _loading.setdefault(vector_store_path, threading.Lock())
+        with lock:
+            index = index_cache.get(vector_store_path, stamp)
+            if trace is not None:
+                trace.index_cache_hit = index is not None
+            if index is not None:
+                return index
+            size = LoadedIndex.disk_bytes(vector_store_path) if os.path.isdir(vector_store_path) else 0
+            if prefetch and size > index_cache.free_bytes():
+                return None
+            index = RAGService.load_index(vector_store_path)
+            if prefetch:
+                index.warm()
+            index_cache.set(vector_store_path, index, size, stamp, evict=not prefetch)
+            return index
+
+    @staticmethod
+    def retrieve(
+        index: LoadedIndex,
+        questions: list[str],
+        query_vectors: list,
+        source_type: str,
+        trace: ChatTrace = None
+    ) -> list[list]:
+        """
+        Hybrid retrieval for one or more questions: the dense (vector store) and lexical (BM25)
+        candidate lists are merged by reciprocal rank fusion into TOP_K chunks each.
+        Runs in a worker thread; both sides are timed separately.
+        """
+        if not settings.HYBRID_SEARCH_ENABLED:
+            with track_stage("vector_search", source_type, trace):
+                dense = index.dense_search(query_vectors, settings.TOP_K)
+            return [index.documents(positions) for positions in dense]
+
+        candidates = max(settings.TOP_K, settings.HYBRID_CANDIDATES)
+        with track_stage("vector_search", source_type, trace):
+            dense = index.dense_search(query_vectors, candidates)
+        with track_stage("lexical_search", source_type, trace):
+            lexical = index.lexical_search(questions, candidates)
+
+        return [
+            index.documents(LoadedIndex.fuse([d, l], settings.TOP_K, settings.RRF_K))
+            for d, l in zip(dense, lexical)
+        ]
+
+    @staticmethod
+    def get_llm() -> "ChatGoogleGenerativeAI":
+        """Creates the Gemini chat model client."""
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return ChatGoogleGenerativeAI(
+            model=settings.LLM_MODEL,
+            temperature=settings.LLM_TEMPERATURE,
+            google_api_key=settings.GEMINI_API_KEY,
+            convert_system_message_to_human=True
         )
 
+    @staticmethod
+    def build_prompt(question: str, docs: list, chat_history: list = None) -> str:
+        """Fills the prompt template with the retrieved context and the history."""
+        from langchain_core.messages import get_buffer_string
+        context = "\n\n".join(doc.page_content for doc in docs)
+        history_str = get_buffer_string(chat_history) if chat_history else "No previous history."
+        return PROMPT_TEMPLATE.format(context=context, question=question, chat_history=history_str)
+
+    @staticmethod
+    async def stream_llm(prompt: str, source_type: str, trace: ChatTrace = None) -> str:
+        """
+        Streams the Gemini answer so time-to-first-token can be measured,
+        then returns the full text. Token usage is summed from the chunks (Gemini
+        reports it per chunk as deltas) and estimated from the text if it is missing.
+        """
+        llm = RAGService.get_llm()
+        started = time.perf_counter()
+        first_token_at = None
+        parts = []
+        prompt_tokens, completion_tokens = 0, 0
+        try:
+            async for chunk in llm.astream(prompt):
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    observe_stage("llm_first_token", source_type, first_token_at - started, trace)
+                parts.append(_chunk_text(chunk))
+                usage = getattr(chunk, "usage_metadata", None)
+                if usage:
+                    prompt_tokens += usage.get("input_tokens", 0)
+                    completion_tokens += usage.get("output_tokens", 0)
+        except Exception as e:
+            record_failure("llm", source_type, e)
+            raise
+        finally:
+            observe_stage("llm_total", source_type, time.perf_counter() - started, trace)
+        answer = "".join(parts)
+
+        if trace is not None:
+            trace.tokens_estimated = not (prompt_tokens or completion_tokens)
+            if trace.tokens_estimated:
+                # Roughly 4 characters per token for English text
+                prompt_tokens, completion_tokens = len(prompt) // 4, len(answer) // 4
+            trace.prompt_tokens, trace.completion_tokens = prompt_tokens, completion_tokens
+        return answer
+
     @staticmethod
     async def generate_response(
         vector_store_path: str,
         question: str,
-        chat_history: list = None
+        chat_history: list = None,
+        source_type: str = "document",
+        trace: ChatTrace = None
     ) -> str:
         """
         Implements an advanced RAG pipeline with Conversational Memory.
+        Every stage is timed separately (see /metrics), labeled by source_type,
+        and also recorded on 'trace' when the caller keeps one for this request.
         """
         try:
-            # 1. Load the searchable index
-            vectorstore = RAGService.get_vectorstore(vector_store_path)
-            
-            # 2. Setup the Retriever
-            retriever = vectorstore.as_retriever(
-                search_kwargs={"k": settings.TOP_K}
-            )
-            
-            # 3. Connect to Gemini
-            llm = ChatGoogleGenerativeAI(
-                model=settings.LLM_MODEL,
-                temperature=settings.LLM_TEMPERATURE,
-                google_api_key=settings.GEMINI_API_KEY,
-                convert_system_message_to_human=True
-            )
-            
-            # 4. Advanced Prompt Template
-            # This prompt instructs the AI to be professional and use the history.
-            prompt_template = """You are DocuMind Pro, a premium AI research assistant. 
-Your goal is to provide accurate, concise, and helpful answers based ONLY on the provided context.
+            with track_queue("chat", source_type):
+                # 1. Load the searchable index (disk I/O + unpickling, off the event loop)
+                with track_stage("index_load", source_type, trace):
+                    index = await run_in_threadpool(RAGService.get_index, vector_store_path, trace=trace)
 
-GUIDELINES:
-- If the answer is not in the context, politely state that you don't have enough information.
-- Use a professional and encouraging tone.
-- Maintain consistency with the conversation history.
-- Use bullet points for complex explanations.
+                # 2. Embed the question
+                with track_stage("query_embedding", source_type, trace):
+                    query_vector = await run_in_threadpool(_embed_query, question)
 
-CONVERSATION HISTORY:
-{chat_history}
+                # 3. Retrieve the TOP_K best chunks (dense + BM25, fused)
+                docs = (await run_in_threadpool(
+                    RAGService.retrieve, index, [question], [query_vector], source_type, trace
+                ))[0]
 
-CONTEXT FROM SOURCES:
-{context}
+                # 4. Build the prompt from context + conversation history
+                with track_stage("prompt_build", source_type, trace):
+                    prompt = RAGService.build_prompt(question, docs, chat_history)
+                if trace is not None:
+                    trace.chunks_used = len(docs)
+                    trace.context_chars = sum(len(doc.page_content) for doc in docs)
 
-USER QUESTION: {question}
+                # 5. Ask Gemini (async, streamed for time-to-first-token)
+                return await RAGService.stream_llm(prompt, source_type, trace)
 
-OFFICIAL RESPONSE:"""
-            
-            from langchain_core.output_parsers import StrOutputParser
-            from langchain_core.runnables import RunnablePassthrough
-            from langchain_core.messages import get_buffer_string
-            
-            PROMPT = PromptTemplate(
-                template=prompt_template, 
-                input_variables=["context", "question", "chat_history"]
-            )
-            
-            def format_docs(docs):
-                return "\n\n".join(doc.page_content for doc in docs)
-
-            # 5. Build the Conversational Chain
-            # We pass the history as a string to the prompt
-            history_str = get_buffer_string(chat_history) if chat_history else "No previous history."
-            
-            chain = (
-                {
-                    "context": retriever | format_docs,
-                    "question": RunnablePassthrough(),
-                    "chat_history": lambda x: history_str
-                }
-                | PROMPT
-                | llm
-                | StrOutputParser()
-            )
-            
-            # 6. Execute
-            result = chain.invoke(question)
-            return result
-            
         except Exception as e:
             # Fallback error message if AI service or Index fails
+            if trace is not None:
+                trace.failed = True
             return f"Error gathering response: {str(e)}"
+
+    @staticmethod
+    async def generate_batch(
+        vector_store_path: str,
+        questions: list[str],
+        source_type: str = "document",
+        concurrency: int = None,
+        traces: list[ChatTrace] = None
+    ) -> AsyncIterator[tuple[int, str]]:
+        """
+        Answers many independent questions about one source.
+        The index is loaded once, all questions are embedded in one batch and searched
+        with one vector-store search (plus BM25); the LLM calls then run concurrently (at most 'concurrency'
+        at a time). Yields (question index, answer) in completion order.
+        If 'traces' is given, traces[i] is filled in for question i; the shared
+        steps count in full for every question.
+        """
+        concurrency = concurrency or settings.BATCH_CHAT_CONCURRENCY
+        shared = ChatTrace() if traces is not None else None
+        try:
+            with track_stage("index_load", source_type, shared):
+                index = await run_in_threadpool(RAGService.get_index, vector_store_path, trace=shared)
+            with track_stage("query_embedding", source_type, shared):
+                query_vectors = await run_in_threadpool(_embed_questions, questions)
+            hits = await run_in_threadpool(
+                RAGService.retrieve, index, questions, query_vectors, source_type, shared
+            )
+        except Exception as e:
+            for position in range(len(questions)):
+                if traces is not None:
+                    traces[position] = shared.fork()
+                    traces[position].failed = True
+                    traces[position].finish()
+                yield position, f"Error gathering response: {str(e)}"
+            return
+
+        limit = asyncio.Semaphore(concurrency)
+
+        async def answer(position: int) -> tuple[int, str]:
+            trace = None
+            if traces is not None:
+                trace = traces[position] = shared.fork()
+                trace.chunks_used = len(hits[position])
+                trace.context_chars = sum(len(doc.page_content) for doc in hits[position])
+            async with limit:
+                try:
+                    with track_queue("chat", source_type):
+                        prompt = RAGService.build_prompt(questions[position], hits[position])
+                        return position, await RAGService.stream_llm(prompt, source_type, trace)
+                except Exception as e:
+                    if trace is not None:
+                        trace.failed = True
+                    return position, f"Error gathering response: {str(e)}"
+                finally:
+                    if trace is not None:
+                        trace.finish()
+
+        tasks = [asyncio.create_task(answer(position)) for position in range(len(questions))]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # The client went away: stop paying for the remaining LLM calls
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,152 @@
+"""Rebuilding existing indexes after embedding model or chunking changes"""
+import json
+import os
+import re
+import time
+from datetime import datetime
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.services import index_archive
+from app.services.artifact_sync import ArtifactSync
+from app.models.document import Document
+from app.models.source import Source
+from app.services.index_service import IndexService
+from app.services.vector_format import INDEX_META_FILE, LEGACY_META, read_meta
+
+# Settings an index depends on; an index built with different values is stale
+INDEX_SETTINGS = ("EMBEDDING_MODEL", "CHUNK_SIZE", "CHUNK_OVERLAP")
+
+# Rebuilt indexes get a new directory: <original path>.r<timestamp>
+_GENERATION = re.compile(r"\.r\d{14}$")
+
+
+class MissingSourceText(Exception):
+    """The index predates kept source text and the source can't be re-extracted locally."""
+
+
+class ReindexService:
+    @staticmethod
+    def fingerprint() -> dict:
+        return {name.lower(): getattr(settings, name) for name in INDEX_SETTINGS}
+
+    @staticmethod
+    def is_stale(vector_store_path: str) -> bool:
+        """True if the index was built with other settings (or before they were recorded)."""
+        if os.path.isdir(vector_store_path):
+            meta = read_meta(vector_store_path)
+        else:
+            # Compressed on this node, or only in the shared store
+            if index_archive.is_archived(vector_store_path):
+                raw = index_archive.read_file(vector_store_path, INDEX_META_FILE)
+            else:
+                raw = ArtifactSync.read_index_file(vector_store_path, INDEX_META_FILE)
+            meta = {**LEGACY_META, **json.loads(raw)} if raw else dict(LEGACY_META)
+        return any(meta.get(key) != value for key, value in ReindexService.fingerprint().items())
+
+    @staticmethod
+    def find_jobs(
+        db: Session,
+        source_types: list[str] = None,
+        user_id: int = None,
+        stale_only: bool = True
+    ) -> list[dict]:
+        """
+        One job per index directory (duplicate uploads share one), oldest first.
+        Documents still processing or failed are left alone.
+        """
+        jobs = {}
+        if not source_types or "document" in source_types:
+            query = select(Document).where(Document.status == "completed", Document.vector_store_path.isnot(None))
+            if user_id is not None:
+                query = query.where(Document.user_id == user_id)
+            for doc in db.execute(query.order_by(Document.id)).scalars():
+                jobs.setdefault(doc.vector_store_path, {
+                    "source_type": "document", "path": doc.vector_store_path, "file_path": doc.file_path
+                })
+
+        web_types = [t for t in (source_types or ["youtube", "webpage"]) if t != "document"]
+        if web_types:
+            query = select(Source).where(Source.source_type.in_(web_types), Source.vector_store_path.isnot(None))
+            if user_id is not None:
+                query = query.where(Source.user_id == user_id)
+            for source in db.execute(query.order_by(Source.id)).scalars():
+                jobs.setdefault(source.vector_store_path, {
+                    "source_type": source.source_type, "path": source.vector_store_path, "url": source.url
+                })
+
+        return [
+            job for job in jobs.values()
+            if ArtifactSync.index_exists(job["path"]) and (not stale_only or ReindexService.is_stale(job["path"]))
+        ]
+
+    @staticmethod
+    def load_documents(job: dict, refetch: bool = False) -> list:
+        """
+        The text to re-chunk: the kept source text, else the uploaded PDF again,
+        else (only with refetch) a fresh transcript / page download.
+        """
+        from langchain_core.documents import Document as LCDocument
+        from app.services.source_text import load_source_text
+
+        index_archive.ensure_unpacked(job["path"])
+        ArtifactSync.ensure_index(job["path"])
+        documents = load_source_text(job["path"])
+        if documents is not None:
+            return documents
+        if job["source_type"] == "document" and job.get("file_path"):
+            ArtifactSync.ensure_upload(job["file_path"])
+        if job["source_type"] == "document" and os.path.exists(job.get("file_path") or ""):
+            from app.services.pdf_extraction import extract_pdf
+            return extract_pdf(job["file_path"])
+        if not refetch:
+            raise MissingSourceText(f"No kept text for {job['path']} (use --refetch or re-add the source)")
+        if job["source_type"] == "youtube":
+            from app.services.youtube_service import YouTubeService
+            return [LCDocument(page_content=YouTubeService.get_transcript(YouTubeService.extract_video_id(job["url"])))]
+        from app.services.webpage_service import WebpageService
+        return [LCDocument(page_content=WebpageService.extract_text(job["url"])[0])]
+
+    @staticmethod
+    def next_path(vector_store_path: str) -> str:
+        base = _GENERATION.sub("", vector_store_path)
+        return f"{base}.r{datetime.now().strftime('%Y%m%d%H%M%S')}"
+
+    @staticmethod
+    def rebuild(job: dict, refetch: bool = False) -> dict:
+        """
+        Re-chunks and re-embeds one source into a new directory next to the old one
+        (build_index only gives it its name once complete); nothing points at it
+        until publish() switches the database rows.
+        """
+        started = time.perf_counter()
+        source_type = job["source_type"]
+        documents = ReindexService.load_documents(job, refetch)
+        chunks = IndexService.split_documents(documents, source_type)
+        if not chunks:
+            raise ValueError(f"No text to index for {job['path']}")
+
+        new_path = ReindexService.next_path(job["path"])
+        while os.path.exists(new_path):
+            time.sleep(1)
+            new_path = ReindexService.next_path(job["path"])
+        IndexService.build_index(chunks, new_path, source_type, documents=documents)
+        return {
+            "path": job["path"],
+            "new_path": new_path,
+            "source_type": source_type,
+            "chunks": len(chunks),
+            "seconds": time.perf_counter() - started,
+        }
+
+    @staticmethod
+    def publish(db: Session, old_path: str, new_path: str) -> int:
+        """Points every row using old_path at new_path in one transaction. Returns the row count."""
+        rows = 0
+        for model in (Document, Source):
+            result = db.execute(
+                update(model).where(model.vector_store_path == old_path).values(vector_store_path=new_path)
+            )
+            rows += result.rowcount
+        db.commit()
+        return rows
@@ -0,0 +1,125 @@
+"""Client for the embedding sidecar (app/embedding_server.py) and its wire format"""
+import json
+import socket
+import struct
+import threading
+import time
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Every message is one frame: two big-endian uint32 lengths (JSON header, binary
+# payload), the UTF-8 JSON header, then the payload. Vectors travel as raw float32.
+FRAME_PREFIX = struct.Struct(">II")
+PRIORITIES = ("interactive", "bulk")
+
+
+class EmbeddingServerError(Exception):
+    """The sidecar is unreachable or answered with an error."""
+
+
+class EmbeddingServerBusy(EmbeddingServerError):
+    """The sidecar's queue is full; the caller should retry later."""
+
+
+def encode_frame(header: dict, payload: bytes = b"") -> bytes:
+    header_bytes = json.dumps(header).encode()
+    return FRAME_PREFIX.pack(len(header_bytes), len(payload)) + header_bytes + payload
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Embedding server closed the connection")
+        data += chunk
+    return bytes(data)
+
+
+def read_frame(sock: socket.socket) -> tuple[dict, bytes]:
+    header_len, payload_len = FRAME_PREFIX.unpack(_recv_exact(sock, FRAME_PREFIX.size))
+    header = json.loads(_recv_exact(sock, header_len))
+    return header, _recv_exact(sock, payload_len) if payload_len else b""
+
+
+async def read_frame_async(reader) -> tuple[dict, bytes]:
+    header_len, payload_len = FRAME_PREFIX.unpack(await reader.readexactly(FRAME_PREFIX.size))
+    header = json.loads(await reader.readexactly(header_len))
+    return header, await reader.readexactly(payload_len) if payload_len else b""
+
+
+class RemoteEmbeddings(Embeddings):
+    """
+    LangChain Embeddings backed by the sidecar, so FAISS and the services use it
+    exactly like the local model. Each thread keeps its own connection.
+    Queries (embed_query / embed_queries) go in the 'interactive' lane, document
+    chunks in the 'bulk' lane;
+    bulk requests rejected as busy are retried with backoff until the timeout.
+    """
+
+    def __init__(self, socket_path: str, timeout: float = 60.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError as e:
+                sock.close()
+                raise EmbeddingServerError(f"Cannot reach embedding server at {self.socket_path}: {e}")
+            self._local.sock = sock
+        return sock
+
+    def _drop_connection(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def _call(self, header: dict) -> tuple[dict, bytes]:
+        # One reconnect covers a sidecar restart between two calls
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+                sock.sendall(encode_frame(header))
+                return read_frame(sock)
+            except (OSError, ConnectionError) as e:
+                self._drop_connection()
+                if attempt:
+                    raise EmbeddingServerError(f"Embedding server request failed: {e}")
+
+    def _embed(self, texts: list[str], priority: str) -> list[list[float]]:
+        if not texts:
+            return []
+        deadline = time.monotonic() + self.timeout
+        delay = 0.05
+        while True:
+            response, payload = self._call({"op": "embed", "priority": priority, "texts": texts})
+            if response.get("ok"):
+                vectors = np.frombuffer(payload, dtype="float32")
+                return vectors.reshape(response["count"], response["dim"]).tolist()
+            if response.get("error") != "busy":
+                raise EmbeddingServerError(response.get("error", "Unknown embedding server error"))
+            if priority != "bulk" or time.monotonic() + delay > deadline:
+                raise EmbeddingServerBusy("Embedding server queue is full")
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._embed(list(texts), "bulk")
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed([text], "interactive")[0]
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        """Several queries in one interactive request (a batch chat's questions)."""
+        return self._embed(list(texts), "interactive")
+
+    def health(self) -> dict:
+        response, _ = self._call({"op": "health"})
+        return response
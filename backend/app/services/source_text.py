@@ -0,0 +1,36 @@
+"""Canonical extracted text of a source, kept next to its index for re-indexing"""
+import gzip
+import json
+import os
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document as LCDocument
+
+SOURCE_TEXT_FILE = "source_text.json.gz"
+
+
+def save_source_text(directory: str, documents: list["LCDocument"]):
+    """
+    Stores the documents chunking started from (PDF pages, a transcript, a cleaned
+    webpage) as gzipped JSON, so a new model or chunking setting can rebuild the
+    index without re-parsing or re-fetching anything.
+    """
+    payload = {
+        "format_version": 1,
+        "documents": [{"text": doc.page_content, "metadata": doc.metadata} for doc in documents],
+    }
+    with gzip.open(os.path.join(directory, SOURCE_TEXT_FILE), "wt", encoding="utf-8", compresslevel=6) as f:
+        json.dump(payload, f, default=str)
+
+
+def load_source_text(directory: str) -> list["LCDocument"] | None:
+    """Returns None for indexes written before the text was kept."""
+    path = os.path.join(directory, SOURCE_TEXT_FILE)
+    if not os.path.exists(path):
+        return None
+    from langchain_core.documents import Document as LCDocument
+
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        payload = json.load(f)
+    return [LCDocument(page_content=doc["text"], metadata=doc["metadata"]) for doc in payload["documents"]]
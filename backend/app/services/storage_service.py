@@ -0,0 +1,254 @@
+"""Storage lifecycle: usage and quotas, orphan sweeping, failed-upload retention, cold-index compression"""
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models.document import Document
+from app.models.source import Source
+from app.services import index_archive
+from app.services.artifact_sync import ArtifactSync
+from app.utils.locks import try_lock
+
+MB = 1024 * 1024
+
+# Held by whichever process is sweeping, so API workers and the CLI take turns
+LOCK_FILE = ".storage.lock"
+
+
+def _user_dirs(root: str) -> dict[int, str]:
+    """Per-user subdirectories (named by user id) of UPLOAD_DIR or VECTOR_STORE_DIR."""
+    if not os.path.isdir(root):
+        return {}
+    with os.scandir(root) as entries:
+        return {int(e.name): e.path for e in entries if e.is_dir() and e.name.isdigit()}
+
+
+def _entry_bytes(path: str) -> int:
+    return index_archive.directory_bytes(path) if os.path.isdir(path) else os.path.getsize(path)
+
+
+def _key(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+class StorageService:
+    @staticmethod
+    def user_usage(user_id: int) -> dict:
+        """Bytes on disk for one user, measured from the filesystem (compressed indexes at their archive size)."""
+        upload_dir = os.path.join(settings.UPLOAD_DIR, str(user_id))
+        index_dir = os.path.join(settings.VECTOR_STORE_DIR, str(user_id))
+        upload_bytes = index_archive.directory_bytes(upload_dir)
+        index_bytes, indexes, compressed = 0, 0, 0
+        if os.path.isdir(index_dir):
+            with os.scandir(index_dir) as entries:
+                for entry in entries:
+                    index_bytes += _entry_bytes(entry.path)
+                    if entry.is_dir():
+                        indexes += 1
+                    elif entry.name.endswith(index_archive.ARCHIVE_SUFFIX):
+                        indexes += 1
+                        compressed += 1
+        quota = settings.STORAGE_USER_QUOTA_MB * MB
+        return {
+            "user_id": user_id,
+            "upload_bytes": upload_bytes,
+            "index_bytes": index_bytes,
+            "total_bytes": upload_bytes + index_bytes,
+            "quota_bytes": quota or None,
+            "indexes": indexes,
+            "compressed_indexes": compressed,
+        }
+
+    @staticmethod
+    def usage() -> list[dict]:
+        """user_usage() for every user with files on disk, largest first."""
+        users = set(_user_dirs(settings.UPLOAD_DIR)) | set(_user_dirs(settings.VECTOR_STORE_DIR))
+        report = [StorageService.user_usage(user_id) for user_id in users]
+        return sorted(report, key=lambda row: row["total_bytes"], reverse=True)
+
+    @staticmethod
+    def check_quota(user_id: int, incoming_bytes: int = 0):
+        """
+        Raises 507 before ingesting anything new for a user at or over their quota
+        (not 413, which uploads use for a single file over MAX_UPLOAD_SIZE).
+        """
+        quota = settings.STORAGE_USER_QUOTA_MB * MB
+        if not quota:
+            return
+        used = StorageService.user_usage(user_id)["total_bytes"]
+        if used + incoming_bytes > quota:
+            raise HTTPException(
+                status_code=status.HTTP_507_INSUFFICIENT_STORAGE,
+                detail=f"Storage quota of {settings.STORAGE_USER_QUOTA_MB}MB reached "
+                       f"({used / MB:.1f}MB used); delete some sources first"
+            )
+
+    @staticmethod
+    def sweep_orphans(db: Session, dry_run: bool = False) -> dict:
+        """
+        Removes uploads and index directories (or archives) that no Document or Source
+        row points at: leftovers of failed deletes, crashed builds, abandoned rebuilds
+        and renamed webpage indexes. Anything modified within STORAGE_ORPHAN_GRACE_HOURS
+        is skipped, which covers uploads and builds still in progress.
+        """
+        cutoff = time.time() - settings.STORAGE_ORPHAN_GRACE_HOURS * 3600
+        candidates = []
+        for root in (settings.UPLOAD_DIR, settings.VECTOR_STORE_DIR):
+            for user_dir in _user_dirs(root).values():
+                with os.scandir(user_dir) as entries:
+                    candidates += [e.path for e in entries if e.stat(follow_symlinks=False).st_mtime < cutoff]
+
+        # Read the references after listing, so rows created meanwhile are seen
+        referenced = set()
+        for column in (Document.file_path, Document.vector_store_path, Source.vector_store_path):
+            referenced.update(_key(path) for path in db.execute(select(column).where(column.isnot(None))).scalars())
+        if referenced and not any(os.path.exists(key) or index_archive.exists(key) for key in referenced):
+            # Paths were written relative to another working directory or data root:
+            # everything would look orphaned, so delete nothing
+            print("⚠️ Orphan sweep skipped: no stored path resolves from here (check UPLOAD_DIR / VECTOR_STORE_DIR)")
+            return {"removed": 0, "freed_bytes": 0, "failed": 0}
+
+        removed, freed, failed = 0, 0, 0
+        for path in candidates:
+            key = _key(path)
+            if key.endswith(index_archive.ARCHIVE_SUFFIX) and os.path.isfile(path):
+                key = key[:-len(index_archive.ARCHIVE_SUFFIX)]
+            if key in referenced or not os.path.lexists(path):
+                continue
+            size = _entry_bytes(path)
+            if dry_run:
+                print(f"   orphan {path} ({size / MB:.1f}MB)")
+            else:
+                try:
+                    if os.path.isdir(path) and not os.path.islink(path):
+                        if not index_archive.remove_tree(path):
+                            failed += 1
+                            continue
+                    else:
+                        os.remove(path)
+                except OSError as e:
+                    print(f"⚠️ Could not delete {path}: {e}")
+                    failed += 1
+                    continue
+            removed += 1
+            freed += size
+        return {"removed": removed, "freed_bytes": freed, "failed": failed}
+
+    @staticmethod
+    def expire_failed_documents(db: Session, dry_run: bool = False) -> dict:
+        """Deletes documents that failed processing more than STORAGE_FAILED_RETENTION_DAYS ago, with their uploads."""
+        cutoff = datetime.now(timezone.utc) - timedelta(days=settings.STORAGE_FAILED_RETENTION_DAYS)
+        failed_docs = db.execute(select(Document).where(
+            Document.status == "failed",
+            Document.upload_date < cutoff.replace(tzinfo=None)
+        )).scalars().all()
+
+        removed, freed = 0, 0
+        for doc in failed_docs:
+            shared = db.execute(select(func.count()).select_from(Document).where(
+                Document.id != doc.id, Document.file_path == doc.file_path
+            )).scalar()
+            if not shared and os.path.exists(doc.file_path):
+                freed += os.path.getsize(doc.file_path)
+                if not dry_run:
+                    try:
+                        os.remove(doc.file_path)
+                    except OSError as e:
+                        # The row goes anyway; the orphan sweep retries the file
+                        print(f"⚠️ Could not delete {doc.file_path}: {e}")
+            if not shared and not dry_run:
+                ArtifactSync.delete_upload(doc.file_path)
+            if not dry_run:
+                db.delete(doc)
+            removed += 1
+        if not dry_run:
+            db.commit()
+        return {"removed": removed, "freed_bytes": freed}
+
+    @staticmethod
+    def compress_cold_indexes(db: Session, dry_run: bool = False) -> dict:
+        """
+        Compresses indexes unused for STORAGE_COLD_INDEX_DAYS. Users over their quota
+        also get their least recently used indexes compressed (any unused for a day),
+        until they are back under it. Compressed indexes are unpacked on their next load.
+        """
+        now = time.time()
+        paths = set()
+        for column in (Document.vector_store_path, Source.vector_store_path):
+            paths.update(db.execute(select(column).where(column.isnot(None)).distinct()).scalars())
+
+        by_user = {}
+        for path in paths:
+            if not os.path.isdir(path):
+                continue
+            user_id = os.path.basename(os.path.dirname(os.path.normpath(path)))
+            by_user.setdefault(user_id, []).append((index_archive.last_used(path), path))
+
+        quota = settings.STORAGE_USER_QUOTA_MB * MB
+        cold_cutoff = now - settings.STORAGE_COLD_INDEX_DAYS * 86400 if settings.STORAGE_COLD_INDEX_DAYS > 0 else None
+        compressed, saved = 0, 0
+        for user_id, indexes in by_user.items():
+            excess = 0
+            if quota and user_id.isdigit():
+                excess = StorageService.user_usage(int(user_id))["total_bytes"] - quota
+            for used_at, path in sorted(indexes):
+                is_cold = cold_cutoff is not None and used_at < cold_cutoff
+                if not is_cold and not (excess > 0 and used_at < now - 86400):
+                    continue
+                if dry_run:
+                    size = index_archive.directory_bytes(path)
+                    print(f"   compress {path} ({size / MB:.1f}MB, unused {(now - used_at) / 86400:.0f} days)")
+                    compressed += 1
+                    continue
+                try:
+                    before, after = index_archive.compress(path)
+                except OSError as e:
+                    print(f"⚠️ Could not compress {path}: {e}")
+                    continue
+                compressed += 1
+                saved += before - after
+                excess -= before - after
+        return {"compressed": compressed, "saved_bytes": saved}
+
+    @staticmethod
+    def run(dry_run: bool = False) -> dict | None:
+        """One full pass. Returns None if another process is already sweeping."""
+        with try_lock(os.path.join(settings.VECTOR_STORE_DIR, LOCK_FILE)) as acquired:
+            if not acquired:
+                return None
+            started = time.perf_counter()
+            with SessionLocal() as db:
+                report = {
+                    "failed_documents": StorageService.expire_failed_documents(db, dry_run),
+                    "orphans": StorageService.sweep_orphans(db, dry_run),
+                    "cold_indexes": StorageService.compress_cold_indexes(db, dry_run),
+                }
+            report["seconds"] = round(time.perf_counter() - started, 2)
+            freed = (
+                report["failed_documents"]["freed_bytes"]
+                + report["orphans"]["freed_bytes"]
+                + report["cold_indexes"]["saved_bytes"]
+            )
+            print(
+                f"🧹 Storage sweep{' (dry run)' if dry_run else ''}: "
+                f"{report['failed_documents']['removed']} failed document(s), "
+                f"{report['orphans']['removed']} orphan(s), "
+                f"{report['cold_indexes']['compressed']} index(es) compressed, {freed / MB:.1f}MB freed"
+            )
+            return report
+
+    @staticmethod
+    async def run_periodically():
+        """Background loop started with the API (STORAGE_SWEEP_ENABLED)."""
+        while True:
+            await asyncio.sleep(settings.STORAGE_SWEEP_INTERVAL_MINUTES * 60)
+            try:
+                await run_in_threadpool(StorageService.run)
+            except Exception as e:
+                print(f"⚠️ Storage sweep failed: {e}")
@@ -0,0 +1,80 @@
+"""Compressed FAISS vector formats and the per-index format record"""
+import json
+import os
+import numpy as np
+from app.config import settings
+
+INDEX_META_FILE = "index_meta.json"
+REFINE_VECTORS_FILE = "vectors.npy"
+FORMAT_VERSION = 1
+VECTOR_FORMATS = ("flat", "float16", "sq8", "pq")
+
+# Indexes written before the format record existed are plain float32 FAISS indexes
+LEGACY_META = {"format_version": 0, "backend": "faiss", "vector_format": "flat", "refine": False}
+
+
+def build_faiss_index(matrix: np.ndarray, vector_format: str):
+    """
+    Builds a FAISS index over matrix (rows keep their positions) in the given format.
+    - flat:    float32, exact (what LangChain writes by default)
+    - float16: 2x smaller, practically lossless
+    - sq8:     4x smaller, 8-bit scalar quantization per dimension
+    - pq:      product quantization with VECTOR_PQ_M one-byte codes per vector
+               (32x smaller for 384-d); needs VECTOR_PQ_MIN_CHUNKS vectors to train,
+               smaller corpora fall back to sq8
+    Returns (index, format actually used).
+    """
+    import faiss
+
+    count, dims = matrix.shape
+    if vector_format == "pq" and (count < settings.VECTOR_PQ_MIN_CHUNKS or dims % settings.VECTOR_PQ_M):
+        vector_format = "sq8"
+
+    if vector_format == "float16":
+        index = faiss.IndexScalarQuantizer(dims, faiss.ScalarQuantizer.QT_fp16)
+    elif vector_format == "sq8":
+        index = faiss.IndexScalarQuantizer(dims, faiss.ScalarQuantizer.QT_8bit)
+    elif vector_format == "pq":
+        index = faiss.IndexPQ(dims, settings.VECTOR_PQ_M, 8)
+    else:
+        index, vector_format = faiss.IndexFlatL2(dims), "flat"
+
+    if not index.is_trained:
+        index.train(matrix)
+    index.add(matrix)
+    return index, vector_format
+
+
+def write_meta(directory: str, **fields):
+    meta = {"format_version": FORMAT_VERSION, **fields}
+    with open(os.path.join(directory, INDEX_META_FILE), "w") as f:
+        json.dump(meta, f)
+
+
+def read_meta(directory: str) -> dict:
+    path = os.path.join(directory, INDEX_META_FILE)
+    if not os.path.exists(path):
+        return dict(LEGACY_META)
+    with open(path) as f:
+        return {**LEGACY_META, **json.load(f)}
+
+
+def save_refine_vectors(directory: str, matrix: np.ndarray):
+    """Full-precision copy used only to re-score candidates; memory-mapped when read."""
+    np.save(os.path.join(directory, REFINE_VECTORS_FILE), np.asarray(matrix, dtype=np.float32))
+
+
+def load_refine_vectors(directory: str):
+    path = os.path.join(directory, REFINE_VECTORS_FILE)
+    return np.load(path, mmap_mode="r") if os.path.exists(path) else None
+
+
+def rank_exact(query: np.ndarray, positions: np.ndarray, vectors: np.ndarray, k: int) -> list[int]:
+    """Top-k of 'positions' by exact L2 distance, given their vectors (same order)."""
+    if len(positions) == 0:
+        return []
+    distances = ((vectors - query) ** 2).sum(axis=1)
+    top = min(k, len(positions))
+    best = np.argpartition(distances, top - 1)[:top]
+    best = best[np.argsort(distances[best], kind="stable")]
+    return [int(p) for p in positions[best]]
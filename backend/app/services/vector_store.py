@@ -0,0 +1,207 @@
+"""Vector store backends: FAISS for large sources, a plain NumPy matrix for small ones"""
+import json
+import os
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING
+import numpy as np
+from app.config import settings
+from app.services.vector_format import read_meta
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document as LCDocument
+    from langchain_community.vectorstores import FAISS
+
+NUMPY_VECTORS_FILE = "embeddings.npy"
+NUMPY_CHUNKS_FILE = "chunks.jsonl"
+
+
+class VectorStore(ABC):
+    """
+    Chunk vectors plus their texts for one source. Chunks are addressed by position
+    (the order they were indexed in), which the BM25 and section indexes share.
+    """
+    backend: str
+    vector_format = "flat"
+    refine = False
+
+    @classmethod
+    @abstractmethod
+    def build(cls, path: str, texts: list[str], metadatas: list[dict], matrix: np.ndarray) -> "VectorStore":
+        """Writes the store into the (existing) directory 'path'."""
+
+    @classmethod
+    @abstractmethod
+    def load(cls, path: str, meta: dict) -> "VectorStore":
+        ...
+
+    @property
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    @abstractmethod
+    def search(self, queries: np.ndarray, k: int) -> list[list[int]]:
+        """Positions of the k nearest chunks (L2) per query row."""
+
+    @abstractmethod
+    def vectors(self, positions: np.ndarray) -> np.ndarray:
+        ...
+
+    @abstractmethod
+    def documents(self, positions: list[int]) -> list["LCDocument"]:
+        ...
+
+
+class FaissStore(VectorStore):
+    """
+    LangChain's FAISS index + pickle docstore. The index may be compressed
+    (VECTOR_FORMAT); with refine, a float32 copy of the vectors is memory-mapped
+    and candidates are re-scored exactly.
+    """
+    backend = "faiss"
+
+    def __init__(self, vectorstore: "FAISS", path: str, vector_format: str = "flat", refine: bool = False):
+        self.vectorstore = vectorstore
+        self.path = path
+        self.vector_format = vector_format
+        self.refine = refine
+        self._refine_vectors = None
+
+    @classmethod
+    def build(cls, path, texts, metadatas, matrix):
+        from langchain_community.vectorstores import FAISS
+        from app.services.embedding_service import get_embeddings
+        from app.services.vector_format import build_faiss_index, save_refine_vectors
+
+        vectorstore = FAISS.from_embeddings(list(zip(texts, matrix)), get_embeddings(), metadatas=metadatas)
+        vector_format = "flat"
+        if settings.VECTOR_FORMAT != "flat":
+            # Same rows in the same order, so docstore ids keep matching
+            vectorstore.index, vector_format = build_faiss_index(matrix, settings.VECTOR_FORMAT)
+        refine = settings.VECTOR_REFINE and vector_format != "flat"
+
+        vectorstore.save_local(path)
+        if refine:
+            save_refine_vectors(path, matrix)
+        return cls(vectorstore, path, vector_format, refine)
+
+    @classmethod
+    def load(cls, path, meta):
+        """
+        NOTE: allow_dangerous_deserialization is required because FAISS uses the 'pickle'
+        format to store index metadata. It's safe here because we only load files
+        that our server itself created.
+        """
+        from langchain_community.vectorstores import FAISS
+        from app.services.embedding_service import get_embeddings
+
+        vectorstore = FAISS.load_local(path, get_embeddings(), allow_dangerous_deserialization=True)
+        return cls(vectorstore, path, meta["vector_format"], meta["refine"])
+
+    @property
+    def count(self) -> int:
+        return self.vectorstore.index.ntotal
+
+    def vectors(self, positions):
+        """The exact copy if the index keeps one, else decoded by FAISS."""
+        positions = np.asarray(positions, dtype=np.int64)
+        if self.refine:
+            if self._refine_vectors is None:
+                from app.services.vector_format import load_refine_vectors
+                self._refine_vectors = load_refine_vectors(self.path)
+            if self._refine_vectors is not None:
+                return np.asarray(self._refine_vectors[positions])
+        return self.vectorstore.index.reconstruct_batch(positions)
+
+    def search(self, queries, k):
+        """Compressed indexes with refine fetch VECTOR_REFINE_FACTOR x k candidates and re-score them."""
+        from app.services.vector_format import rank_exact
+
+        fetch = k * settings.VECTOR_REFINE_FACTOR if self.refine else k
+        _, ids = self.vectorstore.index.search(queries, fetch)
+        results = []
+        for query, row in zip(queries, ids):
+            positions = row[row != -1]
+            if self.refine:
+                results.append(rank_exact(query, positions, self.vectors(positions), k))
+            else:
+                results.append([int(i) for i in positions])
+        return results
+
+    def documents(self, positions):
+        store = self.vectorstore
+        return [store.docstore.search(store.index_to_docstore_id[p]) for p in positions]
+
+
+class NumpyStore(VectorStore):
+    """
+    Small sources: one float32 .npy matrix and a JSON-lines file of texts and
+    metadata. Loading is two file reads and search is one matrix product, with
+    no FAISS or pickle involved. VECTOR_FORMAT does not apply.
+    """
+    backend = "numpy"
+
+    def __init__(self, matrix: np.ndarray, texts: list[str], metadatas: list[dict]):
+        self.matrix = matrix
+        self.texts = texts
+        self.metadatas = metadatas
+        self.norms = (matrix ** 2).sum(axis=1)
+
+    @classmethod
+    def build(cls, path, texts, metadatas, matrix):
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        np.save(os.path.join(path, NUMPY_VECTORS_FILE), matrix)
+        with open(os.path.join(path, NUMPY_CHUNKS_FILE), "w", encoding="utf-8") as f:
+            for text, metadata in zip(texts, metadatas):
+                f.write(json.dumps({"text": text, "metadata": metadata}, default=str) + "\n")
+        return cls(matrix, texts, metadatas)
+
+    @classmethod
+    def load(cls, path, meta):
+        matrix = np.load(os.path.join(path, NUMPY_VECTORS_FILE))
+        texts, metadatas = [], []
+        with open(os.path.join(path, NUMPY_CHUNKS_FILE), encoding="utf-8") as f:
+            for line in f:
+                chunk = json.loads(line)
+                texts.append(chunk["text"])
+                metadatas.append(chunk["metadata"])
+        return cls(matrix, texts, metadatas)
+
+    @property
+    def count(self) -> int:
+        return len(self.texts)
+
+    def vectors(self, positions):
+        return self.matrix[np.asarray(positions, dtype=np.int64)]
+
+    def search(self, queries, k):
+        # ||x - q||^2 without the constant ||q||^2 term
+        distances = self.norms[None, :] - 2 * (queries @ self.matrix.T)
+        top = min(k, self.count)
+        if top == 0:
+            return [[] for _ in queries]
+        best = np.argpartition(distances, top - 1, axis=1)[:, :top]
+        results = []
+        for row, candidates in zip(distances, best):
+            results.append(candidates[np.argsort(row[candidates], kind="stable")].tolist())
+        return results
+
+    def documents(self, positions):
+        from langchain_core.documents import Document as LCDocument
+        return [LCDocument(page_content=self.texts[p], metadata=self.metadatas[p]) for p in positions]
+
+
+BACKENDS = {store.backend: store for store in (FaissStore, NumpyStore)}
+
+
+def choose_backend(count: int) -> type[VectorStore]:
+    """VECTOR_BACKEND, or for 'auto' the NumPy store up to NUMPY_STORE_MAX_CHUNKS chunks."""
+    if settings.VECTOR_BACKEND != "auto":
+        return BACKENDS[settings.VECTOR_BACKEND]
+    return NumpyStore if count <= settings.NUMPY_STORE_MAX_CHUNKS else FaissStore
+
+
+def load_store(path: str) -> VectorStore:
+    """Opens an index directory with the backend recorded in its format record."""
+    meta = read_meta(path)
+    return BACKENDS[meta["backend"]].load(path, meta)
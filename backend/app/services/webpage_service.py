@@ -1,15 +1,17 @@
 """Service for processing webpages"""
+import hashlib
 import os
-import requests
-from bs4 import BeautifulSoup
 from fastapi import HTTPException, status
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.config import settings
 from app.models.source import Source
 from app.models.user import User
-from app.services.document_service import embeddings
+from app.services.index_service import IndexService
+from app.services.storage_service import StorageService
+from app.utils.metrics import track_stage, track_queue
+from app.utils.profiling import profile_thread
 
 class WebpageService:
     @staticmethod
@@ -18,6 +20,9 @@ class WebpageService:
         Downloads a webpage and extracts clean, relevant text.
         Uses BeautifulSoup to parse the HTML and filter out noise.
         """
+        import requests
+        from bs4 import BeautifulSoup
+
         try:
             # 1. Set a standard User-Agent to avoid being blocked as a bot
             headers = {
@@ -56,9 +61,36 @@ class WebpageService:
                 detail=f"Error fetching webpage: {str(e)}"
             )
 
+    @staticmethod
+    @profile_thread("webpage")
+    def build_vector_store(text: str, url: str, user_id: int) -> str:
+        """
+        Splits the page text, embeds the chunks and saves the index.
+        Returns the path of the saved index.
+        """
+        from langchain_core.documents import Document as LCDocument
+
+        # 2. Split text for RAG (Recursive splitting preserves semantic meaning)
+        documents = [LCDocument(page_content=text)]
+        chunks = IndexService.split_documents(documents, "webpage")
+        
+        if not chunks:
+             raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="No suitable text found on webpage"
+            )
+
+        # 3-4. Vectorization (text -> math) and local index storage
+        # One directory per URL: named from its hash, so different URLs never share one
+        url_hash = hashlib.sha256(url.encode("utf-8")).hexdigest()[:32]
+        vector_store_name = f"web_{url_hash}_faiss"
+        vector_store_path = os.path.join(settings.VECTOR_STORE_DIR, str(user_id), vector_store_name)
+        IndexService.build_index(chunks, vector_store_path, "webpage", documents=documents)
+        return vector_store_path
+
     @staticmethod
     async def process_webpage(
-        db: Session,
+        db: AsyncSession,
         user: User,
         url: str
     ) -> Source:
@@ -69,47 +101,31 @@ class WebpageService:
         3. Creates a local vector index
         4. Saves record to DB
         """
-        # 1. Scraping and Cleaning
-        text, title = WebpageService.extract_text(url)
-        
-        # 2. Split text for RAG (Recursive splitting preserves semantic meaning)
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=settings.CHUNK_SIZE,
-            chunk_overlap=settings.CHUNK_OVERLAP
-        )
-        chunks = text_splitter.create_documents([text])
-        
-        if not chunks:
-             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="No suitable text found on webpage"
-            )
+        await run_in_threadpool(StorageService.check_quota, user.id)
 
-        # 3. Vectorization (text -> math)
-        vectorstore = FAISS.from_documents(chunks, embeddings)
-        
-        # 4. Storage logic
-        # Create a safe directory name from the end of the URL
-        safe_name = "".join([c if c.isalnum() else "_" for c in url[-20:]])
-        vector_store_name = f"web_{safe_name}_faiss"
-        vector_store_path = os.path.join(settings.VECTOR_STORE_DIR, str(user.id), vector_store_name)
-        os.makedirs(os.path.dirname(vector_store_path), exist_ok=True)
-        
-        # Save FAISS index locally
-        vectorstore.save_local(vector_store_path)
+        with track_queue("ingestion", "webpage"):
+            # 1. Scraping and Cleaning (blocking network I/O, so it runs in a worker thread)
+            with track_stage("webpage_fetch", "webpage"):
+                text, title = await run_in_threadpool(WebpageService.extract_text, url)
+            
+            # 2-4. Chunking, embedding and index storage (CPU-bound)
+            vector_store_path = await run_in_threadpool(
+                WebpageService.build_vector_store, text, url, user.id
+            )
         
         # 5. Database Logic
-        existing = db.query(Source).filter(
+        result = await db.execute(select(Source).where(
             Source.user_id == user.id,
             Source.url == url,
             Source.source_type == "webpage"
-        ).first()
+        ))
+        existing = result.scalars().first()
         
         if existing:
             existing.vector_store_path = vector_store_path
             existing.title = title
-            db.commit()
-            db.refresh(existing)
+            await db.commit()
+            await db.refresh(existing)
             return existing
             
         new_source = Source(
@@ -121,7 +137,7 @@ class WebpageService:
         )
         
         db.add(new_source)
-        db.commit()
-        db.refresh(new_source)
+        await db.commit()
+        await db.refresh(new_source)
         
         return new_source
@@ -3,14 +3,16 @@ import os
 import re
 from typing import Optional
 from fastapi import HTTPException, status
-from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.config import settings
 from app.models.source import Source
 from app.models.user import User
-from app.services.document_service import embeddings
+from app.services.index_service import IndexService
+from app.services.storage_service import StorageService
+from app.utils.metrics import track_stage, track_queue
+from app.utils.profiling import profile_thread
 
 class YouTubeService:
     @staticmethod
@@ -32,6 +34,8 @@ class YouTubeService:
         YouTubeTranscriptApi. It returns a list of FetchedTranscriptSnippet objects, 
         which we process to extract the raw text.
         """
+        from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound
+
         try:
             # 1. Instantiate the API class
             yt = YouTubeTranscriptApi()
@@ -59,9 +63,29 @@ class YouTubeService:
                 detail=f"Error fetching transcript: {str(e)}"
             )
 
+    @staticmethod
+    @profile_thread("youtube")
+    def build_vector_store(transcript_text: str, video_id: str, user_id: int) -> str:
+        """
+        Splits the transcript, embeds the chunks and saves the index.
+        Returns the path of the saved index.
+        """
+        from langchain_core.documents import Document as LCDocument
+
+        # 2. Split text into manageable chunks
+        documents = [LCDocument(page_content=transcript_text)]
+        chunks = IndexService.split_documents(documents, "youtube")
+        
+        # 3-4. Create Vector Store (text -> embedding conversion) and save it to disk
+        # The embedding model is shared by all ingestion services (see index_service)
+        vector_store_name = f"youtube_{video_id}_faiss"
+        vector_store_path = os.path.join(settings.VECTOR_STORE_DIR, str(user_id), vector_store_name)
+        IndexService.build_index(chunks, vector_store_path, "youtube", documents=documents)
+        return vector_store_path
+
     @staticmethod
     async def process_video(
-        db: Session,
+        db: AsyncSession,
         user: User,
         url: str
     ) -> Source:
@@ -79,39 +103,31 @@ class YouTubeService:
                 detail="Invalid YouTube URL"
             )
 
-        # 1. Fetch transcript text
-        transcript_text = YouTubeService.get_transcript(video_id)
-        
-        # 2. Split text into manageable chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=settings.CHUNK_SIZE,
-            chunk_overlap=settings.CHUNK_OVERLAP
-        )
-        chunks = text_splitter.create_documents([transcript_text])
-        
-        # 3. Create Vector Store (text -> embedding conversion)
-        # We reuse the global embedding model from document_service
-        vectorstore = FAISS.from_documents(chunks, embeddings)
-        
-        # 4. Save Vector Store to local disk for persistence
-        vector_store_name = f"youtube_{video_id}_faiss"
-        vector_store_path = os.path.join(settings.VECTOR_STORE_DIR, str(user.id), vector_store_name)
-        os.makedirs(os.path.dirname(vector_store_path), exist_ok=True)
-        
-        vectorstore.save_local(vector_store_path)
+        await run_in_threadpool(StorageService.check_quota, user.id)
+
+        with track_queue("ingestion", "youtube"):
+            # 1. Fetch transcript text (blocking network I/O, so it runs in a worker thread)
+            with track_stage("transcript_fetch", "youtube"):
+                transcript_text = await run_in_threadpool(YouTubeService.get_transcript, video_id)
+            
+            # 2-4. Chunking, embedding and index storage (CPU-bound)
+            vector_store_path = await run_in_threadpool(
+                YouTubeService.build_vector_store, transcript_text, video_id, user.id
+            )
         
         # 5. Database logic: Create or Update source record
-        existing = db.query(Source).filter(
+        result = await db.execute(select(Source).where(
             Source.user_id == user.id,
             Source.url == url,
             Source.source_type == "youtube"
-        ).first()
+        ))
+        existing = result.scalars().first()
         
         if existing:
             existing.vector_store_path = vector_store_path
             existing.title = f"YouTube Video ({video_id})"
-            db.commit()
-            db.refresh(existing)
+            await db.commit()
+            await db.refresh(existing)
             return existing
         
         new_source = Source(
@@ -123,7 +139,7 @@ class YouTubeService:
         )
         
         db.add(new_source)
-        db.commit()
-        db.refresh(new_source)
+        await db.commit()
+        await db.refresh(new_source)
         
         return new_source
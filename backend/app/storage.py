@@ -0,0 +1,54 @@
+"""
+Storage maintenance: removes orphaned uploads and indexes, deletes documents that
+failed long ago, compresses indexes that have not been used for a while, and
+reports per-user disk usage.
+
+The API runs the same pass every STORAGE_SWEEP_INTERVAL_MINUTES; this command is
+for cron-driven deployments (STORAGE_SWEEP_ENABLED=false) and for checking what a
+pass would do. Run it from the API's working directory, so relative paths in the
+database resolve the same way.
+
+Usage (from the backend/ directory):
+    python -m app.storage --dry-run
+    python -m app.storage
+    python -m app.storage --usage
+"""
+import argparse
+import json
+import sys
+
+from app.services.storage_service import MB, StorageService
+
+
+def run(args) -> int:
+    if args.usage:
+        for row in StorageService.usage():
+            quota = f" of {row['quota_bytes'] / MB:.0f}MB" if row["quota_bytes"] else ""
+            print(
+                f"user {row['user_id']:>6}: {row['total_bytes'] / MB:9.1f}MB{quota} "
+                f"(uploads {row['upload_bytes'] / MB:.1f}MB, {row['indexes']} indexes, "
+                f"{row['compressed_indexes']} compressed)"
+            )
+        return 0
+
+    report = StorageService.run(dry_run=args.dry_run)
+    if report is None:
+        print("⏳ Another process is already running a storage pass")
+        return 1
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Storage sweep, retention and cold-index compression")
+    parser.add_argument("--dry-run", action="store_true", help="List what would be removed or compressed")
+    parser.add_argument("--usage", action="store_true", help="Print disk usage per user and exit")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    return run(parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""Admission control for LLM-backed endpoints: global concurrency + per-user rate limits"""
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from prometheus_client import Counter, Histogram
+from app.config import settings
+from app.utils.metrics import ChatTrace, QUEUE_DEPTH, STAGE_BUCKETS, stats_collector
+
+ADMISSIONS = Counter(
+    "tokentalk_admission_total",
+    "Admission decisions ('admitted', 'rate_limited', 'queue_full', 'queue_timeout')",
+    ["limiter", "result"]
+)
+
+ADMISSION_WAIT = Histogram(
+    "tokentalk_admission_wait_seconds",
+    "Time admitted requests spent waiting for a free slot",
+    ["limiter"],
+    buckets=STAGE_BUCKETS
+)
+
+
+class AdmissionRejected(Exception):
+    """Raised instead of queueing; main.py turns it into a 429 with Retry-After."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class TokenBucket:
+    """Classic token bucket: 'rate' tokens per second, at most 'burst' saved up."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, cost: int = 1) -> float:
+        """
+        Consumes 'cost' tokens. Returns 0 on success, else seconds until enough are available.
+        A cost above the burst only needs a full bucket and leaves it in debt, so a
+        large request is paid for by the wait before the next one.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        needed = min(cost, self.burst)
+        if self.tokens >= needed:
+            self.tokens -= cost
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """
+    Decides whether a request may start, per worker process (one event loop).
+    1. Per-user token bucket: user_rate requests/sec with bursts of user_burst
+       (a batch is charged one token per question).
+    2. Global limit: at most max_concurrent requests run at once; up to max_queue
+       more wait (FIFO) for at most queue_timeout seconds.
+    Anything beyond that is rejected immediately, so overload costs one fast 429
+    instead of slowing every request down.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float,
+                 user_rate: float, user_burst: float, max_users: int = 10000):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.max_users = max_users
+        self.active = 0
+        self.waiting = 0
+        self._buckets: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        self._semaphore = None
+        # Moving average of how long a slot is held, used for Retry-After hints
+        self._hold_seconds = 1.0
+
+    def _reject(self, result: str, retry_after: float):
+        ADMISSIONS.labels(self.name, result).inc()
+        raise AdmissionRejected(result, retry_after)
+
+    def _check_rate(self, user_id: int, cost: int):
+        if self.user_rate <= 0 or cost <= 0:
+            return
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(self.user_rate, self.user_burst)
+            # Forget the least recently seen users (they start again with a full bucket)
+            while len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(user_id)
+        wait = bucket.take(cost)
+        if wait:
+            self._reject("rate_limited", wait)
+
+    def _queue_estimate(self) -> float:
+        return self._hold_seconds * (self.waiting + 1) / self.max_concurrent
+
+    def check(self, user_id: int, cost: int = 1):
+        """
+        Fails fast (AdmissionRejected) if the user is over their rate or the queue is
+        full, charging 'cost' rate tokens. For callers that take the slot later with
+        admit(..., cost=0), e.g. inside a streamed response.
+        """
+        self._check_rate(user_id, cost)
+        if self._semaphore is not None and self._semaphore.locked() and self.waiting >= self.max_queue:
+            self._reject("queue_full", self._queue_estimate())
+
+    @asynccontextmanager
+    async def admit(self, user_id: int, trace: ChatTrace = None, cost: int = 1):
+        """
+        Holds one slot for the duration of the block, or raises AdmissionRejected.
+        'cost' rate tokens are charged first (0 if check() already did).
+        The wait is also recorded on 'trace' (stage 'admission'), if given.
+        """
+        self._check_rate(user_id, cost)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+
+        started = time.perf_counter()
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue:
+                self._reject("queue_full", self._queue_estimate())
+            self.waiting += 1
+            QUEUE_DEPTH.labels(f"{self.name}_admission", "all").inc()
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._reject("queue_timeout", self._queue_estimate())
+            finally:
+                self.waiting -= 1
+                QUEUE_DEPTH.labels(f"{self.name}_admission", "all").dec()
+        else:
+            await self._semaphore.acquire()
+
+        ADMISSIONS.labels(self.name, "admitted").inc()
+        waited = time.perf_counter() - started
+        ADMISSION_WAIT.labels(self.name).observe(waited)
+        if trace is not None:
+            trace.add("admission", waited)
+        self.active += 1
+        held_from = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+            self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * (time.perf_counter() - held_from)
+
+    def stats(self) -> dict:
+        return {"active": self.active, "waiting": self.waiting, "tracked_users": len(self._buckets)}
+
+
+# Shared by every chat endpoint (documents, YouTube, webpages)
+chat_admission = AdmissionController(
+    "chat",
+    max_concurrent=settings.CHAT_MAX_CONCURRENT,
+    max_queue=settings.CHAT_MAX_QUEUE,
+    queue_timeout=settings.CHAT_QUEUE_TIMEOUT_SECONDS,
+    user_rate=settings.CHAT_USER_RATE_PER_MINUTE / 60,
+    user_burst=settings.CHAT_USER_BURST
+)
+stats_collector.register("admission", chat_admission.stats, limiter="chat")
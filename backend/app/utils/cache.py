@@ -0,0 +1,193 @@
+"""Small in-process caches shared by the API layer"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after a time-to-live.
+    - max_size: Oldest (least recently used) entries are evicted beyond this.
+    - ttl: Default lifetime in seconds; set() can shorten it per entry.
+    Hit/miss/eviction counters are kept so the cache can be monitored.
+    """
+
+    def __init__(self, name: str, max_size: int, ttl: float):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns the cached value, or default if missing or expired."""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Stores a value; ttl overrides the default lifetime when given."""
+        if self.max_size <= 0:
+            return
+        lifetime = self.ttl if ttl is None else min(ttl, self.ttl)
+        if lifetime <= 0:
+            return
+
+        with self._lock:
+            self._data[key] = (time.monotonic() + lifetime, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """Drops a single entry (no-op if it is not cached)."""
+        with self._lock:
+            if self._data.pop(key, _MISSING) is not _MISSING:
+                self.invalidations += 1
+
+    def clear(self):
+        """Drops every entry."""
+        with self._lock:
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """Snapshot of size and counters for monitoring."""
+        with self._lock:
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+class SizedLRUCache:
+    """
+    Thread-safe LRU cache bounded by the total size of its values (in bytes, as
+    reported by the caller) and by their number.
+    - stamp: Version of the value (e.g. a file mtime); get() with another stamp is
+      a miss and drops the stale entry.
+    - Entries added with evict=False (prefetches) only use free space, so they
+      never push out something that is in use. Until they are first read they
+      count as 'unused prefetches' and can be dropped under memory pressure.
+    """
+
+    def __init__(self, name: str, max_bytes: int, max_size: int):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.max_size = max_size
+        # key -> [stamp, value, size, unused prefetch]
+        self._data: "OrderedDict[Hashable, list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.prefetch_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, stamp: Any = None, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] != stamp:
+                if entry is not None:
+                    self._remove(key)
+                    self.invalidations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            if entry[3]:
+                entry[3] = False
+                self.prefetch_hits += 1
+            return entry[1]
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def set(self, key: Hashable, value: Any, size: int, stamp: Any = None, evict: bool = True) -> bool:
+        """Stores a value; returns False if it does not fit (too large, or no free space with evict=False)."""
+        if self.max_size <= 0 or size > self.max_bytes:
+            return False
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            if not evict and (self.bytes + size > self.max_bytes or len(self._data) >= self.max_size):
+                return False
+            self._data[key] = [stamp, value, size, not evict]
+            self.bytes += size
+            while self.bytes > self.max_bytes or len(self._data) > self.max_size:
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+            return True
+
+    def free_bytes(self) -> int:
+        with self._lock:
+            return max(0, self.max_bytes - self.bytes) if len(self._data) < self.max_size else 0
+
+    def drop_unused_prefetches(self) -> int:
+        """Drops prefetched entries nobody has read yet; returns how many."""
+        with self._lock:
+            unused = [key for key, entry in self._data.items() if entry[3]]
+            for key in unused:
+                self._remove(key)
+            self.evictions += len(unused)
+            return len(unused)
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+                self.invalidations += 1
+
+    def _remove(self, key: Hashable):
+        self.bytes -= self._data.pop(key)[2]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "prefetch_hits": self.prefetch_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
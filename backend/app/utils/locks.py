@@ -0,0 +1,28 @@
+"""Advisory file locks shared by API workers and CLI processes on one host"""
+import os
+from contextlib import contextmanager
+
+
+@contextmanager
+def try_lock(path: str):
+    """
+    Non-blocking exclusive flock on 'path' (created if needed). Yields False instead
+    of waiting when another process - or another open() in this one - holds it.
+    Where flock is unavailable (Windows) it always yields True.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        yield True
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,209 @@
+"""Prometheus metrics for the RAG and ingestion pipelines"""
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+# Set by gunicorn.conf.py when several workers serve the API: every process then
+# writes its samples to files in that directory and render_metrics() adds them up
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+# Buckets span fast in-memory steps (ms) up to multi-minute PDF ingestions
+STAGE_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0
+)
+
+# Per-stage latency. Stages used today:
+# chat:      index_load, query_embedding, vector_search, lexical_search, prompt_build,
+#            llm_first_token, llm_total
+# ingestion: pdf_parse, transcript_fetch, webpage_fetch, chunking, embedding, index_write,
+#            dedup, lexical_index, hierarchy_index
+STAGE_SECONDS = Histogram(
+    "tokentalk_stage_seconds",
+    "Time spent in each RAG / ingestion stage",
+    ["stage", "source_type"],
+    buckets=STAGE_BUCKETS
+)
+
+EMBEDDING_THROUGHPUT = Histogram(
+    "tokentalk_embedding_chunks_per_second",
+    "Ingestion embedding throughput per index build",
+    ["source_type"],
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+)
+
+CACHE_EVENTS = Counter(
+    "tokentalk_cache_events_total",
+    "Cache lookups by cache and result ('hit' / 'miss')",
+    ["cache", "result", "source_type"]
+)
+
+FAILURES = Counter(
+    "tokentalk_failures_total",
+    "Failures by stage and exception type",
+    ["stage", "error_type", "source_type"]
+)
+
+DEDUP_CHUNKS = Counter(
+    "tokentalk_dedup_chunks_total",
+    "Chunks seen by ingestion dedup, by outcome ('kept' / 'dropped')",
+    ["outcome", "source_type"]
+)
+
+QUEUE_DEPTH = Gauge(
+    "tokentalk_queue_depth",
+    "Work currently queued or in flight",
+    ["queue", "source_type"],
+    multiprocess_mode="livesum"
+)
+
+# Embedding scheduler lanes ('interactive' for chat queries, 'bulk' for ingestion)
+EMBEDDING_LANE_DEPTH = Gauge(
+    "tokentalk_embedding_lane_depth",
+    "Texts waiting in each embedding scheduler lane",
+    ["lane"],
+    multiprocess_mode="livesum"
+)
+
+EMBEDDING_LANE_WAIT = Histogram(
+    "tokentalk_embedding_lane_wait_seconds",
+    "Time from submission until a request's first batch reaches the model",
+    ["lane"],
+    buckets=STAGE_BUCKETS
+)
+
+EMBEDDING_LANE_TEXTS = Counter(
+    "tokentalk_embedding_lane_texts_total",
+    "Texts embedded per scheduler lane",
+    ["lane"]
+)
+
+
+def observe_stage(stage: str, source_type: str, seconds: float, trace: "ChatTrace" = None):
+    """Records a stage duration measured by the caller (also on the request's trace, if given)."""
+    STAGE_SECONDS.labels(stage, source_type).observe(seconds)
+    if trace is not None:
+        trace.add(stage, seconds)
+
+
+def record_failure(stage: str, source_type: str, error: BaseException):
+    """Counts a failure under its exception class name."""
+    FAILURES.labels(stage, type(error).__name__, source_type).inc()
+
+
+@contextmanager
+def track_stage(stage: str, source_type: str, trace: "ChatTrace" = None):
+    """
+    Times the wrapped block as one stage.
+    Exceptions are counted in tokentalk_failures_total and re-raised.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        record_failure(stage, source_type, e)
+        raise
+    finally:
+        observe_stage(stage, source_type, time.perf_counter() - started, trace)
+
+
+@contextmanager
+def track_queue(queue: str, source_type: str):
+    """Counts the wrapped block as one in-flight item of a queue."""
+    gauge = QUEUE_DEPTH.labels(queue, source_type)
+    gauge.inc()
+    try:
+        yield
+    finally:
+        gauge.dec()
+
+
+class ChatTrace:
+    """
+    The breakdown of one chat request. The histograms above aggregate every request;
+    a trace keeps this request's own stage times, token counts and cache outcome so
+    they can be stored with its Conversation (see ChatMetricsService).
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished: float | None = None
+        self.stages: dict[str, float] = {}  # seconds, summed per stage name
+        self.prompt_tokens: int | None = None
+        self.completion_tokens: int | None = None
+        self.tokens_estimated = False
+        self.chunks_used: int | None = None
+        self.context_chars: int | None = None
+        self.index_cache_hit: bool | None = None
+        self.failed = False
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def ms(self, *stages: str) -> float | None:
+        """Milliseconds spent in the given stages together; None if none of them ran."""
+        seen = [self.stages[stage] for stage in stages if stage in self.stages]
+        return sum(seen) * 1000 if seen else None
+
+    def finish(self):
+        """Stops the clock (elapsed_ms() otherwise runs until it is read)."""
+        if self.finished is None:
+            self.finished = time.perf_counter()
+
+    def elapsed_ms(self) -> float:
+        return ((self.finished or time.perf_counter()) - self.started) * 1000
+
+    def fork(self) -> "ChatTrace":
+        """A copy sharing this trace's start and stages so far (one per batch question)."""
+        trace = ChatTrace()
+        trace.__dict__.update(self.__dict__, stages=dict(self.stages))
+        return trace
+
+
+class StatsCollector:
+    """
+    Exposes components that keep their own counters (caches, worker pools)
+    through a stats() dict, so they do not need to import prometheus_client.
+    Each numeric key becomes a gauge named tokentalk_<prefix>_<key>.
+    These are read live from the process serving the scrape, so in MULTIPROCESS
+    mode they carry a 'pid' label rather than pretending to cover every worker.
+    """
+
+    def __init__(self):
+        self._providers = []
+
+    def register(self, prefix: str, provider, **labels):
+        self._providers.append((prefix, provider, labels))
+
+    def collect(self):
+        families = {}
+        for prefix, provider, labels in self._providers:
+            if MULTIPROCESS:
+                labels = {**labels, "pid": str(os.getpid())}
+            for key, value in provider().items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f"tokentalk_{prefix}_{key}"
+                if name not in families:
+                    families[name] = GaugeMetricFamily(
+                        name, f"{prefix} {key.replace('_', ' ')}", labels=list(labels)
+                    )
+                families[name].add_metric(list(labels.values()), value)
+        yield from families.values()
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+def render_metrics() -> bytes:
+    """The /metrics payload: this process's registry, or every worker's in MULTIPROCESS mode."""
+    if not MULTIPROCESS:
+        return generate_latest()
+    from prometheus_client import CollectorRegistry, multiprocess
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(stats_collector)
+    return generate_latest(registry)
@@ -0,0 +1,136 @@
+"""Opt-in per-request profiling (pyinstrument) with speedscope / HTML output"""
+import contextvars
+import functools
+import os
+import random
+import re
+import secrets
+import time
+import uuid
+from fastapi.concurrency import run_in_threadpool
+from app.config import settings
+
+# Set while a profiled request (including its background tasks) is running.
+# run_in_threadpool copies the context, so worker threads can see it too.
+_active_profile: contextvars.ContextVar = contextvars.ContextVar("active_profile", default=None)
+
+# Only files with these endings count towards (and are removed by) retention
+PROFILE_EXTENSIONS = (".speedscope.json", ".html")
+
+
+class ProfileContext:
+    """Identifies one profiled request so every file it produces shares a prefix."""
+
+    def __init__(self, method: str, path: str):
+        self.profile_id = uuid.uuid4().hex[:12]
+        safe_path = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_") or "root"
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
+        self.prefix = f"{timestamp}_{method}_{safe_path}_{self.profile_id}"
+
+
+def _render(session, output_dir: str, name: str) -> str:
+    """Writes one pyinstrument session in the configured format and returns its path."""
+    if settings.PROFILING_FORMAT == "html":
+        from pyinstrument.renderers import HTMLRenderer
+        renderer, extension = HTMLRenderer(), "html"
+    else:
+        from pyinstrument.renderers import SpeedscopeRenderer
+        renderer, extension = SpeedscopeRenderer(), "speedscope.json"
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"{name}.{extension}")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(renderer.render(session))
+    _enforce_retention(output_dir)
+    return path
+
+
+def _enforce_retention(output_dir: str):
+    """Keeps only the newest PROFILING_MAX_FILES profiles."""
+    entries = [
+        os.path.join(output_dir, name) for name in os.listdir(output_dir)
+        if name.endswith(PROFILE_EXTENSIONS)
+    ]
+    files = sorted(entries, key=os.path.getmtime, reverse=True)
+    for stale in files[settings.PROFILING_MAX_FILES:]:
+        try:
+            os.remove(stale)
+        except OSError:
+            pass
+
+
+def profile_thread(label: str):
+    """
+    Decorator for CPU-heavy functions that run in worker threads (index builds).
+    When the calling request is being profiled, the function gets its own
+    profiler (pyinstrument samples one thread at a time) and a separate output file
+    with the request's prefix. Otherwise it is a single ContextVar lookup.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            context = _active_profile.get()
+            if context is None:
+                return func(*args, **kwargs)
+
+            from pyinstrument import Profiler
+            profiler = Profiler(interval=settings.PROFILING_INTERVAL, async_mode="disabled")
+            # Nested decorated calls are covered by the outer profiler
+            token = _active_profile.set(None)
+            profiler.start()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                session = profiler.stop()
+                _active_profile.reset(token)
+                _render(session, settings.PROFILING_DIR, f"{context.prefix}_thread_{label}")
+        return wrapper
+    return decorator
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware that profiles selected requests end to end.
+    A request is profiled when it carries PROFILING_HEADER with the value of
+    PROFILING_TOKEN, or when it is picked by PROFILING_SAMPLE_RATE.
+    Background tasks run inside the ASGI call, so they are part of the profile;
+    threadpool work is captured by functions decorated with profile_thread.
+    Only registered when PROFILING_ENABLED is set.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.header = settings.PROFILING_HEADER.lower().encode()
+
+    def _should_profile(self, scope) -> bool:
+        if settings.PROFILING_TOKEN:
+            for name, value in scope.get("headers", ()):
+                if name == self.header:
+                    return secrets.compare_digest(value.decode("latin-1"), settings.PROFILING_TOKEN)
+        return settings.PROFILING_SAMPLE_RATE > 0 and random.random() < settings.PROFILING_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        from pyinstrument import Profiler
+        context = ProfileContext(scope.get("method", "GET"), scope.get("path", "/"))
+
+        async def send_with_profile_id(message):
+            # Lets the caller find the flamegraph for this response
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", context.profile_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        profiler = Profiler(interval=settings.PROFILING_INTERVAL, async_mode="enabled")
+        token = _active_profile.set(context)
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            session = profiler.stop()
+            _active_profile.reset(token)
+            await run_in_threadpool(_render, session, settings.PROFILING_DIR, context.prefix)
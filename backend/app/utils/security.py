@@ -1,13 +1,28 @@
 """Security utilities for JWT and password hashing"""
+import asyncio
+import hashlib
+import hmac
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from app.config import settings
+from app.utils.metrics import stats_collector
 
 # Password hashing context: Uses PBKDF2 with SHA256 for secure hashing.
 # 'deprecated=auto' ensures we can smoothly upgrade hashing algorithms in the future.
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+# When PASSWORD_HASH_ROUNDS is set it also becomes the minimum, so older hashes
+# with fewer rounds are flagged for a rehash on the next successful login.
+_hash_options = {}
+if settings.PASSWORD_HASH_ROUNDS:
+    _hash_options = {
+        "pbkdf2_sha256__default_rounds": settings.PASSWORD_HASH_ROUNDS,
+        "pbkdf2_sha256__min_rounds": settings.PASSWORD_HASH_ROUNDS,
+    }
+pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto", **_hash_options)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -20,6 +35,132 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    """
+    Verifies a password and, if the stored hash uses outdated parameters,
+    returns a replacement hash as the second element (otherwise None).
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def _timed_call(func, *args):
+    """Runs func in the worker and reports when it actually started."""
+    started_at = time.time()
+    return started_at, func(*args)
+
+
+class PasswordHashPoolFull(Exception):
+    """Raised when too many hashing jobs are already waiting."""
+
+
+class PasswordHashPool:
+    """
+    Runs PBKDF2 work on a dedicated, bounded worker pool instead of the event loop.
+    - workers: Maximum number of hashes computed at once.
+    - max_queue: Jobs allowed to wait for a worker; beyond that we fail fast.
+    A thread pool is enough because hashlib's PBKDF2 releases the GIL;
+    'process' isolates the CPU work completely.
+    """
+
+    def __init__(self, workers: int, max_queue: int, executor_type: str = "thread"):
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.executor_type = executor_type
+        self._executor = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+
+    def _get_executor(self):
+        # Created lazily so importing this module never spawns workers
+        with self._lock:
+            if self._executor is None:
+                if self.executor_type == "process":
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers,
+                        thread_name_prefix="password-hash"
+                    )
+            return self._executor
+
+    async def run(self, func, *args):
+        """Schedules func(*args) on the pool and awaits its result."""
+        with self._lock:
+            queued = self.in_flight - self.workers
+            if queued >= self.max_queue:
+                self.rejected += 1
+                raise PasswordHashPoolFull("Password hashing queue is full")
+            self.in_flight += 1
+            self.submitted += 1
+
+        submitted_at = time.time()
+        try:
+            loop = asyncio.get_running_loop()
+            started_at, result = await loop.run_in_executor(
+                self._get_executor(), _timed_call, func, *args
+            )
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+        finished_at = time.time()
+        wait = max(0.0, started_at - submitted_at)
+        with self._lock:
+            self.completed += 1
+            self.total_wait_seconds += wait
+            self.max_wait_seconds = max(self.max_wait_seconds, wait)
+            self.total_run_seconds += max(0.0, finished_at - started_at)
+        return result
+
+    def stats(self) -> dict:
+        """Snapshot of pool activity for monitoring."""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "in_flight": self.in_flight,
+                "queued": max(0, self.in_flight - self.workers),
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "total_wait_seconds": self.total_wait_seconds,
+                "max_wait_seconds": self.max_wait_seconds,
+                "total_run_seconds": self.total_run_seconds,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+password_hash_pool = PasswordHashPool(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+    executor_type=settings.PASSWORD_HASH_EXECUTOR
+)
+stats_collector.register("password_hash", password_hash_pool.stats)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """Async variant of get_password_hash that runs on the hashing pool."""
+    return await password_hash_pool.run(get_password_hash, password)
+
+
+async def verify_and_update_password_async(
+    plain_password: str,
+    hashed_password: str
+) -> tuple[bool, Optional[str]]:
+    """Async variant of verify_and_update_password that runs on the hashing pool."""
+    return await password_hash_pool.run(verify_and_update_password, plain_password, hashed_password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
     Generates a JSON Web Token (JWT) for user authentication.
@@ -51,3 +192,11 @@ def decode_access_token(token: str) -> Optional[dict]:
         return payload
     except JWTError:
         return None
+
+
+def affinity_key(user_id: int) -> str:
+    """
+    Stable per-user routing key for load balancers (AFFINITY_HEADER). Keyed with
+    SECRET_KEY so it does not reveal user ids.
+    """
+    return hmac.new(settings.SECRET_KEY.encode("utf-8"), f"user:{user_id}".encode("utf-8"), hashlib.sha256).hexdigest()[:16]
@@ -0,0 +1,43 @@
+"""Atomic exchange of two directories (renameat2 RENAME_EXCHANGE on Linux, RENAME_SWAP on macOS)"""
+import ctypes
+import errno
+import os
+import sys
+
+_AT_FDCWD = -100
+_RENAME_EXCHANGE = 2  # <linux/fs.h>
+_RENAME_SWAP = 0x2  # <stdio.h> on macOS
+
+# Filesystem or kernel without support: the caller falls back to two renames
+_UNSUPPORTED = {errno.EINVAL, errno.ENOSYS, errno.ENOTSUP, errno.EOPNOTSUPP, errno.EXDEV}
+
+
+def _libc_call():
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+    except OSError:
+        return None
+    if sys.platform.startswith("linux") and hasattr(libc, "renameat2"):
+        return lambda a, b: libc.renameat2(_AT_FDCWD, a, _AT_FDCWD, b, _RENAME_EXCHANGE)
+    if sys.platform == "darwin" and hasattr(libc, "renamex_np"):
+        return lambda a, b: libc.renamex_np(a, b, _RENAME_SWAP)
+    return None
+
+
+_exchange = _libc_call()
+
+
+def exchange(a: str, b: str) -> bool:
+    """
+    Swaps two existing paths in one step, so 'b' is never missing (unlike
+    rename(b, old); rename(a, b)). Returns False where the platform or filesystem
+    can't do it, e.g. Windows or NFS; other errors raise OSError.
+    """
+    if _exchange is None:
+        return False
+    if _exchange(os.fsencode(a), os.fsencode(b)) == 0:
+        return True
+    error = ctypes.get_errno()
+    if error in _UNSUPPORTED:
+        return False
+    raise OSError(error, os.strerror(error), a, None, b)
@@ -0,0 +1 @@
+# Offline benchmark suite (synthetic corpora, stubbed LLM and network)
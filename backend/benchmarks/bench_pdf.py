@@ -0,0 +1,136 @@
+"""
+PDF extraction benchmark: pages/sec, peak memory and text parity of each extraction
+backend against LangChain's PyPDFLoader (what ingestion used before pdf_extraction).
+
+Each backend runs in a fresh process so peak RSS is its own. Parity compares the
+whitespace-normalised words of every page with PyPDFLoader's text for that page.
+
+Usage (from the backend/ directory):
+    python -m benchmarks.bench_pdf --corpus ~/pdfs
+    python -m benchmarks.bench_pdf --pages 200 --files 5 --output pdf.json
+"""
+import argparse
+import difflib
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+from benchmarks import fixtures
+from benchmarks.run_benchmarks import peak_rss_mb
+
+# name -> (pdf_extraction backend, PDF_PAGE_TIMEOUT_SECONDS); "pypdfloader" is the old path
+VARIANTS = {
+    "pypdfloader": (None, 0),
+    "pypdf": ("pypdf", 0),
+    "pdfium": ("pdfium", 0),
+    "pdfium_isolated": ("pdfium", 30),
+}
+
+
+def run_variant(name: str, files: list[str]) -> dict:
+    """Child process: extracts every file and returns timings plus the page texts."""
+    backend, timeout = VARIANTS[name]
+    os.environ["PDF_PAGE_TIMEOUT_SECONDS"] = str(timeout)
+    from app.services.pdf_extraction import extract_pdf
+    if backend is None:
+        from langchain_community.document_loaders import PyPDFLoader
+
+    baseline_rss = peak_rss_mb()
+    texts, pages = {}, 0
+    started = time.perf_counter()
+    for path in files:
+        if backend is None:
+            documents = PyPDFLoader(path).load()
+        else:
+            documents = extract_pdf(path, backend)
+        pages += len(documents)
+        texts[path] = {doc.metadata["page"]: doc.page_content for doc in documents}
+    elapsed = time.perf_counter() - started
+    return {
+        "pages": pages,
+        "seconds": elapsed,
+        "pages_per_sec": pages / elapsed if elapsed > 0 else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_growth_mb": peak_rss_mb() - baseline_rss,
+        "texts": texts,
+    }
+
+
+def parity(reference: dict, candidate: dict) -> dict:
+    """Share of reference pages with identical words, and the mean word-sequence similarity."""
+    ratios, identical = [], 0
+    for path, pages in reference.items():
+        for page, text in pages.items():
+            expected = text.split()
+            found = candidate.get(path, {}).get(page, "").split()
+            identical += expected == found
+            ratios.append(difflib.SequenceMatcher(None, expected, found, autojunk=False).ratio())
+    return {
+        "identical_pages": identical / len(ratios) if ratios else 1.0,
+        "mean_similarity": sum(ratios) / len(ratios) if ratios else 1.0,
+    }
+
+
+def corpus_files(args, workdir: str) -> list[str]:
+    if args.corpus:
+        files = sorted(glob.glob(os.path.join(os.path.expanduser(args.corpus), "**", "*.pdf"), recursive=True))
+        if not files:
+            raise SystemExit(f"No PDFs under {args.corpus}")
+        return files
+    return [
+        fixtures.write_pdf(os.path.join(workdir, "corpus", f"bench_{i}.pdf"), args.pages, seed=i)
+        for i in range(args.files)
+    ]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="PDF extraction benchmark")
+    parser.add_argument("--corpus", help="Directory of PDFs (searched recursively); generated if omitted")
+    parser.add_argument("--files", type=int, default=3, help="Generated files (no --corpus)")
+    parser.add_argument("--pages", type=int, default=100, help="Pages per generated file")
+    parser.add_argument("--variants", default=",".join(VARIANTS),
+                        help=f"Comma-separated subset of {', '.join(VARIANTS)}")
+    parser.add_argument("--output", help="Also write the JSON report here")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    workdir = fixtures.configure_environment()
+    files = corpus_files(args, workdir)
+    variants = [v for v in args.variants.split(",") if v]
+
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for name in dict.fromkeys(["pypdfloader", *variants]):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results[name] = pool.submit(run_variant, name, files).result()
+
+    reference = results["pypdfloader"]["texts"]
+    report = {
+        "scenario": "pdf_extraction",
+        "cpu_count": os.cpu_count(),
+        "files": len(files),
+        "results": {
+            name: {
+                **{k: v for k, v in result.items() if k != "texts"},
+                "speedup": result["pages_per_sec"] / (results["pypdfloader"]["pages_per_sec"] or 1.0),
+                "parity": parity(reference, result["texts"]),
+            }
+            for name, result in results.items() if name in variants
+        },
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+"""
+Retrieval benchmark on synthetic embeddings: search latency and recall@k of
+alternative index layouts against exact flat FAISS search, as the corpus grows.
+
+Vectors are generated, not embedded: every section of a simulated document has
+its own topic direction and its chunks scatter around it, which is how page groups
+of a real PDF behave. Queries are perturbed chunk vectors.
+
+Usage (from the backend/ directory):
+    python -m benchmarks.bench_retrieval --scenario hierarchy --sizes 2000,10000,50000
+    python -m benchmarks.bench_retrieval --scenario hierarchy --top-sections 4,8,16 --output h.json
+    python -m benchmarks.bench_retrieval --scenario quantization --sizes 10000,50000
+    python -m benchmarks.bench_retrieval --scenario backends --sizes 10,100,1000,5000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.fixtures import configure_environment, make_hash_embeddings, make_paragraph
+from benchmarks.run_benchmarks import percentile
+
+
+def make_corpus(chunks: int, dims: int, chunks_per_section: int, spread: float, seed: int = 0):
+    """
+    Returns (vectors, section ids) for a document of 'chunks' chunks.
+    'spread' is the chunk noise relative to the section topic; larger values make
+    sections overlap more (harder for the coarse stage).
+    """
+    rng = np.random.default_rng(seed)
+    sections = np.arange(chunks) // chunks_per_section
+    centers = rng.normal(size=(sections[-1] + 1, dims)).astype("float32")
+    vectors = centers[sections] + rng.normal(scale=spread, size=(chunks, dims)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors, sections
+
+
+def make_queries(vectors: np.ndarray, count: int, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    picks = vectors[rng.integers(0, len(vectors), size=count)]
+    queries = picks + rng.normal(scale=0.03, size=picks.shape).astype("float32")
+    return (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype("float32")
+
+
+def flat_index(vectors: np.ndarray):
+    import faiss
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    return index
+
+
+def time_queries(search, queries: np.ndarray) -> tuple[list, list[float]]:
+    """Runs one search per query (like a chat request) and returns results + latencies."""
+    results, latencies = [], []
+    for query in queries:
+        started = time.perf_counter()
+        results.append(search(query[None, :]))
+        latencies.append(time.perf_counter() - started)
+    return results, latencies
+
+
+def recall_at_k(truth: list[list[int]], found: list[list[int]], k: int) -> float:
+    hits = sum(len(set(t[:k]) & set(f[:k])) for t, f in zip(truth, found))
+    return hits / (k * len(truth))
+
+
+def latency_summary(latencies: list[float]) -> dict:
+    return {
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+    }
+
+
+def bench_hierarchy(args) -> list[dict]:
+    from app.services.hierarchy_index import SectionHierarchy
+
+    rows = []
+    for size in args.sizes:
+        vectors, sections = make_corpus(size, args.dims, args.chunks_per_section, args.spread)
+        queries = make_queries(vectors, args.queries)
+        index = flat_index(vectors)
+
+        truth, flat_latencies = time_queries(lambda q: index.search(q, args.k)[1][0].tolist(), queries)
+        hierarchy = SectionHierarchy.build(vectors, sections.tolist())
+        row = {
+            "chunks": size,
+            "sections": len(hierarchy.centroids),
+            "flat": latency_summary(flat_latencies),
+            "hierarchical": {},
+        }
+        for top in args.top_sections:
+            found, latencies = time_queries(
+                lambda q: hierarchy.search(index.reconstruct_batch, q, args.k, top)[0], queries
+            )
+            row["hierarchical"][f"top_{top}_sections"] = {
+                **latency_summary(latencies),
+                f"recall@{args.k}": recall_at_k(truth, found, args.k),
+            }
+        rows.append(row)
+    return rows
+
+
+def bench_quantization(args) -> list[dict]:
+    """Index size and recall@k of each compressed format, with and without exact re-scoring."""
+    import faiss
+    from app.config import settings
+    from app.services.vector_format import VECTOR_FORMATS, build_faiss_index, rank_exact
+
+    settings.VECTOR_PQ_M = args.pq_m
+    settings.VECTOR_PQ_MIN_CHUNKS = 0
+    rows = []
+    for size in args.sizes:
+        vectors, _ = make_corpus(size, args.dims, args.chunks_per_section, args.spread)
+        queries = make_queries(vectors, args.queries)
+        flat = flat_index(vectors)
+        flat_bytes = len(faiss.serialize_index(flat))
+        truth, flat_latencies = time_queries(lambda q: flat.search(q, args.k)[1][0].tolist(), queries)
+
+        row = {"chunks": size, "flat": {"bytes": flat_bytes, **latency_summary(flat_latencies)}}
+        for vector_format in VECTOR_FORMATS[1:]:
+            index, _ = build_faiss_index(vectors, vector_format)
+            size_bytes = len(faiss.serialize_index(index))
+            found, latencies = time_queries(lambda q: index.search(q, args.k)[1][0].tolist(), queries)
+            fetch = args.k * args.refine_factor
+
+            def refined(q):
+                positions = index.search(q, fetch)[1][0]
+                positions = positions[positions != -1]
+                return rank_exact(q[0], positions, vectors[positions], args.k)
+
+            refined_found, refined_latencies = time_queries(refined, queries)
+            row[vector_format] = {
+                "bytes": size_bytes,
+                "compression": flat_bytes / size_bytes,
+                **latency_summary(latencies),
+                f"recall@{args.k}": recall_at_k(truth, found, args.k),
+                "refine": {
+                    **latency_summary(refined_latencies),
+                    f"recall@{args.k}": recall_at_k(truth, refined_found, args.k),
+                },
+            }
+        rows.append(row)
+    return rows
+
+
+def bench_backends(args) -> list[dict]:
+    """Load time (cold open of the index directory) and search latency of each vector store backend."""
+    import tempfile
+    from app.services.embedding_service import set_embeddings
+    from app.services.vector_format import read_meta
+    from app.services.vector_store import BACKENDS
+
+    set_embeddings(make_hash_embeddings())
+    workdir = tempfile.mkdtemp(prefix="tokentalk-backends-")
+    rows = []
+    for size in args.sizes:
+        vectors, _ = make_corpus(size, args.dims, args.chunks_per_section, args.spread)
+        queries = make_queries(vectors, args.queries)
+        rng = random.Random(size)
+        texts = [make_paragraph(rng, words=150) for _ in range(size)]
+        metadatas = [{"source": "bench.pdf", "page": i // 3} for i in range(size)]
+        row = {"chunks": size}
+        for name, backend in BACKENDS.items():
+            path = os.path.join(workdir, f"{name}_{size}")
+            os.makedirs(path)
+            backend.build(path, texts, metadatas, vectors)
+            meta = {**read_meta(path), "backend": name}
+
+            load_latencies = []
+            for _ in range(args.loads):
+                started = time.perf_counter()
+                store = backend.load(path, meta)
+                load_latencies.append(time.perf_counter() - started)
+            _, latencies = time_queries(lambda q: store.search(q, args.k), queries)
+            row[name] = {
+                "disk_bytes": sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)),
+                "load_p50_ms": percentile(load_latencies, 50) * 1000,
+                "search": latency_summary(latencies),
+            }
+        rows.append(row)
+    return rows
+
+
+SCENARIOS = {"hierarchy": bench_hierarchy, "quantization": bench_quantization, "backends": bench_backends}
+
+
+def parse_list(value: str) -> list[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Retrieval latency / recall benchmark")
+    parser.add_argument("--scenario", default="hierarchy", choices=sorted(SCENARIOS))
+    parser.add_argument("--sizes", type=parse_list, default=[2000, 10000, 50000],
+                        help="Corpus sizes in chunks")
+    parser.add_argument("--dims", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--chunks-per-section", type=int, default=30,
+                        help="Chunks per simulated section (about 10 PDF pages)")
+    parser.add_argument("--spread", type=float, default=2.0,
+                        help="Chunk noise relative to the section topic")
+    parser.add_argument("--top-sections", type=parse_list, default=[4, 8, 16])
+    parser.add_argument("--pq-m", type=int, default=48, help="PQ sub-quantizers (quantization)")
+    parser.add_argument("--refine-factor", type=int, default=4,
+                        help="Candidates per result re-scored exactly (quantization)")
+    parser.add_argument("--loads", type=int, default=20, help="Index loads timed per backend (backends)")
+    parser.add_argument("--output", help="Also write the JSON report here")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    configure_environment()
+    report = {
+        "scenario": args.scenario,
+        "cpu_count": os.cpu_count(),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "results": SCENARIOS[args.scenario](args),
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,287 @@
+"""
+Synthetic corpora and stand-ins for external services used by the benchmarks.
+Nothing here touches the internet: PDFs, HTML pages and transcripts are generated
+locally, the LLM and the transcript API are replaced by fakes, and webpages are
+served from a local HTTP server.
+"""
+import asyncio
+import hashlib
+import os
+import random
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# A fixed vocabulary keeps the generated text realistic enough for the splitter
+# while staying deterministic for a given seed.
+WORDS = (
+    "system data model index vector query document page source answer context "
+    "retrieval latency throughput memory network request response user session "
+    "chapter section table figure result method analysis report value error "
+    "process worker queue batch cache storage embedding chunk token prompt "
+    "constitution article clause government policy budget market customer "
+    "the a of and to in is for on with as by at from that this which be are"
+).split()
+
+
+def configure_environment(workdir: str = None) -> str:
+    """
+    Points the app at a throwaway database and storage directories.
+    Must run before anything under 'app' is imported (Settings reads the env once).
+    Returns the working directory.
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix="tokentalk-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret-key")
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark-fake-key")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["UPLOAD_DIR"] = os.path.join(workdir, "uploads")
+    os.environ["VECTOR_STORE_DIR"] = os.path.join(workdir, "vector_stores")
+    os.environ["DEBUG"] = "false"
+    return workdir
+
+
+# --- Synthetic text -------------------------------------------------------
+
+def make_paragraph(rng: random.Random, words: int = 80) -> str:
+    """A paragraph of pseudo-sentences with an occasional exact-match code in it."""
+    sentences = []
+    remaining = words
+    while remaining > 0:
+        length = min(remaining, rng.randint(8, 20))
+        sentence = [rng.choice(WORDS) for _ in range(length)]
+        if rng.random() < 0.1:
+            sentence.append(f"ERR-{rng.randint(1000, 9999)}")
+        text = " ".join(sentence)
+        sentences.append(text[0].upper() + text[1:] + ".")
+        remaining -= length
+    return " ".join(sentences)
+
+
+def make_pages(pages: int, words_per_page: int = 350, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    return [
+        "\n".join(make_paragraph(rng, 70) for _ in range(max(1, words_per_page // 70)))
+        for _ in range(pages)
+    ]
+
+
+def make_transcript(words: int, seed: int = 0) -> list[str]:
+    """Short caption snippets, like the ones youtube_transcript_api returns."""
+    rng = random.Random(seed)
+    snippets = []
+    while words > 0:
+        length = min(words, rng.randint(4, 12))
+        snippets.append(" ".join(rng.choice(WORDS) for _ in range(length)))
+        words -= length
+    return snippets
+
+
+def make_html(paragraphs: int, seed: int = 0) -> str:
+    """A page with the usual noise (nav, scripts, footer) around the content."""
+    rng = random.Random(seed)
+    body = "\n".join(f"<p>{make_paragraph(rng, 90)}</p>" for _ in range(paragraphs))
+    return (
+        "<html><head><title>Synthetic Benchmark Page</title>"
+        "<style>body { font-family: sans-serif; }</style>"
+        "<script>var tracking = true;</script></head><body>"
+        "<nav><a href='/'>Home</a> <a href='/about'>About</a></nav>"
+        f"<article><h1>Synthetic Benchmark Page</h1>\n{body}</article>"
+        "<footer>Copyright Benchmark Inc.</footer></body></html>"
+    )
+
+
+# --- Minimal PDF writer ---------------------------------------------------
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _wrap(text: str, width: int = 95) -> list[str]:
+    lines = []
+    for paragraph in text.split("\n"):
+        line = ""
+        for word in paragraph.split():
+            if len(line) + len(word) + 1 > width:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        lines.append(line)
+    return lines
+
+
+def make_pdf(pages: list[str]) -> bytes:
+    """
+    Writes a valid text-only PDF (one Helvetica content stream per page),
+    so the benchmarks need no PDF authoring library.
+    """
+    objects = []  # object bodies, 1-based ids in order
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    catalog_id = add(b"")  # filled in once the page tree exists
+    pages_id = add(b"")
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    page_ids = []
+    for text in pages:
+        lines = _wrap(text)[:60]
+        stream_lines = ["BT", "/F1 10 Tf", "12 TL", "50 780 Td"]
+        for line in lines:
+            stream_lines.append(f"({_pdf_escape(line)}) Tj T*")
+        stream_lines.append("ET")
+        stream = "\n".join(stream_lines).encode("latin-1", "replace")
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+            % (pages_id, font_id, content_id)
+        ))
+
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids).encode()
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_ids)
+    objects[catalog_id - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_at = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, catalog_id, xref_at
+    )
+    return bytes(out)
+
+
+def write_pdf(path: str, pages: int, words_per_page: int = 350, seed: int = 0) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(make_pdf(make_pages(pages, words_per_page, seed)))
+    return path
+
+
+# --- Local webpage server -------------------------------------------------
+
+class FixtureServer:
+    """
+    Serves generated HTML on 127.0.0.1 from a background thread.
+    Any path '/page/<n>' returns a page with <n> paragraphs.
+    """
+
+    def __init__(self, seed: int = 0):
+        self.seed = seed
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                try:
+                    paragraphs = int(self.path.rstrip("/").rsplit("/", 1)[-1])
+                except ValueError:
+                    paragraphs = 20
+                body = make_html(paragraphs, seed=fixture.seed).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def page_url(self, paragraphs: int) -> str:
+        return f"{self.base_url}/page/{paragraphs}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# --- Fake external services -----------------------------------------------
+
+class FakeSnippet:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeTranscriptApi:
+    """Stand-in for YouTubeTranscriptApi: every video id maps to a generated transcript."""
+    words = 5000
+
+    def fetch(self, video_id: str, languages=None):
+        seed = int(hashlib.md5(video_id.encode()).hexdigest()[:8], 16)
+        return [FakeSnippet(text) for text in make_transcript(self.words, seed=seed)]
+
+
+class FakeMessageChunk:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class FakeLLM:
+    """
+    Stand-in for ChatGoogleGenerativeAI.astream: streams a fixed answer token by token.
+    first_token_delay / token_delay (seconds) simulate model latency without a network.
+    """
+
+    def __init__(self, answer_tokens: int = 60, first_token_delay: float = 0.0, token_delay: float = 0.0):
+        self.answer_tokens = answer_tokens
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+
+    async def astream(self, prompt):
+        if self.first_token_delay:
+            await asyncio.sleep(self.first_token_delay)
+        for i in range(self.answer_tokens):
+            if i and self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield FakeMessageChunk(f"token{i} ")
+
+
+def make_hash_embeddings(dimensions: int = 384, text_ms: float = 0.0):
+    """
+    Deterministic bag-of-words embeddings for runs without the sentence-transformers
+    model. Only useful for measuring everything *except* the model itself.
+    'text_ms' sleeps that long per text, standing in for model time so that
+    ingestion keeps the embedding lanes busy as it would with the real model.
+    """
+    import numpy as np
+    from langchain_core.embeddings import Embeddings
+
+    class HashEmbeddings(Embeddings):
+        def _embed(self, text: str) -> list[float]:
+            vector = np.zeros(dimensions, dtype="float32")
+            for word in text.lower().split():
+                digest = hashlib.md5(word.encode()).digest()
+                vector[int.from_bytes(digest[:4], "little") % dimensions] += 1.0
+            norm = np.linalg.norm(vector)
+            return (vector / norm if norm else vector).tolist()
+
+        def embed_documents(self, texts):
+            if text_ms:
+                time.sleep(len(texts) * text_ms / 1000)
+            return [self._embed(text) for text in texts]
+
+        def embed_query(self, text):
+            return self.embed_documents([text])[0]
+
+    return HashEmbeddings()
@@ -0,0 +1,39 @@
+"""
+ASGI entry point for load tests: app.main:app with external services faked.
+
+Every uvicorn worker imports this module, so each one applies the same fakes.
+Configuration comes from environment variables set by benchmarks.load_test:
+    BENCH_WORKDIR               throwaway DB / uploads / indexes directory
+    BENCH_FAKE_EMBEDDINGS=1     hash embeddings instead of the real model
+    BENCH_EMBED_TEXT_MS         simulated model time per text for the fake embeddings
+    BENCH_LLM_FIRST_TOKEN_MS    simulated LLM time-to-first-token
+    BENCH_LLM_TOKEN_MS          simulated delay between streamed tokens
+    BENCH_ANSWER_TOKENS         streamed tokens per answer
+    BENCH_TRANSCRIPT_WORDS      words in each fake YouTube transcript
+App settings such as CHAT_USER_RATE_PER_MINUTE are read from the same environment.
+"""
+import os
+
+from benchmarks import fixtures
+
+fixtures.configure_environment(os.environ.get("BENCH_WORKDIR"))
+
+if os.environ.get("BENCH_FAKE_EMBEDDINGS") == "1":
+    from app.services.embedding_service import set_embeddings
+    set_embeddings(fixtures.make_hash_embeddings(
+        text_ms=float(os.environ.get("BENCH_EMBED_TEXT_MS", "0"))
+    ))
+
+import youtube_transcript_api  # noqa: E402
+from app.services.rag_service import RAGService  # noqa: E402
+from app.main import app  # noqa: E402,F401
+
+fixtures.FakeTranscriptApi.words = int(os.environ.get("BENCH_TRANSCRIPT_WORDS", "3000"))
+youtube_transcript_api.YouTubeTranscriptApi = fixtures.FakeTranscriptApi
+
+_fake_llm = fixtures.FakeLLM(
+    answer_tokens=int(os.environ.get("BENCH_ANSWER_TOKENS", "60")),
+    first_token_delay=float(os.environ.get("BENCH_LLM_FIRST_TOKEN_MS", "300")) / 1000,
+    token_delay=float(os.environ.get("BENCH_LLM_TOKEN_MS", "10")) / 1000
+)
+RAGService.get_llm = staticmethod(lambda: _fake_llm)
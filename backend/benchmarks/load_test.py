@@ -0,0 +1,381 @@
+"""
+End-to-end HTTP load test for the FastAPI app.
+
+Starts benchmarks.load_app (app.main:app with a fake LLM and transcript provider)
+under uvicorn, serves webpages from a local fixture server, then drives a mix of
+virtual users through register/login, PDF upload + status polling, webpage and
+YouTube processing, multi-turn chat and batch chat. Reports throughput, error rate and latency
+percentiles per route as JSON, plus the server's mean time per RAG / ingestion
+stage (from /metrics), e.g. query_embedding for chats under ingestion load.
+
+429s from chat admission control are counted per route as 'rejected' and kept out
+of the latency percentiles and throughput, which cover served requests only. The
+per-user chat rate limit is off by default (--chat-rate-per-minute 0): virtual
+users chat far faster than people do, and a capacity run should measure the server
+rather than the limiter. Pass a rate to load-test the limiter itself.
+
+Usage (from the backend/ directory):
+    python -m benchmarks.load_test --users 50 --duration 60 --workers 2
+    python -m benchmarks.load_test --mix chat=8,poll=4,upload=1 --output load.json
+    python -m benchmarks.load_test --chat-rate-per-minute 30    # production rate limit
+    python -m benchmarks.load_test --mix batch=4,upload=4,poll=2 --fake-embeddings --embed-text-ms 5
+                                                                # batch chat under ingestion
+    python -m benchmarks.load_test --target http://127.0.0.1:8000   # existing server, no fakes
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+
+from benchmarks import fixtures
+from benchmarks.run_benchmarks import percentile
+
+ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+DEFAULT_MIX = "chat=6,poll=3,upload=1,webpage=1,youtube=1"
+QUESTIONS = [
+    "What does the document say about latency?",
+    "Can you expand on that?",
+    "Which error codes are mentioned?",
+    "Summarize the previous answer in one sentence.",
+]
+
+
+class Recorder:
+    """
+    Collects (route, status, latency) samples for the final report.
+    429s are load shedding, not served requests: they are counted as 'rejected'
+    and left out of the latency samples, throughput and error rate.
+    """
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.rejected = defaultdict(int)
+        self.status_codes = defaultdict(lambda: defaultdict(int))
+
+    @staticmethod
+    def route_of(method: str, path: str) -> str:
+        # /api/documents/17/chat -> POST /api/documents/{id}/chat
+        return f"{method} {ID_SEGMENT.sub('/{id}', path)}"
+
+    def record(self, method: str, path: str, status: int, seconds: float):
+        route = self.route_of(method, path)
+        self.status_codes[route][status] += 1
+        if status == 429:
+            self.rejected[route] += 1
+            return
+        self.samples[route].append(seconds)
+        if status >= 400 or status == 0:
+            self.errors[route] += 1
+
+    def report(self, elapsed: float) -> dict:
+        routes = {}
+        for route in sorted(self.status_codes):
+            latencies = self.samples[route]
+            rejected = self.rejected[route]
+            routes[route] = {
+                "requests": len(latencies),
+                "rps": len(latencies) / elapsed,
+                "error_rate": self.errors[route] / len(latencies) if latencies else 0.0,
+                "rejected": rejected,
+                "rejected_rate": rejected / (len(latencies) + rejected),
+                "status_codes": dict(self.status_codes[route]),
+            }
+            if latencies:
+                routes[route].update({
+                    "p50_ms": percentile(latencies, 50) * 1000,
+                    "p95_ms": percentile(latencies, 95) * 1000,
+                    "p99_ms": percentile(latencies, 99) * 1000,
+                    "max_ms": max(latencies) * 1000,
+                })
+        total = sum(len(v) for v in self.samples.values())
+        rejected = sum(self.rejected.values())
+        return {
+            "elapsed_sec": elapsed,
+            "requests": total,
+            "rps": total / elapsed if elapsed else 0.0,
+            "error_rate": sum(self.errors.values()) / total if total else 0.0,
+            "rejected": rejected,
+            "rejected_rate": rejected / (total + rejected) if total + rejected else 0.0,
+            "routes": routes,
+        }
+
+
+class VirtualUser:
+    """One scripted client with its own account, sources and chat threads."""
+
+    def __init__(self, index: int, client: httpx.AsyncClient, recorder: Recorder, args, fixture_url):
+        self.index = index
+        self.client = client
+        self.recorder = recorder
+        self.args = args
+        self.fixture_url = fixture_url
+        self.rng = random.Random(index)
+        self.headers = {}
+        self.documents = []  # completed document ids
+        self.pending = []  # document ids still processing
+        self.sources = []  # (kind, id) for webpages / videos
+
+    async def request(self, method: str, path: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, headers=self.headers, **kwargs)
+            status = response.status_code
+        except httpx.HTTPError:
+            response, status = None, 0
+        self.recorder.record(method, path, status, time.perf_counter() - started)
+        return response
+
+    async def login(self):
+        email = f"load-{self.args.run_id}-{self.index}@example.com"
+        credentials = {"email": email, "password": "load-test-password"}
+        await self.request("POST", "/api/auth/register", json={**credentials, "full_name": "Load"})
+        response = await self.request("POST", "/api/auth/login", json=credentials)
+        if response is not None and response.status_code == 200:
+            self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def upload(self):
+        pdf = fixtures.make_pdf(fixtures.make_pages(self.args.pdf_pages, seed=self.rng.randint(0, 10**6)))
+        files = {"file": (f"load_{self.index}.pdf", pdf, "application/pdf")}
+        response = await self.request("POST", "/api/documents/upload", files=files)
+        if response is not None and response.status_code == 200:
+            self.pending.append(response.json()["id"])
+
+    async def poll(self):
+        response = await self.request("GET", "/api/documents/")
+        if response is None or response.status_code != 200:
+            return
+        for doc in response.json():
+            if doc["id"] in self.pending and doc["status"] != "processing":
+                self.pending.remove(doc["id"])
+                if doc["status"] == "completed":
+                    self.documents.append(doc["id"])
+
+    async def webpage(self):
+        url = f"{self.fixture_url}/page/{self.args.html_paragraphs}?u={self.index}&n={self.rng.randint(0, 10**6)}"
+        response = await self.request("POST", "/api/webpage/process", json={"url": url, "source_type": "webpage"})
+        if response is not None and response.status_code == 200:
+            self.sources.append(("webpage", response.json()["id"]))
+
+    async def youtube(self):
+        video_id = f"{self.index:05d}{self.rng.randint(0, 999999):06d}"
+        url = f"https://www.youtube.com/watch?v={video_id}"
+        response = await self.request("POST", "/api/youtube/process", json={"url": url, "source_type": "youtube"})
+        if response is not None and response.status_code == 200:
+            self.sources.append(("youtube", response.json()["id"]))
+
+    async def chat(self):
+        targets = [("document", doc_id) for doc_id in self.documents] + self.sources
+        if not targets:
+            return await self.poll()
+        kind, source_id = self.rng.choice(targets)
+        prefix = {"document": "/api/documents", "webpage": "/api/webpage", "youtube": "/api/youtube"}[kind]
+        # A short multi-turn conversation on the same source
+        for turn in range(self.args.chat_turns):
+            question = QUESTIONS[turn % len(QUESTIONS)]
+            body = {"question": question, "source_id": source_id, "source_type": kind}
+            await self.request("POST", f"{prefix}/{source_id}/chat", json=body)
+
+    async def batch(self):
+        targets = [("document", doc_id) for doc_id in self.documents] + self.sources
+        if not targets:
+            return await self.poll()
+        kind, source_id = self.rng.choice(targets)
+        prefix = {"document": "/api/documents", "webpage": "/api/webpage", "youtube": "/api/youtube"}[kind]
+        questions = [QUESTIONS[i % len(QUESTIONS)] for i in range(self.args.batch_questions)]
+        # Latency covers the whole NDJSON stream, i.e. until the last answer arrives
+        await self.request("POST", f"{prefix}/{source_id}/chat/batch", json={"questions": questions})
+
+    async def run(self, deadline: float, mix: list[tuple[str, int]]):
+        await self.login()
+        if not self.headers:
+            return
+        await self.upload()
+        actions, weights = zip(*mix)
+        while time.monotonic() < deadline:
+            action = self.rng.choices(actions, weights)[0]
+            await getattr(self, action)()
+            if self.args.think_ms:
+                await asyncio.sleep(self.rng.expovariate(1000 / self.args.think_ms))
+
+
+def parse_mix(spec: str) -> list[tuple[str, int]]:
+    mix = []
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ("chat", "batch", "poll", "upload", "webpage", "youtube"):
+            raise SystemExit(f"Unknown action in --mix: {name}")
+        mix.append((name.strip(), int(weight or 1)))
+    return mix
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args, workdir: str) -> tuple[subprocess.Popen, str]:
+    """Launches uvicorn on benchmarks.load_app and waits until /health answers."""
+    port = free_port()
+    env = {
+        **os.environ,
+        "BENCH_WORKDIR": workdir,
+        "BENCH_FAKE_EMBEDDINGS": "1" if args.fake_embeddings else "0",
+        "BENCH_EMBED_TEXT_MS": str(args.embed_text_ms),
+        "BENCH_LLM_FIRST_TOKEN_MS": str(args.llm_first_token_ms),
+        "BENCH_LLM_TOKEN_MS": str(args.llm_token_ms),
+        "BENCH_ANSWER_TOKENS": str(args.answer_tokens),
+        "BENCH_TRANSCRIPT_WORDS": str(args.transcript_words),
+        "CHAT_USER_RATE_PER_MINUTE": str(args.chat_rate_per_minute),
+    }
+    if args.workers > 1:
+        # So /metrics (the stage report) covers every worker, not just the one answering
+        env["PROMETHEUS_MULTIPROC_DIR"] = os.path.join(workdir, "prometheus")
+        os.makedirs(env["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+        # Workers starting together would all CREATE TABLE on the fresh database
+        subprocess.run([
+            sys.executable, "-c",
+            "import asyncio, benchmarks.load_app; from app.database import init_db; asyncio.run(init_db())"
+        ], env=env, check=True, stdout=subprocess.DEVNULL)
+    command = [
+        sys.executable, "-m", "uvicorn", "benchmarks.load_app:app",
+        "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(args.workers), "--log-level", "warning",
+    ]
+    process = subprocess.Popen(command, env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit("Server exited during startup")
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return process, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise SystemExit("Server did not become healthy in time")
+
+
+async def server_stages(client: httpx.AsyncClient) -> dict:
+    """Count and mean milliseconds per stage from the server's tokentalk_stage_seconds."""
+    from prometheus_client.parser import text_string_to_metric_families
+    try:
+        response = await client.get("/metrics")
+    except httpx.HTTPError:
+        return {}
+    if response.status_code != 200:
+        return {}
+    totals = defaultdict(lambda: [0.0, 0.0])  # stage -> [seconds, count], over all source types
+    for family in text_string_to_metric_families(response.text):
+        if family.name != "tokentalk_stage_seconds":
+            continue
+        for sample in family.samples:
+            if sample.name.endswith("_sum"):
+                totals[sample.labels["stage"]][0] += sample.value
+            elif sample.name.endswith("_count"):
+                totals[sample.labels["stage"]][1] += sample.value
+    return {
+        stage: {"count": int(count), "mean_ms": seconds / count * 1000}
+        for stage, (seconds, count) in sorted(totals.items()) if count
+    }
+
+
+async def drive(args, base_url: str, fixture_url: str) -> dict:
+    recorder = Recorder()
+    mix = parse_mix(args.mix)
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.request_timeout, limits=limits) as client:
+        started = time.monotonic()
+        deadline = started + args.duration
+        users = []
+        for i in range(args.users):
+            users.append(asyncio.create_task(
+                VirtualUser(i, client, recorder, args, fixture_url).run(deadline, mix)
+            ))
+            # Ramp-up spreads the registration burst over ramp seconds
+            if args.ramp:
+                await asyncio.sleep(args.ramp / args.users)
+        await asyncio.gather(*users)
+        elapsed = time.monotonic() - started
+        report = recorder.report(elapsed)
+        report["stages"] = await server_stages(client)
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP load test with stubbed external services")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of steady load")
+    parser.add_argument("--ramp", type=float, default=5, help="Seconds to start all users")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Weighted actions (default {DEFAULT_MIX})")
+    parser.add_argument("--chat-turns", type=int, default=3, help="Questions per chat conversation")
+    parser.add_argument("--batch-questions", type=int, default=10, help="Questions per batch chat")
+    parser.add_argument("--think-ms", type=float, default=200, help="Mean pause between actions")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--pdf-pages", type=int, default=10)
+    parser.add_argument("--html-paragraphs", type=int, default=30)
+    parser.add_argument("--transcript-words", type=int, default=3000)
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--llm-first-token-ms", type=float, default=300)
+    parser.add_argument("--llm-token-ms", type=float, default=10)
+    parser.add_argument("--fake-embeddings", action="store_true")
+    parser.add_argument("--embed-text-ms", type=float, default=0,
+                        help="Simulated model time per text with --fake-embeddings")
+    parser.add_argument("--chat-rate-per-minute", type=float, default=0,
+                        help="Started server's per-user chat rate limit (default 0: disabled)")
+    parser.add_argument("--request-timeout", type=float, default=120)
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    parser.add_argument("--target", help="Load an already running server instead of starting one")
+    parser.add_argument("--workdir", help="Server DB / storage directory (default: temp dir)")
+    parser.add_argument("--output", help="Also write the JSON report here")
+    args = parser.parse_args(argv)
+    args.run_id = f"{int(time.time())}{random.randint(0, 999):03d}"
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="tokentalk-load-")
+    process = None
+
+    with fixtures.FixtureServer() as fixture_server:
+        try:
+            if args.target:
+                base_url = args.target.rstrip("/")
+            else:
+                process, base_url = start_server(args, workdir)
+            report = asyncio.run(drive(args, base_url, fixture_server.base_url))
+        finally:
+            if process is not None:
+                process.terminate()
+                try:
+                    process.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    # Graceful shutdown also waits for ingestion still running in background tasks
+                    process.kill()
+                    process.wait()
+
+    report["config"] = {k: v for k, v in vars(args).items() if k not in ("output",)}
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,269 @@
+"""
+Offline ingestion + chat benchmark.
+
+Runs the real DocumentService / WebpageService / YouTubeService ingestion code and
+RAGService.generate_response against generated corpora, with the LLM, transcript API
+and web server replaced by local fakes. Prints a JSON report and optionally compares
+it with a stored baseline (exit code 1 on regression).
+
+Usage (from the backend/ directory):
+    python -m benchmarks.run_benchmarks --output bench.json
+    python -m benchmarks.run_benchmarks --baseline benchmarks/baseline.json
+    python -m benchmarks.run_benchmarks --save-baseline benchmarks/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import resource
+import statistics
+import sys
+import time
+
+from benchmarks import fixtures
+
+# Metrics compared against the baseline and whether larger values are better
+BASELINE_METRICS = {
+    "throughput": True,
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "peak_rss_mb": False,
+}
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Nearest-rank percentile (samples need not be sorted)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def summarize(latencies: list[float], units: float, unit_name: str, elapsed: float, **extra) -> dict:
+    """Latency percentiles (ms) plus throughput in unit_name per second."""
+    return {
+        "runs": len(latencies),
+        "throughput": units / elapsed if elapsed > 0 else 0.0,
+        "throughput_unit": f"{unit_name}/sec",
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        **extra,
+    }
+
+
+def count_chunks(vector_store_path: str) -> int:
+    from app.services.rag_service import RAGService
+    return RAGService.get_index(vector_store_path).store.count
+
+
+def bench_pdf(args, workdir: str) -> tuple[dict, list[str]]:
+    from app.services.document_service import DocumentService
+
+    latencies, chunks, paths = [], 0, []
+    started = time.perf_counter()
+    for run in range(args.repeat):
+        pdf_path = fixtures.write_pdf(
+            os.path.join(workdir, "corpus", f"bench_{run}.pdf"),
+            pages=args.pdf_pages,
+            seed=run
+        )
+        t0 = time.perf_counter()
+        path = DocumentService.build_vector_store(pdf_path, user_id=1)
+        latencies.append(time.perf_counter() - t0)
+        chunks += count_chunks(path)
+        paths.append(path)
+    elapsed = time.perf_counter() - started
+    pages = args.pdf_pages * args.repeat
+    return summarize(
+        latencies, pages, "pages", elapsed,
+        pages=pages, chunks=chunks, chunks_per_sec=chunks / elapsed
+    ), paths
+
+
+def bench_webpage(args, server: fixtures.FixtureServer) -> tuple[dict, list[str]]:
+    from app.services.webpage_service import WebpageService
+
+    latencies, chunks, paths = [], 0, []
+    started = time.perf_counter()
+    for run in range(args.repeat):
+        url = server.page_url(args.html_paragraphs) + f"?run={run}"
+        t0 = time.perf_counter()
+        text, _ = WebpageService.extract_text(url)
+        path = WebpageService.build_vector_store(text, url, user_id=1)
+        latencies.append(time.perf_counter() - t0)
+        chunks += count_chunks(path)
+        paths.append(path)
+    elapsed = time.perf_counter() - started
+    return summarize(
+        latencies, args.repeat, "pages", elapsed,
+        chunks=chunks, chunks_per_sec=chunks / elapsed
+    ), paths
+
+
+def bench_youtube(args) -> tuple[dict, list[str]]:
+    import youtube_transcript_api
+    from app.services.youtube_service import YouTubeService
+
+    fixtures.FakeTranscriptApi.words = args.transcript_words
+    youtube_transcript_api.YouTubeTranscriptApi = fixtures.FakeTranscriptApi
+
+    latencies, chunks, paths = [], 0, []
+    started = time.perf_counter()
+    for run in range(args.repeat):
+        video_id = f"bench{run:06d}"  # 11 chars, like a real video id
+        t0 = time.perf_counter()
+        transcript = YouTubeService.get_transcript(video_id)
+        path = YouTubeService.build_vector_store(transcript, video_id, user_id=1)
+        latencies.append(time.perf_counter() - t0)
+        chunks += count_chunks(path)
+        paths.append(path)
+    elapsed = time.perf_counter() - started
+    return summarize(
+        latencies, args.repeat, "transcripts", elapsed,
+        chunks=chunks, chunks_per_sec=chunks / elapsed
+    ), paths
+
+
+def bench_chat(args, index_paths: list[str]) -> dict:
+    from app.services.rag_service import RAGService
+
+    fake_llm = fixtures.FakeLLM(
+        answer_tokens=args.answer_tokens,
+        first_token_delay=args.llm_first_token_ms / 1000,
+        token_delay=args.llm_token_ms / 1000
+    )
+    RAGService.get_llm = staticmethod(lambda: fake_llm)
+    questions = [
+        "What does the report say about latency?",
+        "Summarize the section on storage and cache.",
+        "Which error code is mentioned with the embedding queue?",
+        "How is the budget policy described?",
+    ]
+
+    async def run():
+        latencies, errors = [], 0
+        for i in range(args.chat_queries):
+            path = index_paths[i % len(index_paths)]
+            t0 = time.perf_counter()
+            answer = await RAGService.generate_response(
+                path, questions[i % len(questions)], source_type="document"
+            )
+            latencies.append(time.perf_counter() - t0)
+            if answer.startswith("Error gathering response"):
+                errors += 1
+        return latencies, errors
+
+    started = time.perf_counter()
+    latencies, errors = asyncio.run(run())
+    elapsed = time.perf_counter() - started
+    return summarize(latencies, len(latencies), "queries", elapsed, errors=errors)
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Lists every metric that is worse than the baseline by more than tolerance."""
+    regressions = []
+    for scenario, results in report["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(scenario)
+        if not base:
+            continue
+        for metric, higher_is_better in BASELINE_METRICS.items():
+            current, previous = results.get(metric), base.get(metric)
+            if not current or not previous:
+                continue
+            change = (current - previous) / previous
+            worse = -change if higher_is_better else change
+            if worse > tolerance:
+                regressions.append(
+                    f"{scenario}.{metric}: {previous:.2f} -> {current:.2f} ({change:+.0%})"
+                )
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline ingestion and chat benchmarks")
+    parser.add_argument("--scenarios", default="pdf,webpage,youtube,chat",
+                        help="Comma-separated subset of pdf,webpage,youtube,chat")
+    parser.add_argument("--repeat", type=int, default=3, help="Ingestion runs per source type")
+    parser.add_argument("--pdf-pages", type=int, default=50)
+    parser.add_argument("--html-paragraphs", type=int, default=60)
+    parser.add_argument("--transcript-words", type=int, default=8000)
+    parser.add_argument("--chat-queries", type=int, default=50)
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--llm-first-token-ms", type=float, default=0.0)
+    parser.add_argument("--llm-token-ms", type=float, default=0.0)
+    parser.add_argument("--fake-embeddings", action="store_true",
+                        help="Use deterministic hash embeddings instead of the real model")
+    parser.add_argument("--workdir", help="Where corpora, DB and indexes go (default: temp dir)")
+    parser.add_argument("--output", help="Write the JSON report here as well as stdout")
+    parser.add_argument("--baseline", help="Compare against this baseline report")
+    parser.add_argument("--save-baseline", help="Store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed relative regression before failing (default 0.2)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    workdir = fixtures.configure_environment(args.workdir)
+
+    if args.fake_embeddings:
+        from app.services.embedding_service import set_embeddings
+        set_embeddings(fixtures.make_hash_embeddings())
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "fake_embeddings": args.fake_embeddings,
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "save_baseline")},
+        "scenarios": {},
+    }
+
+    index_paths = []
+    if "pdf" in scenarios or "chat" in scenarios:
+        result, paths = bench_pdf(args, workdir)
+        index_paths += paths
+        if "pdf" in scenarios:
+            report["scenarios"]["pdf_ingestion"] = result
+    if "webpage" in scenarios:
+        with fixtures.FixtureServer() as server:
+            report["scenarios"]["webpage_ingestion"], _ = bench_webpage(args, server)
+    if "youtube" in scenarios:
+        report["scenarios"]["youtube_ingestion"], _ = bench_youtube(args)
+    if "chat" in scenarios:
+        report["scenarios"]["chat"] = bench_chat(args, index_paths)
+    report["peak_rss_mb"] = peak_rss_mb()
+
+    status = 0
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        report["regressions"] = regressions
+        status = 1 if regressions else 0
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w") as f:
+            f.write(output + "\n")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+"""
+Gunicorn settings for running the API with several Uvicorn workers (gunicorn is not
+in requirements.txt; install it on the server).
+
+Usage (from the backend/ directory):
+    gunicorn app.main:app -c gunicorn.conf.py
+    PRELOAD_MODELS=true gunicorn app.main:app -c gunicorn.conf.py
+
+With PRELOAD_MODELS=true the master imports the app - and with it the embedding
+model - before forking, so workers start instantly and share the model weights
+copy-on-write. Without it every worker loads the model on its first request.
+
+Prometheus runs in multiprocess mode: each worker writes its metrics to files in
+PROMETHEUS_MULTIPROC_DIR and /metrics adds them up, so a scrape covers every worker
+rather than whichever one served it.
+"""
+import gc
+import os
+import shutil
+import tempfile
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+
+preload_app = os.environ.get("PRELOAD_MODELS", "false").lower() in ("1", "true", "yes")
+
+# Set (and emptied of the last run's files) before the app is imported, since
+# prometheus_client picks its storage when it is first imported
+_metrics_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "tokentalk-prometheus")
+)
+shutil.rmtree(_metrics_dir, ignore_errors=True)
+os.makedirs(_metrics_dir, exist_ok=True)
+
+
+def pre_fork(server, worker):
+    # Move everything loaded so far out of the GC's reach, so collections in the
+    # workers don't touch (and copy) the pages holding the shared model.
+    if preload_app:
+        gc.freeze()
+
+
+def child_exit(server, worker):
+    # Drop the exited worker's live gauges (queue depths); its counters are kept
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -14,11 +14,18 @@ class API {
     }
 
     // Default headers for JSON requests
+    // X-Affinity-Key lets a multi-node load balancer keep a user on the node that
+    // already has their indexes cached (see AFFINITY_HEADER on the backend).
     static get headers() {
-        return {
+        const headers = {
             'Authorization': `Bearer ${this.token}`,
             'Content-Type': 'application/json'
         };
+        const affinityKey = localStorage.getItem('affinityKey');
+        if (affinityKey) {
+            headers['X-Affinity-Key'] = affinityKey;
+        }
+        return headers;
     }
 
     /**
@@ -48,6 +55,7 @@ class API {
             // We immediately clear the local session and kick the user to the login page.
             if (response.status === 401) {
                 localStorage.removeItem('token');
+                localStorage.removeItem('affinityKey');
                 window.location.href = 'index.html';
                 return;
             }
@@ -47,6 +47,9 @@ document.addEventListener('DOMContentLoaded', () => {
 
             // Persist the token so it survives page refreshes
             localStorage.setItem('token', response.access_token);
+            if (response.affinity_key) {
+                localStorage.setItem('affinityKey', response.affinity_key);
+            }
 
             // Navigate to protected area
             window.location.href = 'dashboard.html';
@@ -89,6 +92,9 @@ document.addEventListener('DOMContentLoaded', () => {
             // 2. Auto-login Flow: Log the user in immediately after successful signup
             const loginRes = await API.login(email, password);
             localStorage.setItem('token', loginRes.access_token);
+            if (loginRes.affinity_key) {
+                localStorage.setItem('affinityKey', loginRes.affinity_key);
+            }
             window.location.href = 'dashboard.html';
         } catch (error) {
             errorMsg.textContent = error.message || 'Registration failed';
@@ -9,6 +9,7 @@ document.addEventListener('DOMContentLoaded', async () => {
     document.getElementById('logoutBtn').addEventListener('click', (e) => {
         e.preventDefault();
         localStorage.removeItem('token');
+        localStorage.removeItem('affinityKey');
         window.location.href = 'index.html';
     });
 